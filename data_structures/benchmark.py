@@ -0,0 +1,137 @@
+"""Benchmark: per-operation latency and memory of the binary search trees."""
+import argparse
+import random
+import sys
+import time
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from data_structures import bst
+
+TREE_TYPES = {
+    'bst': bst.BST,
+    'avl': bst.AVLTree,
+    'array': bst.ArrayBST,
+}
+DEFAULT_SIZES = [10 ** n for n in range(3, 7)]
+# Number of searches and deletions timed at each size
+N_QUERIES = 10000
+# Number of keys in the trees whose memory is measured
+MEMORY_SIZE = 10 ** 5
+# Larger unbalanced trees built from sorted keys take too long to build
+MAX_UNBALANCED_SIZE = 10 ** 4
+
+def time_operations(tree_type, n_keys, seed=0):
+    """
+    Builds a tree of the given type from n_keys keys in sorted order, then
+    searches for and deletes N_QUERIES random keys. Returns a dictionary of
+    the mean time per insertion, search and deletion, and per key for
+    building the tree with from_iterable(), in microseconds.
+    """
+    rng = random.Random(seed)
+    keys = range(n_keys)
+    queries = rng.sample(keys, min(N_QUERIES, n_keys))
+    tree = tree_type()
+    times = {}
+
+    start = time.time()
+    tree_type.from_iterable(keys)
+    times['bulk_load'] = (time.time() - start) / n_keys * 1e6
+
+    start = time.time()
+    for key in keys:
+        tree.insert(key)
+    times['insert'] = (time.time() - start) / n_keys * 1e6
+
+    start = time.time()
+    for key in queries:
+        tree.search(key)
+    times['search'] = (time.time() - start) / len(queries) * 1e6
+
+    start = time.time()
+    for key in queries:
+        tree.delete(key)
+    times['delete'] = (time.time() - start) / len(queries) * 1e6
+
+    return times
+
+def _build_random(tree_type, keys):
+    tree = tree_type()
+    for key in keys:
+        tree.insert(key)
+    return tree
+
+def _get_storage_size(tree):
+    """
+    Returns the size in bytes of the node objects or arrays of a tree, from
+    sys.getsizeof() (not counting the values themselves).
+    """
+    if isinstance(tree, bst.ArrayBST):
+        parts = [tree._values, tree._left, tree._right, tree._sizes]
+    else:
+        parts = tree.traverse_preorder(lambda node: node) or []
+    return sum([sys.getsizeof(part) for part in parts])
+
+def measure_memory(name, n_keys=MEMORY_SIZE, seed=0):
+    """
+    Returns the memory taken per key, in bytes, by a tree of the named type
+    built by inserting n_keys integer keys in random order (not counting the
+    key objects themselves).
+
+    This uses tracemalloc where available. Otherwise the sizes of the node
+    objects or arrays of the tree are added up.
+    """
+    keys = list(range(n_keys))
+    random.Random(seed).shuffle(keys)
+    if tracemalloc is None:
+        tree = _build_random(TREE_TYPES[name], keys)
+        return float(_get_storage_size(tree)) / n_keys
+
+    tracemalloc.start()
+    try:
+        tree = _build_random(TREE_TYPES[name], keys)
+        return float(tracemalloc.get_traced_memory()[0]) / n_keys
+    finally:
+        tracemalloc.stop()
+
+def run_benchmarks(names, sizes, seed=0):
+    """
+    Yields (tree type name, number of keys, times) for each tree type and
+    size (see time_operations()), skipping unbalanced trees (all but AVL
+    trees) that would take too long to build.
+    """
+    for name in names:
+        for n_keys in sizes:
+            if name != 'avl' and n_keys > MAX_UNBALANCED_SIZE:
+                continue
+            yield name, n_keys, time_operations(TREE_TYPES[name], n_keys,
+                                                seed)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Benchmark binary search trees built from sorted keys.")
+    parser.add_argument('--types', nargs='+', choices=sorted(TREE_TYPES),
+                        default=['array', 'avl', 'bst'])
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--memory', action='store_true',
+                        help="measure memory per key instead of latency")
+    args = parser.parse_args()
+
+    if args.memory:
+        print "%-6s %8s %16s" % ('tree', 'keys', 'bytes per key')
+        for name in args.types:
+            print "%-6s %8d %16.1f" % (name, MEMORY_SIZE,
+                                       measure_memory(name, seed=args.seed))
+        sys.exit()
+
+    print "%-4s %8s %12s %12s %12s %12s" % ('tree', 'keys', 'insert (us)',
+                                            'search (us)', 'delete (us)',
+                                            'bulk (us)')
+    for name, n_keys, times in run_benchmarks(args.types, args.sizes,
+                                              args.seed):
+        print "%-4s %8d %12.2f %12.2f %12.2f %12.2f" % (
+            name, n_keys, times['insert'], times['search'], times['delete'],
+            times['bulk_load'])
@@ -1,4 +1,6 @@
 "BST: Binary search tree"
+import itertools
+from array import array
 
 class BST(object):
     """
@@ -8,6 +10,51 @@ class BST(object):
     def __init__(self, value=None):
         self._root = _BSTNode(value)
 
+    @classmethod
+    def from_iterable(cls, values):
+        """
+        Returns a perfectly balanced tree holding the given values, built in
+        linear time if they are sorted (they are sorted first otherwise).
+        """
+        tree = cls()
+        tree._load(_sort_values(values))
+        return tree
+
+    def bulk_load(self, values):
+        """
+        Inserts the given values into the tree, by merging them with the
+        values already in it and rebuilding it as a perfectly balanced tree
+        (in linear time if the values are sorted).
+        """
+        self._load(_merge_values(self._get_values(), _sort_values(values)))
+
+    def merge(self, other):
+        """
+        Returns a new perfectly balanced tree holding the values of this tree
+        and of another one (values in both are kept once), built in linear
+        time.
+        """
+        tree = type(self)()
+        tree._load(_merge_values(self._get_values(), other._get_values(),
+                                 union=True))
+        return tree
+
+    def _get_values(self):
+        """
+        Returns the values in the tree, in order.
+        """
+        return list(self.traverse_inorder(lambda node: node._value) or [])
+
+    def _load(self, values):
+        """
+        Replaces the contents of the tree with a perfectly balanced tree
+        holding the given sorted, distinct values.
+        """
+        node_type = type(self._root)
+        self._root = node_type._build(values, 0, len(values))
+        if self._root is None:
+            self._root = node_type(None)
+
     def insert(self, value):
         """
         Inserts a value into the tree.
@@ -19,7 +66,7 @@ class BST(object):
         Traverses the tree in pre-order fashion, applying the given function to
         each node encountered and returning a generator containing the results.
         """
-        if self._root._value:
+        if self._root._value is not None:
             return self._root._traverse_preorder(visit_func)
 
     def traverse_inorder(self, visit_func):
@@ -27,7 +74,7 @@ class BST(object):
         Traverses the tree in in-order fashion, applying the given function to
         each node encountered and returning a generator containing the results.
         """
-        if self._root._value:
+        if self._root._value is not None:
             return self._root._traverse_inorder(visit_func)
 
     def traverse_postorder(self, visit_func):
@@ -36,7 +83,7 @@ class BST(object):
         to each node encountered and returning a generator containing the
         results.
         """
-        if self._root._value:
+        if self._root._value is not None:
             return self._root._traverse_postorder(visit_func)
 
     def search(self, value):
@@ -44,122 +91,884 @@ class BST(object):
         Searches the tree for the given value, and returns True if the value is
         found; otherwise, returns False.
         """
-        if self._root._value:
+        if self._root._value is not None:
             return self._root._search(value)
 
+    def delete(self, value):
+        """
+        Deletes the given value from the tree if it exists.
+        """
+        self._root._delete(value)
+
+    def __len__(self):
+        return self._root._size
+
+    #### Order statistics
+
+    def rank(self, value):
+        """
+        Returns the number of values in the tree less than the given value.
+        """
+        if self._root._value is None:
+            return 0
+        rank = 0
+        node = self._root
+        while node is not None:
+            if value < node._value:
+                node = node._left
+            elif value > node._value:
+                rank += _size(node._left) + 1
+                node = node._right
+            else:
+                return rank + _size(node._left)
+        return rank
+
+    def select(self, k):
+        """
+        Returns the k-th smallest value in the tree (counted from 0), and
+        raises IndexError if there is none.
+        """
+        if not 0 <= k < len(self):
+            raise IndexError("Tree index out of range")
+        node = self._root
+        while True:
+            left_size = _size(node._left)
+            if k < left_size:
+                node = node._left
+            elif k > left_size:
+                k -= left_size + 1
+                node = node._right
+            else:
+                return node._value
+
+    def count_range(self, lo, hi):
+        """
+        Returns the number of values v in the tree with lo <= v < hi.
+        """
+        return max(0, self.rank(hi) - self.rank(lo))
+
+    def range(self, lo, hi):
+        """
+        Returns a generator of the values v in the tree with lo <= v < hi, in
+        order. Only the nodes on the paths to lo and hi and those holding the
+        values are visited.
+        """
+        if self._root._value is not None:
+            return self._root._range(lo, hi)
+        return iter(())
+
+def _sort_values(values):
+    """
+    Returns the values as a sorted list, sorting them only if they are not
+    sorted already, and checking that they are distinct.
+    """
+    values = list(values)
+    pairs = itertools.izip(values, itertools.islice(values, 1, None))
+    if not all([first < second for first, second in pairs]):
+        values.sort()
+        for first, second in itertools.izip(values,
+                                            itertools.islice(values, 1, None)):
+            if first == second:
+                raise ValueError("Value (%d) already in tree" % first)
+    return values
+
+def _merge_values(first, second, union=False):
+    """
+    Merges two sorted lists of distinct values into one in linear time.
+    Values in both lists are kept once if union is True, otherwise they raise
+    a ValueError.
+    """
+    merged = []
+    i = j = 0
+    while i < len(first) and j < len(second):
+        if first[i] < second[j]:
+            merged.append(first[i])
+            i += 1
+        elif first[i] > second[j]:
+            merged.append(second[j])
+            j += 1
+        else:
+            if not union:
+                raise ValueError("Value (%d) already in tree" % first[i])
+            merged.append(first[i])
+            i += 1
+            j += 1
+    merged.extend(first[i:])
+    merged.extend(second[j:])
+    return merged
+
 class _BSTNode(object):
     """
     A node in a binary search tree.
     """
+    __slots__ = ('_value', '_left', '_right', '_size')
+
     def __init__(self, value):
         self._value = value
         # Left child
         self._left = None
         # Right child
         self._right = None
+        # Number of nodes in the subtree rooted by this node
+        self._size = 0 if value is None else 1
+
+    @classmethod
+    def _build(cls, values, start, stop):
+        """
+        Builds a perfectly balanced tree holding values[start:stop], which
+        are sorted and distinct, and returns its root (None if there are no
+        values).
+        """
+        if start >= stop:
+            return None
+        middle = (start + stop) // 2
+        node = cls(values[middle])
+        node._left = cls._build(values, start, middle)
+        node._right = cls._build(values, middle + 1, stop)
+        node._size = stop - start
+        return node
 
     def _insert(self, value):
         """
         Inserts a value into the tree rooted by this node.
         """
         # If current node has no value, simply set it on this node
-        if not self._value:
+        if self._value is None:
             self._value = value
+            self._size = 1
             return
-        
-        if self._value == value:
-            raise ValueError("Value (%d) already in tree" % value)
-
-        # Go down the left subtree
-        if value < self._value:
-            # If node exists, recursively insert value on left subtree
-            if self._left:
-                self._left._insert(value)
-            # Otherwise, create new node and add as left child
-            else:
-                self._left = _BSTNode(value)
-                return
 
-        # Go down the right subtree
-        if value > self._value:
-            # If node exists, recursively insert value on right subtree
-            if self._right:
-                self._right._insert(value)
-            # Otherwise, create new node and add as right child
-            else:
-                self._right = _BSTNode(value)
-                return
+        # Walk down to the empty child where the value belongs, keeping the
+        # path to update the subtree sizes
+        path = []
+        node = self
+        while node is not None:
+            if value == node._value:
+                raise ValueError("Value (%d) already in tree" % value)
+            path.append(node)
+            node = node._left if value < node._value else node._right
+
+        # Add the value as a child of the last node
+        parent = path[-1]
+        if value < parent._value:
+            parent._left = _BSTNode(value)
+        else:
+            parent._right = _BSTNode(value)
+        for node in path:
+            node._size += 1
 
     def _search(self, value):
         """
         Searches the tree rooted by this node for the given value, and returns
         True if the value is found; otherwise, returns False.
         """
-        if not self._value:
+        if self._value is None:
             # Not found
             return False
 
-        if value < self._value:
-            if not self._left:
-                # Not found
-                return False
-            # Search the left subtree
-            return self._left._search(value)
-
-        if value > self._value:
-            if not self._right:
-                # Not found
-                return False
-            # Search the left subtree
-            return self._right._search(value)
-           
-        # Found
-        return True
+        node = self
+        while node is not None:
+            if value < node._value:
+                # Search the left subtree
+                node = node._left
+            elif value > node._value:
+                # Search the right subtree
+                node = node._right
+            else:
+                # Found
+                return True
+
+        # Not found
+        return False
 
     def _delete(self, value):
         """
         Deletes the given value from the tree rooted by this node if it exists.
         """
-        raise NotImplementedError()     
+        # Find the node holding the value, keeping the path to it
+        path = []
+        node = self
+        while node is not None and node._value is not None:
+            if value == node._value:
+                break
+            path.append(node)
+            node = node._left if value < node._value else node._right
+        else:
+            # Not found
+            return
+
+        # A node with two children takes the value of its in-order successor
+        # (the leftmost node of its right subtree), which is deleted instead
+        if node._left is not None and node._right is not None:
+            path.append(node)
+            successor = node._right
+            while successor._left is not None:
+                path.append(successor)
+                successor = successor._left
+            node._value = successor._value
+            node = successor
+
+        # The node now has at most one child, which takes its place
+        child = node._left if node._left is not None else node._right
+        if not path:
+            # This node itself is deleted: take over the child's contents, or
+            # become empty
+            if child is None:
+                self._value = None
+                self._size = 0
+            else:
+                self._value = child._value
+                self._left = child._left
+                self._right = child._right
+                self._size = child._size
+            return
+        parent = path[-1]
+        if parent._left is node:
+            parent._left = child
+        else:
+            parent._right = child
+        for node in path:
+            node._size -= 1
+
+    def _range(self, lo, hi):
+        """
+        Yields the values v with lo <= v < hi in the subtree rooted by this
+        node, in order. This is an in-order traversal (see
+        _traverse_inorder()) that skips the left subtrees holding only values
+        less than lo, and stops at the first value not less than hi.
+        """
+        stack = []
+        node = self
+        while stack or node is not None:
+            while node is not None:
+                if node._value < lo:
+                    node = node._right
+                else:
+                    stack.append(node)
+                    node = node._left
+            if not stack:
+                return
+            node = stack.pop()
+            if node._value >= hi:
+                return
+            yield node._value
+            node = node._right
 
     def _traverse_preorder(self, visit_func):
         """
         Traverses the tree rooted by this node in pre-order fashion, applying
         the given function to each node encountered and yielding the result.
         """
-        if self._value:
-            yield visit_func(self)
-        if self._left:
-            for result in self._left._traverse_preorder(visit_func):
-                yield result
-        if self._right:
-            for result in self._right._traverse_preorder(visit_func):
-                yield result
+        if self._value is None:
+            return
+
+        # Nodes still to visit, the next one on top
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield visit_func(node)
+            # Push the right child first so that the left subtree comes first
+            if node._right is not None:
+                stack.append(node._right)
+            if node._left is not None:
+                stack.append(node._left)
 
     def _traverse_inorder(self, visit_func):
         """
         Traverses the tree rooted by this node in in-order fashion, applying
         the given function to each node encountered and yielding the result.
         """
-        if self._left:
-            for result in self._left._traverse_inorder(visit_func):
-                yield result
-        if self._value:
-            yield visit_func(self)
-        if self._right:
-            for result in self._right._traverse_inorder(visit_func):
-                yield result
+        if self._value is None:
+            return
+
+        # Nodes whose left subtree is being traversed
+        stack = []
+        node = self
+        while stack or node is not None:
+            # Go down the left subtree as far as possible
+            while node is not None:
+                stack.append(node)
+                node = node._left
+            node = stack.pop()
+            yield visit_func(node)
+            node = node._right
 
     def _traverse_postorder(self, visit_func):
         """
         Traverses the tree rooted by this node in post-order fashion, applying
         the given function to each node encountered and yielding the result.
         """
-        if self._left:
-            for result in self._left._traverse_postorder(visit_func):
-                yield result
-        if self._right:
-            for result in self._right._traverse_postorder(visit_func):
-                yield result
-        if self._value:
-            yield visit_func(self)
\ No newline at end of file
+        if self._value is None:
+            return
+
+        # Nodes whose subtrees are being traversed
+        stack = []
+        node = self
+        # Last node visited
+        last = None
+        while stack or node is not None:
+            # Go down the left subtree as far as possible
+            if node is not None:
+                stack.append(node)
+                node = node._left
+                continue
+            top = stack[-1]
+            # Traverse the right subtree if it has not been yet
+            if top._right is not None and top._right is not last:
+                node = top._right
+            else:
+                last = stack.pop()
+                yield visit_func(last)
+
+
+class AVLTree(BST):
+    """
+    A self-balancing (AVL) binary search tree, with the same interface as BST.
+    The heights of the two subtrees of every node differ by at most one, so
+    insertion, deletion and search take O(log n) time whatever the order of
+    the values.
+    """
+    def __init__(self, value=None):
+        self._root = _AVLNode(value)
+
+    def insert(self, value):
+        """
+        Inserts a value into the tree.
+        """
+        # If the tree is empty, simply set the value on the root
+        if self._root._value is None:
+            self._root._value = value
+            self._root._size = 1
+            return
+
+        # Walk down to the empty child where the value belongs, keeping the
+        # path to rebalance on the way back up
+        path = []
+        node = self._root
+        while node is not None:
+            if value == node._value:
+                raise ValueError("Value (%d) already in tree" % value)
+            path.append(node)
+            node = node._left if value < node._value else node._right
+
+        parent = path[-1]
+        if value < parent._value:
+            parent._left = _AVLNode(value)
+        else:
+            parent._right = _AVLNode(value)
+        self._rebalance(path)
+
+    def delete(self, value):
+        """
+        Deletes the given value from the tree if it exists.
+        """
+        # Find the node holding the value, keeping the path to it
+        path = []
+        node = self._root
+        while node is not None and node._value is not None:
+            if value == node._value:
+                break
+            path.append(node)
+            node = node._left if value < node._value else node._right
+        else:
+            # Not found
+            return
+
+        # A node with two children takes the value of its in-order successor,
+        # which is deleted instead
+        if node._left is not None and node._right is not None:
+            path.append(node)
+            successor = node._right
+            while successor._left is not None:
+                path.append(successor)
+                successor = successor._left
+            node._value = successor._value
+            node = successor
+
+        # The node now has at most one child, which takes its place
+        child = node._left if node._left is not None else node._right
+        if not path:
+            if child is None:
+                # The tree is now empty
+                self._root._value = None
+                self._root._size = 0
+            else:
+                self._root = child
+            return
+        parent = path[-1]
+        if parent._left is node:
+            parent._left = child
+        else:
+            parent._right = child
+        self._rebalance(path)
+
+    def _rebalance(self, path):
+        """
+        Updates the heights and sizes of the nodes on a path from the root
+        after a change below its last node, rotating the subtrees that became
+        unbalanced.
+        """
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            subtree = node._rebalance()
+            if subtree is node:
+                continue
+
+            # Attach the rotated subtree in place of the node
+            if i == 0:
+                self._root = subtree
+            elif path[i - 1]._left is node:
+                path[i - 1]._left = subtree
+            else:
+                path[i - 1]._right = subtree
+
+def _height(node):
+    """
+    Returns the height of the subtree rooted by the node (0 if it is None).
+    """
+    return 0 if node is None else node._height
+
+def _size(node):
+    """
+    Returns the number of nodes in the subtree rooted by the node (0 if it is
+    None).
+    """
+    return 0 if node is None else node._size
+
+class _AVLNode(_BSTNode):
+    """
+    A node in an AVL tree, which also keeps the height of its subtree.
+    """
+    __slots__ = ('_height',)
+
+    def __init__(self, value):
+        super(_AVLNode, self).__init__(value)
+        self._height = 1
+
+    @classmethod
+    def _build(cls, values, start, stop):
+        """
+        Builds a perfectly balanced tree holding values[start:stop] (see
+        _BSTNode._build()), with the heights of its nodes.
+        """
+        node = super(_AVLNode, cls)._build(values, start, stop)
+        if node is not None:
+            node._update()
+        return node
+
+    def _update(self):
+        """
+        Updates the height and size of this node from those of its children.
+        """
+        self._height = 1 + max(_height(self._left), _height(self._right))
+        self._size = 1 + _size(self._left) + _size(self._right)
+
+    def _rotate_left(self):
+        """
+        Rotates the subtree rooted by this node to the left, and returns its
+        new root (the former right child).
+        """
+        pivot = self._right
+        self._right = pivot._left
+        pivot._left = self
+        self._update()
+        pivot._update()
+        return pivot
+
+    def _rotate_right(self):
+        """
+        Rotates the subtree rooted by this node to the right, and returns its
+        new root (the former left child).
+        """
+        pivot = self._left
+        self._left = pivot._right
+        pivot._right = self
+        self._update()
+        pivot._update()
+        return pivot
+
+    def _rebalance(self):
+        """
+        Updates the height and size of this node, whose subtrees are
+        balanced, and rotates the subtree it roots if it is unbalanced.
+        Returns the root of the subtree.
+        """
+        self._update()
+        balance = _height(self._left) - _height(self._right)
+        if balance > 1:
+            # Left-right case: rotate the left subtree first
+            if _height(self._left._left) < _height(self._left._right):
+                self._left = self._left._rotate_left()
+            return self._rotate_right()
+        if balance < -1:
+            # Right-left case: rotate the right subtree first
+            if _height(self._right._right) < _height(self._right._left):
+                self._right = self._right._rotate_right()
+            return self._rotate_left()
+        return self
+
+
+# Index of a missing node in an ArrayBST
+NIL = -1
+
+class ArrayBST(BST):
+    """
+    A binary search tree stored in parallel typed arrays rather than node
+    objects, with the same interface as BST: the values (of the given array
+    typecode, e.g. 'l' for integers or 'd' for floats) and the indices of the
+    left and right children and the subtree size of each node. Slots of
+    deleted nodes are kept on a free list (linked through the left child
+    array) and reused by later insertions. With integer values this takes
+    about 20 bytes per value (8 for the value and 4 each for the two child
+    indices and the size), against about 80 for a node object.
+
+    Traversals pass visit_func a lightweight view of each node, with the same
+    _value, _left, _right and _size attributes as a BST node.
+    """
+    def __init__(self, value=None, typecode='l'):
+        self.typecode = typecode
+        self._values = array(typecode)
+        self._left = array('i')
+        self._right = array('i')
+        self._sizes = array('i')
+        self._root = NIL
+        # First free slot, or NIL
+        self._free = NIL
+        if value is not None:
+            self.insert(value)
+
+    @classmethod
+    def from_iterable(cls, values, typecode='l'):
+        """
+        Returns a perfectly balanced tree holding the given values (see
+        BST.from_iterable()).
+        """
+        tree = cls(typecode=typecode)
+        tree._load(_sort_values(values))
+        return tree
+
+    def merge(self, other):
+        """
+        Returns a new perfectly balanced tree holding the values of this tree
+        and of another one (see BST.merge()).
+        """
+        tree = type(self)(typecode=self.typecode)
+        tree._load(_merge_values(self._get_values(), other._get_values(),
+                                 union=True))
+        return tree
+
+    def _get_values(self):
+        values = self._values
+        return [values[index] for index in self._iter_inorder()]
+
+    def _load(self, values):
+        """
+        Replaces the contents of the tree with a perfectly balanced tree
+        holding the given sorted, distinct values, each stored at its index
+        in the list.
+        """
+        n_values = len(values)
+        self._values = array(self.typecode, values)
+        self._left = array('i', [NIL]) * n_values
+        self._right = array('i', [NIL]) * n_values
+        self._sizes = array('i', [0]) * n_values
+        self._free = NIL
+        self._root = n_values // 2 if n_values else NIL
+
+        # The root of each range of values is its middle one (as in
+        # _BSTNode._build())
+        ranges = [(0, n_values)] if n_values else []
+        while ranges:
+            start, stop = ranges.pop()
+            middle = (start + stop) // 2
+            self._sizes[middle] = stop - start
+            if start < middle:
+                self._left[middle] = (start + middle) // 2
+                ranges.append((start, middle))
+            if middle + 1 < stop:
+                self._right[middle] = (middle + 1 + stop) // 2
+                ranges.append((middle + 1, stop))
+
+    def _new_node(self, value):
+        """
+        Stores a value in a free slot (or a new one), and returns its index.
+        """
+        index = self._free
+        if index == NIL:
+            index = len(self._values)
+            self._values.append(value)
+            self._left.append(NIL)
+            self._right.append(NIL)
+            self._sizes.append(1)
+        else:
+            self._free = self._left[index]
+            self._values[index] = value
+            self._left[index] = NIL
+            self._sizes[index] = 1
+        return index
+
+    def _free_node(self, index):
+        """
+        Puts the slot of a deleted node on the free list.
+        """
+        self._left[index] = self._free
+        self._right[index] = NIL
+        self._free = index
+
+    def insert(self, value):
+        """
+        Inserts a value into the tree.
+        """
+        if self._root == NIL:
+            self._root = self._new_node(value)
+            return
+
+        values, left, right = self._values, self._left, self._right
+        path = []
+        index = self._root
+        while index != NIL:
+            if value == values[index]:
+                raise ValueError("Value (%d) already in tree" % value)
+            path.append(index)
+            index = left[index] if value < values[index] else right[index]
+
+        parent = path[-1]
+        if value < values[parent]:
+            left[parent] = self._new_node(value)
+        else:
+            right[parent] = self._new_node(value)
+        sizes = self._sizes
+        for index in path:
+            sizes[index] += 1
+
+    def search(self, value):
+        """
+        Searches the tree for the given value, and returns True if the value is
+        found; otherwise, returns False.
+        """
+        values, left, right = self._values, self._left, self._right
+        index = self._root
+        while index != NIL:
+            if value < values[index]:
+                index = left[index]
+            elif value > values[index]:
+                index = right[index]
+            else:
+                return True
+        return False
+
+    def delete(self, value):
+        """
+        Deletes the given value from the tree if it exists.
+        """
+        values, left, right = self._values, self._left, self._right
+
+        # Find the node holding the value, keeping the path to it
+        path = []
+        index = self._root
+        while index != NIL and values[index] != value:
+            path.append(index)
+            index = left[index] if value < values[index] else right[index]
+        if index == NIL:
+            # Not found
+            return
+
+        # A node with two children takes the value of its in-order successor,
+        # which is deleted instead
+        if left[index] != NIL and right[index] != NIL:
+            path.append(index)
+            successor = right[index]
+            while left[successor] != NIL:
+                path.append(successor)
+                successor = left[successor]
+            values[index] = values[successor]
+            index = successor
+
+        # The node now has at most one child, which takes its place
+        child = left[index] if left[index] != NIL else right[index]
+        if not path:
+            self._root = child
+        elif left[path[-1]] == index:
+            left[path[-1]] = child
+        else:
+            right[path[-1]] = child
+        self._free_node(index)
+        sizes = self._sizes
+        for index in path:
+            sizes[index] -= 1
+
+    def __len__(self):
+        return self._sizes[self._root] if self._root != NIL else 0
+
+    def rank(self, value):
+        """
+        Returns the number of values in the tree less than the given value.
+        """
+        values, left, right = self._values, self._left, self._right
+        sizes = self._sizes
+        rank = 0
+        index = self._root
+        while index != NIL:
+            if value < values[index]:
+                index = left[index]
+            elif value > values[index]:
+                if left[index] != NIL:
+                    rank += sizes[left[index]]
+                rank += 1
+                index = right[index]
+            else:
+                if left[index] != NIL:
+                    rank += sizes[left[index]]
+                return rank
+        return rank
+
+    def select(self, k):
+        """
+        Returns the k-th smallest value in the tree (counted from 0), and
+        raises IndexError if there is none.
+        """
+        if not 0 <= k < len(self):
+            raise IndexError("Tree index out of range")
+        left, right, sizes = self._left, self._right, self._sizes
+        index = self._root
+        while True:
+            left_size = sizes[left[index]] if left[index] != NIL else 0
+            if k < left_size:
+                index = left[index]
+            elif k > left_size:
+                k -= left_size + 1
+                index = right[index]
+            else:
+                return self._values[index]
+
+    def range(self, lo, hi):
+        """
+        Returns a generator of the values v in the tree with lo <= v < hi, in
+        order (see BST.range()).
+        """
+        values, left, right = self._values, self._left, self._right
+        stack = []
+        index = self._root
+        while stack or index != NIL:
+            while index != NIL:
+                if values[index] < lo:
+                    index = right[index]
+                else:
+                    stack.append(index)
+                    index = left[index]
+            if not stack:
+                return
+            index = stack.pop()
+            if values[index] >= hi:
+                return
+            yield values[index]
+            index = right[index]
+
+    def traverse_preorder(self, visit_func):
+        """
+        Traverses the tree in pre-order fashion, applying the given function to
+        each node encountered and returning a generator containing the results.
+        """
+        if self._root != NIL:
+            return self._visit(self._iter_preorder(), visit_func)
+
+    def traverse_inorder(self, visit_func):
+        """
+        Traverses the tree in in-order fashion, applying the given function to
+        each node encountered and returning a generator containing the results.
+        """
+        if self._root != NIL:
+            return self._visit(self._iter_inorder(), visit_func)
+
+    def traverse_postorder(self, visit_func):
+        """
+        Traverses the tree in post-order fashion, applying the given function
+        to each node encountered and returning a generator containing the
+        results.
+        """
+        if self._root != NIL:
+            return self._visit(self._iter_postorder(), visit_func)
+
+    def _visit(self, indices, visit_func):
+        for index in indices:
+            yield visit_func(_ArrayNode(self, index))
+
+    def _iter_preorder(self):
+        """
+        Yields the node indices in pre-order (see
+        _BSTNode._traverse_preorder()).
+        """
+        left, right = self._left, self._right
+        stack = [self._root]
+        while stack:
+            index = stack.pop()
+            yield index
+            if right[index] != NIL:
+                stack.append(right[index])
+            if left[index] != NIL:
+                stack.append(left[index])
+
+    def _iter_inorder(self):
+        """
+        Yields the node indices in in-order (see _BSTNode._traverse_inorder()).
+        """
+        left, right = self._left, self._right
+        stack = []
+        index = self._root
+        while stack or index != NIL:
+            while index != NIL:
+                stack.append(index)
+                index = left[index]
+            index = stack.pop()
+            yield index
+            index = right[index]
+
+    def _iter_postorder(self):
+        """
+        Yields the node indices in post-order (see
+        _BSTNode._traverse_postorder()).
+        """
+        left, right = self._left, self._right
+        stack = []
+        index = self._root
+        last = NIL
+        while stack or index != NIL:
+            if index != NIL:
+                stack.append(index)
+                index = left[index]
+                continue
+            top = stack[-1]
+            if right[top] != NIL and right[top] != last:
+                index = right[top]
+            else:
+                last = stack.pop()
+                yield last
+
+class _ArrayNode(object):
+    """
+    A view of a node of an ArrayBST, as passed to visit functions.
+    """
+    __slots__ = ('_tree', '_index')
+
+    def __init__(self, tree, index):
+        self._tree = tree
+        self._index = index
+
+    def _child(self, index):
+        return None if index == NIL else _ArrayNode(self._tree, index)
+
+    @property
+    def _value(self):
+        return self._tree._values[self._index]
+
+    @property
+    def _left(self):
+        return self._child(self._tree._left[self._index])
+
+    @property
+    def _right(self):
+        return self._child(self._tree._right[self._index])
+
+    @property
+    def _size(self):
+        return self._tree._sizes[self._index]
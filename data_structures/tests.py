@@ -1,7 +1,7 @@
 import random
 import unittest
 
-from data_structures import bst, stack
+from data_structures import benchmark, bst, stack
 
 class TestDataStructures(unittest.TestCase):
     def test_BST(self):
@@ -46,6 +46,206 @@ class TestDataStructures(unittest.TestCase):
         self.assertTrue(tree.search(7))
         self.assertFalse(tree.search(9))
 
+    def test_BST_degenerate(self):
+        # Sorted input gives a tree deeper than the recursion limit
+        tree = bst.BST()
+        values = range(1, 2001)
+        for value in values:
+            tree.insert(value)
+        self.assertRaises(ValueError, tree.insert, 1000)
+
+        visit_func = lambda node: node._value
+        self.assertEqual(list(tree.traverse_preorder(visit_func)), values)
+        self.assertEqual(list(tree.traverse_inorder(visit_func)), values)
+        self.assertEqual(list(tree.traverse_postorder(visit_func)),
+                         values[::-1])
+        self.assertTrue(tree.search(1999))
+        self.assertFalse(tree.search(0))
+        self.assertFalse(tree.search(2001))
+
+        # Random input, against sorting
+        tree = bst.BST()
+        values = random.sample(range(10000), 1000)
+        for value in values:
+            tree.insert(value)
+        self.assertEqual(list(tree.traverse_inorder(visit_func)),
+                         sorted(values))
+        self.assertEqual(len(list(tree.traverse_preorder(visit_func))), 1000)
+        self.assertEqual(len(set(tree.traverse_postorder(visit_func))), 1000)
+        self.assertEqual(bst.BST().traverse_inorder(visit_func), None)
+
+    def test_BST_delete(self):
+        for tree_type in (bst.BST, bst.AVLTree, bst.ArrayBST):
+            tree = tree_type()
+            values = set()
+            for n in range(3000):
+                value = random.randrange(200)
+                if value in values:
+                    tree.delete(value)
+                    values.remove(value)
+                else:
+                    tree.insert(value)
+                    values.add(value)
+                if n % 100 == 0:
+                    self._check_tree(tree, values)
+            self._check_tree(tree, values)
+
+            # Deleting missing values does nothing
+            tree.delete(-1)
+            self._check_tree(tree, values)
+            for value in list(values):
+                tree.delete(value)
+            self.assertEqual(tree.traverse_inorder(lambda node: node), None)
+            self.assertFalse(tree.search(0))
+            tree.insert(0)
+            self.assertTrue(tree.search(0))
+
+    def test_AVLTree(self):
+        # Sorted input stays balanced
+        tree = bst.AVLTree()
+        for value in range(1, 1024):
+            tree.insert(value)
+        self.assertEqual(tree._root._height, 10)
+        self.assertEqual(tree._root._value, 512)
+        self._check_tree(tree, range(1, 1024))
+        self.assertRaises(ValueError, tree.insert, 100)
+        for value in range(1, 1024, 2):
+            tree.delete(value)
+        self._check_tree(tree, range(2, 1024, 2))
+
+    def test_BST_bulk_load(self):
+        visit_func = lambda node: node._value
+        for tree_type in (bst.BST, bst.AVLTree, bst.ArrayBST):
+            # Sorted input gives a perfectly balanced tree
+            tree = tree_type.from_iterable(range(1, 8))
+            self.assertEqual(list(tree.traverse_preorder(visit_func)),
+                             [4, 2, 1, 3, 6, 5, 7])
+            values = random.sample(range(10000), 1000)
+            tree = tree_type.from_iterable(values)
+            self._check_tree(tree, values)
+            self.assertEqual(tree_type.from_iterable([]).traverse_inorder(
+                visit_func), None)
+            self.assertRaises(ValueError, tree_type.from_iterable, [3, 1, 3])
+
+            # Loading more values, and merging trees
+            more = random.sample(range(10000, 20000), 500)
+            tree.bulk_load(more)
+            self._check_tree(tree, values + more)
+            self.assertRaises(ValueError, tree.bulk_load, [5, values[0]])
+            tree.insert(-1)
+            tree.delete(values[0])
+
+            other = tree_type.from_iterable(range(9000, 11000))
+            merged = tree.merge(other)
+            expected = ((set(values + more + [-1]) - set(values[:1]))
+                        | set(range(9000, 11000)))
+            self._check_tree(merged, expected)
+            self.assertTrue(type(merged) is tree_type)
+            self._check_tree(tree.merge(tree_type()),
+                             list(tree.traverse_inorder(visit_func)))
+
+    def test_ArrayBST(self):
+        tree = bst.ArrayBST()
+        for value in (5, 3, 7, 2, 8, 4, 6):
+            tree.insert(value)
+        visit_func = lambda node: node._value
+        self.assertEqual(list(tree.traverse_preorder(visit_func)),
+                         [5, 3, 2, 4, 7, 6, 8])
+        self.assertEqual(list(tree.traverse_postorder(visit_func)),
+                         [2, 4, 3, 6, 8, 7, 5])
+        root = next(tree.traverse_preorder(lambda node: node))
+        self.assertEqual((root._left._value, root._right._left._value),
+                         (3, 6))
+        self.assertEqual(root._left._left._left, None)
+
+        # Deleted slots are reused
+        tree.delete(3)
+        tree.delete(8)
+        tree.insert(1)
+        tree.insert(9)
+        self.assertEqual(len(tree._values), 7)
+        self._check_tree(tree, [1, 2, 4, 5, 6, 7, 9])
+        tree.insert(10)
+        self.assertEqual(len(tree._values), 8)
+
+        tree = bst.ArrayBST.from_iterable([0.5, 0.25, 1.5], typecode='d')
+        self._check_tree(tree.merge(bst.ArrayBST(2.5, typecode='d')),
+                         [0.25, 0.5, 1.5, 2.5])
+
+    def test_BST_order_statistics(self):
+        for tree_type in (bst.BST, bst.AVLTree, bst.ArrayBST):
+            tree = tree_type()
+            self.assertEqual(len(tree), 0)
+            self.assertEqual(tree.rank(5), 0)
+            self.assertRaises(IndexError, tree.select, 0)
+            self.assertEqual(tree.count_range(0, 10), 0)
+            self.assertEqual(list(tree.range(0, 10)), [])
+
+            values = random.sample(range(0, 2000, 2), 300)
+            for value in values:
+                tree.insert(value)
+            for value in values[:100]:
+                tree.delete(value)
+            values = sorted(values[100:])
+            self._check_tree(tree, values)
+
+            for k, value in enumerate(values):
+                self.assertEqual(tree.select(k), value)
+                self.assertEqual(tree.rank(value), k)
+                self.assertEqual(tree.rank(value + 1), k + 1)
+            self.assertRaises(IndexError, tree.select, len(values))
+            self.assertRaises(IndexError, tree.select, -1)
+            self.assertEqual(tree.rank(-1), 0)
+            self.assertEqual(tree.rank(2000), len(values))
+
+            for lo, hi in [(-10, 3000), (100, 101), (100, 100), (500, 200),
+                           (values[10], values[50]),
+                           (values[10] + 1, values[50] + 1)]:
+                expected = [value for value in values if lo <= value < hi]
+                self.assertEqual(list(tree.range(lo, hi)), expected)
+                self.assertEqual(tree.count_range(lo, hi), len(expected))
+
+            # Trees built in bulk have sizes too
+            tree = tree_type.from_iterable(values)
+            self._check_tree(tree, values)
+            self.assertEqual(tree.select(len(values) // 2),
+                             values[len(values) // 2])
+
+    def test_benchmark(self):
+        results = list(benchmark.run_benchmarks(['array', 'avl', 'bst'],
+                                                [100, 20000]))
+        self.assertEqual([(name, n_keys) for name, n_keys, times in results],
+                         [('array', 100), ('avl', 100), ('avl', 20000),
+                          ('bst', 100)])
+        for name, n_keys, times in results:
+            self.assertEqual(sorted(times),
+                             ['bulk_load', 'delete', 'insert', 'search'])
+        # Array storage takes at least 3x less memory than node objects
+        self.assertTrue(3 * benchmark.measure_memory('array', 10000)
+                        <= benchmark.measure_memory('bst', 10000))
+
+    def _check_tree(self, tree, values):
+        """
+        Checks that the tree holds the given values in order, that every node
+        has the right subtree size and, for an AVL tree, that every node has
+        the right height and is balanced.
+        """
+        visit_func = lambda node: node._value
+        self.assertEqual(list(tree.traverse_inorder(visit_func) or []),
+                         sorted(values))
+        for value in values:
+            self.assertTrue(tree.search(value))
+        self.assertEqual(len(tree), len(values))
+        for node in tree.traverse_postorder(lambda node: node) or []:
+            sizes = [child._size for child in (node._left, node._right)
+                     if child is not None]
+            self.assertEqual(node._size, 1 + sum(sizes))
+        if isinstance(tree, bst.AVLTree) and values:
+            for node in tree.traverse_postorder(lambda node: node):
+                heights = [bst._height(node._left), bst._height(node._right)]
+                self.assertEqual(node._height, 1 + max(heights))
+                self.assertTrue(abs(heights[0] - heights[1]) <= 1)
+
     def test_Stack(self):
         stk = stack.Stack()
 
@@ -0,0 +1,339 @@
+"""
+Monte Carlo discard advice.
+
+For each tile that can be discarded from a hand of 3n + 2 tiles, the advisor
+estimates the probability of winning by self-draw within n_draws draws, and
+the expected han, by sampling draw sequences from the unseen tiles (the
+tiles neither in the hand nor visible elsewhere) and playing them out with a
+discard policy from simulate.POLICIES:
+
+    with DiscardAdvisor(processes=4) as advisor:
+        for estimate in advisor.advise(parse_counts("1234567m1289p11z5z")):
+            print format_codes([estimate.code]), estimate.win_probability
+
+Samples are run in rounds of a batch of samples per discard (the discards
+with the fewest samples first), either in this process or over a process
+pool, and the deadline is checked after each batch. Batches hold batch_size
+samples, or fewer when the time per sample measured so far says that they
+would not fit in the remaining budget. Every discard gets at least one
+sample, so the first call for a hand can still overrun the budget slightly
+while the shanten tables are being filled in for new suit shapes. Estimates
+are kept per hand and unseen tiles, so asking again about the same situation
+refines them further, and batches still running when the budget runs out are
+merged when they finish.
+Within each process, policy decisions and han of complete hands are cached
+by hand, since the same hands come up again and again across samples.
+"""
+import argparse
+import multiprocessing
+import random
+import time
+from collections import deque, namedtuple
+
+from tile import N_TILE_KINDS
+from lru import DEFAULT_CACHE_SIZE, LRUCache
+from utils import SUIT_TABLE
+from simulate import POLICIES
+from batch import score_hand
+from notation import parse_counts, format_codes
+
+DEFAULT_DRAWS = 12
+DEFAULT_BUDGET = 0.05
+DEFAULT_BATCH_SIZE = 5
+DEFAULT_POLICY = 'shanten'
+
+class DiscardEstimate(namedtuple('DiscardEstimate', ('code', 'n_samples',
+                                                     'n_wins', 'total_han'))):
+    """
+    Sampled results for a discard: the numbers of samples and of wins, and
+    the sum of the han of the wins.
+    """
+    __slots__ = ()
+
+    @property
+    def win_probability(self):
+        return float(self.n_wins) / self.n_samples if self.n_samples else 0.0
+
+    @property
+    def expected_han(self):
+        """
+        The mean han per sample, counting 0 for samples without a win.
+        """
+        return (float(self.total_han) / self.n_samples if self.n_samples
+                else 0.0)
+
+#### Sampling
+
+# Per-process caches of the discard chosen by a policy for (policy, hand,
+# drawn tile) and of the han of complete hands
+DISCARD_CACHE = LRUCache(DEFAULT_CACHE_SIZE)
+HAN_CACHE = LRUCache(DEFAULT_CACHE_SIZE)
+
+def _get_discard(policy, counts, drawn):
+    key = policy, tuple(counts), drawn
+    discard = DISCARD_CACHE.get(key)
+    if discard is None:
+        discard = POLICIES[policy](counts, drawn)
+        DISCARD_CACHE.put(key, discard)
+    return discard
+
+def _get_han(counts):
+    """
+    Returns the han of a complete closed hand won by self-draw.
+    """
+    key = tuple(counts)
+    han = HAN_CACHE.get(key)
+    if han is None:
+        keys, han = score_hand(counts, self_drawn=True)
+        HAN_CACHE.put(key, han)
+    return han
+
+def run_samples(args):
+    """
+    Plays out a batch of samples, given (hand counts after the discard,
+    unseen tile codes, number of samples, number of draws, policy name,
+    seed), and returns (number of wins, total han).
+    """
+    counts, unseen, n_samples, n_draws, policy, seed = args
+    counts = list(counts)
+    rng = random.Random(seed)
+    n_draws = min(n_draws, len(unseen))
+    n_wins = total_han = 0
+
+    for n in range(n_samples):
+        hand = list(counts)
+        for drawn in rng.sample(unseen, n_draws):
+            hand[drawn] += 1
+            if SUIT_TABLE.is_complete(hand):
+                n_wins += 1
+                total_han += _get_han(hand)
+                break
+            hand[_get_discard(policy, hand, drawn)] -= 1
+
+    return n_wins, total_han
+
+#### Advice
+
+class _Tally(object):
+    """
+    Accumulated samples for one discard from one hand.
+    """
+    def __init__(self):
+        self.n_samples = 0
+        self.n_wins = 0
+        self.total_han = 0
+        # Number of batches submitted so far (used to seed the next one)
+        self.n_batches = 0
+
+    def add(self, n_samples, result):
+        n_wins, total_han = result
+        self.n_samples += n_samples
+        self.n_wins += n_wins
+        self.total_han += total_han
+
+class DiscardAdvisor(object):
+    """
+    Estimates the outcome of each discard from a hand by sampling, in this
+    process or over a pool of worker processes (all CPUs if processes is
+    None). The pool is kept until close() is called.
+    """
+    def __init__(self, processes=1, n_draws=DEFAULT_DRAWS,
+                 policy=DEFAULT_POLICY, batch_size=DEFAULT_BATCH_SIZE,
+                 seed=0, maxsize=DEFAULT_CACHE_SIZE):
+        if policy not in POLICIES:
+            raise ValueError("Unknown discard policy: %s" % policy)
+        self.n_draws = n_draws
+        self.policy = policy
+        self.batch_size = batch_size
+        self.seed = seed
+        # Tallies of each discard, keyed by hand and unseen tile counts
+        self._tallies = LRUCache(maxsize)
+        # Batches submitted to the pool, as (tally, number of samples,
+        # submission time, async result)
+        self._pending = deque()
+        # Seconds per sample of the last batch, None until one has finished
+        self._sample_time = None
+        self._pool = (None if processes == 1
+                      else multiprocessing.Pool(processes))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def info(self):
+        """
+        Returns the counters of the per-hand estimate cache (see
+        LRUCache.info()).
+        """
+        return self._tallies.info()
+
+    def _get_tallies(self, counts, visible):
+        """
+        Returns the unseen tile counts and the tallies of each discard (in
+        code order) for the hand.
+        """
+        counts = tuple(counts)
+        if sum(counts) % 3 != 2:
+            raise ValueError("Expected a hand of 3n + 2 tiles")
+        if visible is None:
+            visible = [0] * N_TILE_KINDS
+        unseen = tuple([4 - count - n_visible
+                        for count, n_visible in zip(counts, visible)])
+        if min(unseen) < 0:
+            raise ValueError("More than four copies of a tile")
+
+        key = counts, unseen
+        tallies = self._tallies.get(key)
+        if tallies is None:
+            tallies = [(code, _Tally()) for code in range(N_TILE_KINDS)
+                       if counts[code]]
+            self._tallies.put(key, tallies)
+        return unseen, tallies
+
+    def _get_batch_size(self, n_discards, deadline):
+        """
+        Returns the number of samples of the next batch, given the number of
+        discards still to sample in the round: batch_size, or fewer if that
+        many batches for each would not fit before the deadline (at least
+        one, and only one until a batch has been timed).
+        """
+        if deadline is None:
+            return self.batch_size
+        if self._sample_time is None:
+            return 1
+        remaining = deadline - time.time()
+        n_samples = int(remaining / (n_discards * self._sample_time))
+        return max(1, min(self.batch_size, n_samples))
+
+    def _add(self, tally, n_samples, result, elapsed):
+        tally.add(n_samples, result)
+        self._sample_time = elapsed / n_samples
+
+    def _run_round(self, counts, unseen, tallies, deadline=None):
+        """
+        Runs a batch of samples for each discard, those with the fewest
+        samples first, and waits for the results until the deadline (or for
+        all of them if it is None, or if some discard has no samples yet).
+        The round stops early at the deadline once every discard has
+        samples.
+        """
+        unseen_codes = [code for code in range(N_TILE_KINDS)
+                        for n in range(unseen[code])]
+        order = sorted(tallies, key=lambda item: item[1].n_samples)
+        for n, (code, tally) in enumerate(order):
+            if (deadline is not None and tally.n_samples
+                    and time.time() >= deadline):
+                break
+            n_samples = self._get_batch_size(len(order) - n, deadline)
+            hand = list(counts)
+            hand[code] -= 1
+            seed = hash((self.seed, tuple(counts), unseen, code,
+                         tally.n_batches))
+            args = (hand, unseen_codes, n_samples, self.n_draws, self.policy,
+                    seed)
+            tally.n_batches += 1
+            start = time.time()
+            if self._pool is None:
+                result = run_samples(args)
+                self._add(tally, n_samples, result, time.time() - start)
+            else:
+                self._pending.append(
+                    (tally, n_samples, start,
+                     self._pool.apply_async(run_samples, (args,))))
+        self._collect(tallies, deadline)
+
+    def _collect(self, tallies=(), deadline=None):
+        """
+        Merges the results of all finished batches, then waits for those of
+        the given tallies until the deadline (or until they are all done if
+        it is None, or while some of the tallies have no samples yet).
+        """
+        current = set([tally for code, tally in tallies])
+        while True:
+            pending = deque()
+            for batch in self._pending:
+                tally, n_samples, start, result = batch
+                if result.ready():
+                    # The time from submission overestimates the time per
+                    # sample, which only makes the next batches smaller
+                    self._add(tally, n_samples, result.get(),
+                              time.time() - start)
+                else:
+                    pending.append(batch)
+            self._pending = pending
+
+            waiting = [result for tally, n_samples, start, result in pending
+                       if tally in current]
+            if not waiting:
+                return
+            if deadline is None or not all([tally.n_samples
+                                            for tally in current]):
+                waiting[0].wait()
+            else:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    return
+                waiting[0].wait(timeout)
+
+    def _get_estimates(self, tallies):
+        estimates = [DiscardEstimate(code, tally.n_samples, tally.n_wins,
+                                     tally.total_han)
+                     for code, tally in tallies]
+        estimates.sort(key=lambda estimate: (-estimate.expected_han,
+                                             -estimate.win_probability))
+        return estimates
+
+    def iter_advice(self, counts, visible=None):
+        """
+        Yields the DiscardEstimates of the hand after each round of samples,
+        best first (by expected han, then by win probability). visible is
+        the count vector of the tiles seen outside the hand (discards, calls
+        and dora indicators).
+        """
+        unseen, tallies = self._get_tallies(counts, visible)
+        while True:
+            self._run_round(counts, unseen, tallies)
+            yield self._get_estimates(tallies)
+
+    def advise(self, counts, visible=None, budget=DEFAULT_BUDGET):
+        """
+        Returns the DiscardEstimates of the hand (see iter_advice()) after
+        sampling for about budget seconds (see the module docstring).
+        """
+        deadline = time.time() + budget
+        unseen, tallies = self._get_tallies(counts, visible)
+        self._collect()
+        while True:
+            self._run_round(counts, unseen, tallies, deadline)
+            if time.time() >= deadline:
+                return self._get_estimates(tallies)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Advise on discards.")
+    parser.add_argument('hand', help='hand in tile notation, e.g. '
+                        '"123m456p789s1122z5z"')
+    parser.add_argument('--visible', default='',
+                        help='tiles seen outside the hand, in tile notation')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET)
+    parser.add_argument('--draws', type=int, default=DEFAULT_DRAWS)
+    parser.add_argument('--policy', choices=sorted(POLICIES),
+                        default=DEFAULT_POLICY)
+    parser.add_argument('--processes', type=int, default=1,
+                        help="number of worker processes (0 for all CPUs)")
+    args = parser.parse_args()
+    with DiscardAdvisor(args.processes or None, args.draws,
+                        args.policy) as advisor:
+        for estimate in advisor.advise(parse_counts(args.hand),
+                                       parse_counts(args.visible),
+                                       args.budget):
+            print "%-4s %8d samples  win %.4f  han %.3f" % (
+                format_codes([estimate.code]), estimate.n_samples,
+                estimate.win_probability, estimate.expected_han)
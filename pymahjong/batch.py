@@ -0,0 +1,153 @@
+"""
+Vectorized yaku evaluation over many hands at once.
+
+Hands are given as an N x 34 array of tile count vectors (covering all tiles
+of the hand, including called melds, with a called quad counted as four
+tiles) plus a length-N boolean array telling which hands are open. Only yaku
+that can be decided from the tile counts alone are evaluated; the hands are
+assumed to be complete (see shanten.shanten_batch() to check this).
+"""
+import numpy as np
+
+from tile import (N_TILE_KINDS, MAN_OFFSET, PIN_OFFSET, SOU_OFFSET,
+                  WIND_OFFSET, TERMINAL_CODES, YAOCHUU_CODES)
+from yaku import YAKU_INFO, YAKUMAN_INFO, evaluate_code_grouping, get_yaku_keys
+from utils import SUIT_TABLE
+
+# Yaku evaluated by evaluate_batch(), in column order
+BATCH_YAKU = ('tan', 'hon', 'chn', 'chi', 'hro', 'toi', 'kok')
+# Columns of the yakuman among them, and of the other yaku
+YAKUMAN_COLUMNS = [n for n, key in enumerate(BATCH_YAKU)
+                   if key in YAKUMAN_INFO]
+NON_YAKUMAN_COLUMNS = [n for n, key in enumerate(BATCH_YAKU)
+                       if key not in YAKUMAN_INFO]
+# Yaku decided by the tile counts alone that yaku.evaluate_grouping() does not
+# score, and which add to any reading of a hand
+COUNT_YAKU = ('hon', 'hro')
+
+SIMPLE_CODES = sorted(set(range(WIND_OFFSET)) - set(TERMINAL_CODES))
+
+def evaluate_batch(counts, is_open=None):
+    """
+    Returns an N x len(BATCH_YAKU) boolean array telling which of the
+    BATCH_YAKU each hand satisfies. is_open defaults to all hands closed.
+    Yakuman do not combine with other yaku, so the other yaku columns of a
+    hand satisfying a yakuman are cleared.
+    """
+    counts = np.asarray(counts)
+    if counts.ndim != 2 or counts.shape[1] != N_TILE_KINDS:
+        raise ValueError("Expected an N x %d array of counts" % N_TILE_KINDS)
+    n_hands = len(counts)
+    if is_open is None:
+        is_open = np.zeros(n_hands, dtype=bool)
+    closed = ~np.asarray(is_open, dtype=bool)
+
+    present = counts > 0
+    n_tiles = counts.sum(axis=1)
+    n_kinds = present.sum(axis=1)
+    has_honours = present[:, WIND_OFFSET:].any(axis=1)
+    has_terminals = present[:, list(TERMINAL_CODES)].any(axis=1)
+    has_simples = present[:, SIMPLE_CODES].any(axis=1)
+    n_suits = sum([present[:, offset:offset + 9].any(axis=1)
+                   for offset in (MAN_OFFSET, PIN_OFFSET, SOU_OFFSET)])
+
+    results = np.empty((n_hands, len(BATCH_YAKU)), dtype=bool)
+    columns = dict([(key, results[:, n]) for n, key in enumerate(BATCH_YAKU)])
+
+    # Tanyao: simples only
+    columns['tan'][:] = ~has_terminals & ~has_honours & (n_tiles > 0)
+    # Honitsu: one suit plus honours
+    columns['hon'][:] = (n_suits == 1) & has_honours
+    # Chinitsu: one suit only
+    columns['chn'][:] = (n_suits == 1) & ~has_honours
+    # Chitoitsu: seven distinct pairs, closed only
+    columns['chi'][:] = (closed & (n_kinds == 7)
+                         & ((counts == 2).sum(axis=1) == 7))
+    # Honroutou: terminals and honours only, with at least one of each
+    columns['hro'][:] = ~has_simples & has_terminals & has_honours
+    # Toitoi: one pair, the rest triplets or quads (four tiles each)
+    n_quads = (counts == 4).sum(axis=1)
+    columns['toi'][:] = (((counts == 2).sum(axis=1) == 1)
+                         & ((counts == 1).sum(axis=1) == 0)
+                         & (n_tiles == 14 + n_quads))
+    # Kokushi musou: every terminal and honour, nothing else, closed only
+    has_all_yaochuu = present[:, list(YAOCHUU_CODES)].all(axis=1)
+    columns['kok'][:] = (closed & has_all_yaochuu
+                         & (n_kinds == len(YAOCHUU_CODES)))
+
+    yakuman = results[:, YAKUMAN_COLUMNS].any(axis=1)
+    results[np.ix_(yakuman, NON_YAKUMAN_COLUMNS)] = False
+    return results
+
+def get_han_batch(results, is_open=None):
+    """
+    Returns the total han of each hand for the yaku matrix returned by
+    evaluate_batch(), using the closed or open han values from YAKU_INFO and
+    YAKUMAN_INFO. Hands with a yakuman only score the han of their yakuman.
+    """
+    info = dict(YAKU_INFO, **YAKUMAN_INFO)
+    han_closed = np.array([info[key].han_closed for key in BATCH_YAKU])
+    han_open = np.array([info[key].han_open for key in BATCH_YAKU])
+    results = np.array(results, dtype=np.int64)
+    # Regular yaku are ignored in hands with a yakuman
+    yakuman = results[:, YAKUMAN_COLUMNS].any(axis=1)
+    results[np.ix_(yakuman, NON_YAKUMAN_COLUMNS)] = 0
+    if is_open is None:
+        return results.dot(han_closed)
+    return np.where(is_open, results.dot(han_open), results.dot(han_closed))
+
+#### Scoring single hands
+
+def get_readings(counts, grouping_scores=None, is_open=False):
+    """
+    Returns (han, yaku keys) for each reading of a complete hand, highest han
+    first: each standard-form grouping, given as the (mask, han) pairs
+    returned by yaku.evaluate_grouping(), then chitoitsu and kokushi musou.
+    The COUNT_YAKU satisfied by the hand are added to every reading. counts
+    covers all tiles of the hand, including melds. grouping_scores defaults
+    to the groupings of a closed hand, decomposed with utils.SUIT_TABLE.
+    Returns an empty list if the hand has no reading.
+    """
+    if grouping_scores is None:
+        grouping_scores = [evaluate_code_grouping(groups)
+                           for groups in SUIT_TABLE.decompose(counts)]
+    result = dict(zip(BATCH_YAKU, evaluate_batch([counts], [is_open])[0]))
+    if result['kok'] and sum(counts) == 14:
+        return [(YAKUMAN_INFO['kok'].han_closed, ['kok'])]
+
+    han_key = 'han_open' if is_open else 'han_closed'
+    readings = [(han, get_yaku_keys(mask)) for mask, han in grouping_scores]
+    if result['chi']:
+        # Only yaku decided by the tile counts apply to chitoitsu
+        keys = [key for key in BATCH_YAKU
+                if result[key] and key not in COUNT_YAKU]
+        readings.append((sum([YAKU_INFO[key].han_closed for key in keys]),
+                         keys))
+
+    extra = [key for key in COUNT_YAKU if result[key]]
+    extra_han = sum([getattr(YAKU_INFO[key], han_key) for key in extra])
+    for n, (han, keys) in enumerate(readings):
+        if 'hro' in extra and 'cha' in keys:
+            # Honroutou hands have no sequences, so they never score chanta
+            keys = [key for key in keys if key != 'cha']
+            han -= getattr(YAKU_INFO['cha'], han_key)
+        readings[n] = han + extra_han, keys + extra
+    readings.sort(key=lambda reading: -reading[0])
+    return readings
+
+def score_hand(counts, grouping_scores=None, is_open=False,
+               self_drawn=False):
+    """
+    Returns (yaku keys, han) for the highest-scoring reading of a complete
+    hand (see get_readings()), adding menzen tsumo if a closed hand without
+    a yakuman was won by self-draw. Returns ([], None) if the hand has no
+    reading.
+    """
+    readings = get_readings(counts, grouping_scores, is_open)
+    if not readings:
+        return [], None
+    han, keys = readings[0]
+    if (self_drawn and not is_open
+            and not any([key in YAKUMAN_INFO for key in keys])):
+        keys, han = keys + ['smo'], han + YAKU_INFO['smo'].han_closed
+    return keys, han
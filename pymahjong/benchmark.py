@@ -0,0 +1,287 @@
+"""
+Benchmarks for the hot paths of pymahjong.
+
+Every benchmark runs over fixed, seeded corpora of 14-tile hands:
+    random:     any 14 tiles from a full set
+    chinitsu:   14 tiles of a single suit
+    chiitoitsu: seven distinct pairs
+    honours:    eight honour tiles plus six random tiles
+
+For each (benchmark, corpus) pair the best time per hand over a number of
+repeats and the peak memory allocated while running the whole corpus are
+reported. Memory is traced with tracemalloc where it is available; otherwise
+(as on Python 2) the sizes of the results held at the end of the run are
+added up with sys.getsizeof(), like data_structures/benchmark.py does. The
+resident set size of a process is not used, as it mostly measures the pages
+of the mapped suit table.
+Results can be saved as JSON and compared against a saved baseline, flagging
+any measurement that got worse by more than a threshold:
+
+    python benchmark.py -o baseline.json
+    python benchmark.py --baseline baseline.json --threshold 0.2
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from tile import N_TILE_KINDS, WIND_OFFSET, TILES
+from utils import (group_concealed_tiles, group_concealed_tiles_bruteforce,
+                   group_concealed_tiles_and_convert,
+                   get_sequence_and_triplet_indices, is_complete)
+from shanten import shanten
+from yaku import YAKU_INFO, evaluate_grouping
+
+DEFAULT_SEED = 0
+DEFAULT_SIZE = 100
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.2
+HAND_SIZE = 14
+
+METRICS = ('time_per_hand', 'peak_memory')
+# Differences below these are treated as noise when comparing results
+NOISE_FLOORS = {'time_per_hand': 0., 'peak_memory': 64 * 1024}
+
+#### Corpora
+
+def _sample(rng, codes, n_tiles):
+    """
+    Draws tiles from a full set of tiles restricted to the given codes.
+    """
+    return rng.sample([TILES[code] for code in codes for n in range(4)],
+                      n_tiles)
+
+def _random_hand(rng):
+    return _sample(rng, range(N_TILE_KINDS), HAND_SIZE)
+
+def _chinitsu_hand(rng):
+    offset = 9 * rng.randrange(3)
+    return _sample(rng, range(offset, offset + 9), HAND_SIZE)
+
+def _chiitoitsu_hand(rng):
+    tiles = [TILES[code] for code in rng.sample(range(N_TILE_KINDS), 7)] * 2
+    rng.shuffle(tiles)
+    return tiles
+
+def _honours_hand(rng):
+    tiles = (_sample(rng, range(WIND_OFFSET, N_TILE_KINDS), 8)
+             + _sample(rng, range(WIND_OFFSET), HAND_SIZE - 8))
+    rng.shuffle(tiles)
+    return tiles
+
+CORPORA = (
+    ('random', _random_hand),
+    ('chinitsu', _chinitsu_hand),
+    ('chiitoitsu', _chiitoitsu_hand),
+    ('honours', _honours_hand),
+)
+
+def make_corpus(name, size=DEFAULT_SIZE, seed=DEFAULT_SEED):
+    """
+    Returns the named corpus of hands (lists of tiles). The same name, size
+    and seed always give the same hands.
+    """
+    make_hand = dict(CORPORA)[name]
+    rng = random.Random("%s-%d" % (name, seed))
+    return [make_hand(rng) for n in range(size)]
+
+#### Benchmarks
+
+# Yaku with a predicate taking only the groups
+_GROUP_PREDICATES = [info.func for key, info in sorted(YAKU_INFO.items())
+                     if info.func is not None
+                     and key not in ('pfu', 'yak', 'chi')]
+
+def _run_yaku_predicates(tiles):
+    for groups in group_concealed_tiles_and_convert(tiles):
+        for func in _GROUP_PREDICATES:
+            func(groups)
+
+def _run_evaluate_grouping(tiles):
+    for groups in group_concealed_tiles_and_convert(tiles):
+        evaluate_grouping(groups)
+
+def _run_sequence_and_triplet_indices(tiles):
+    get_sequence_and_triplet_indices(sorted(tiles))
+
+BENCHMARKS = (
+    ('group_concealed_tiles', group_concealed_tiles),
+    ('group_concealed_tiles_bruteforce', group_concealed_tiles_bruteforce),
+    ('get_sequence_and_triplet_indices', _run_sequence_and_triplet_indices),
+    ('yaku_predicates', _run_yaku_predicates),
+    ('evaluate_grouping', _run_evaluate_grouping),
+    ('shanten', shanten),
+    ('is_complete', is_complete),
+)
+
+def _run_corpus(func, corpus):
+    # The results are kept until the whole corpus has run, so that they
+    # count towards the peak memory
+    return [func(tiles) for tiles in corpus]
+
+def time_corpus(func, corpus, repeat=DEFAULT_REPEAT):
+    """
+    Returns the best time per hand, in seconds, of running func on every
+    hand of the corpus, over the given number of repeats. A first, untimed
+    run fills any lazily built tables and caches.
+    """
+    _run_corpus(func, corpus)
+    best = None
+    for n in range(repeat):
+        start = time.time()
+        _run_corpus(func, corpus)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / max(len(corpus), 1)
+
+def _get_size(obj, seen):
+    """
+    Returns the size in bytes, from sys.getsizeof(), of the object and of
+    the objects it refers to through containers and instance attributes,
+    skipping (and adding to seen) the ids of objects already counted.
+    """
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, dict):
+        children = obj.keys() + obj.values()
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        children = obj
+    else:
+        children = [getattr(obj, name) for cls in type(obj).__mro__
+                    for name in cls.__dict__.get('__slots__', ())
+                    if hasattr(obj, name)]
+        if hasattr(obj, '__dict__'):
+            children.append(obj.__dict__)
+    return sys.getsizeof(obj) + sum([_get_size(child, seen)
+                                     for child in children])
+
+def measure_peak_memory(name, corpus_name, size=DEFAULT_SIZE,
+                        seed=DEFAULT_SEED):
+    """
+    Returns the peak memory, in bytes, allocated while running the named
+    benchmark on every hand of the corpus (and holding on to all of its
+    results). Without tracemalloc, this is the size of the results, not
+    counting the objects they share with the corpus (such as the tiles).
+    """
+    func = dict(BENCHMARKS)[name]
+    corpus = make_corpus(corpus_name, size, seed)
+    if tracemalloc is None:
+        seen = set()
+        _get_size(corpus, seen)
+        return _get_size(_run_corpus(func, corpus), seen)
+
+    tracemalloc.start()
+    try:
+        _run_corpus(func, corpus)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_benchmarks(names=None, size=DEFAULT_SIZE, seed=DEFAULT_SEED,
+                   repeat=DEFAULT_REPEAT, memory=True):
+    """
+    Runs the named benchmarks (all by default) on every corpus, and returns
+    the results as a JSON-serializable dictionary (see time_corpus() and
+    measure_peak_memory()). Peak memory is left out if memory is False.
+    """
+    benchmarks = [(name, func) for name, func in BENCHMARKS
+                  if names is None or name in names]
+    corpora = [(name, make_corpus(name, size, seed)) for name, make_hand
+               in CORPORA]
+
+    results = {}
+    for name, func in benchmarks:
+        for corpus_name, corpus in corpora:
+            result = {'time_per_hand': time_corpus(func, corpus, repeat)}
+            if memory:
+                result['peak_memory'] = measure_peak_memory(name, corpus_name,
+                                                            size, seed)
+            results["%s/%s" % (name, corpus_name)] = result
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'size': size,
+            'seed': seed,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Returns (key, metric, baseline value, current value) for every result
+    that is worse than the baseline by more than the threshold (a fraction,
+    e.g. 0.2 for 20%) and by more than the noise floor of the metric.
+    Results missing from either side are ignored.
+    """
+    regressions = []
+    for key, result in sorted(current['results'].items()):
+        baseline_result = baseline['results'].get(key, {})
+        for metric in METRICS:
+            if metric not in result or metric not in baseline_result:
+                continue
+            old, new = baseline_result[metric], result[metric]
+            if new > max(old, NOISE_FLOORS[metric]) * (1 + threshold):
+                regressions.append((key, metric, old, new))
+    return regressions
+
+def format_change(old, new):
+    """
+    Returns the relative change from old to new as a percentage, e.g. "+25%"
+    (or "new" if old is 0).
+    """
+    if not old:
+        return "new" if new else "+0%"
+    return "%+.0f%%" % (100. * (new - old) / old)
+
+def format_results(results):
+    """
+    Returns a human-readable table of benchmark results.
+    """
+    lines = ["%-50s %14s %12s" % ("benchmark/corpus", "us/hand", "peak KiB")]
+    for key, result in sorted(results['results'].items()):
+        memory = result.get('peak_memory')
+        lines.append("%-50s %14.1f %12s"
+                     % (key, 1e6 * result['time_per_hand'],
+                        "-" if memory is None else "%.1f" % (memory / 1024.)))
+    return "\n".join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark pymahjong.")
+    parser.add_argument('benchmarks', nargs='*',
+                        help="benchmarks to run (default: all of %s)"
+                        % ", ".join([name for name, func in BENCHMARKS]))
+    parser.add_argument('-o', '--output', help="write results as JSON")
+    parser.add_argument('--baseline', help="JSON results to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--no-memory', action='store_true')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.benchmarks or None, args.size, args.seed,
+                             args.repeat, not args.no_memory)
+    print format_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for key, metric, old, new in regressions:
+            print "REGRESSION %s %s: %g -> %g (%s)" % (
+                key, metric, old, new, format_change(old, new))
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,262 @@
+"""
+Hand decomposition on tile count vectors.
+
+A hand is represented as a count vector: a list of 34 integers giving the
+number of copies of each tile kind, indexed by tile code (see tile.py).
+Groups are represented as tuples of tile codes, e.g. (4, 4) for a pair of
+5-man or (9, 10, 11) for a 1-2-3 pin sequence.
+"""
+from tile import (N_TILE_KINDS, MAN_OFFSET, PIN_OFFSET, SOU_OFFSET,
+                  WIND_OFFSET, YAOCHUU_CODES)
+import instrument
+from lru import DEFAULT_CACHE_SIZE, LRUCache
+
+SUIT_OFFSETS = (MAN_OFFSET, PIN_OFFSET, SOU_OFFSET)
+
+def tiles_to_counts(tiles):
+    """
+    Returns the count vector of the given tiles.
+    """
+    counts = [0] * N_TILE_KINDS
+    for tile in tiles:
+        counts[tile.code] += 1
+    return counts
+
+def is_sequence_head_code(code):
+    """
+    Checks if a sequence can start at the given tile code.
+    """
+    return code < WIND_OFFSET and code % 9 <= 6
+
+class DecompositionCache(LRUCache):
+    """
+    A bounded LRU cache of decompositions, keyed on count tuples (or on
+    suit keys, for the decoded suits of a tables.SuitTable).
+
+    In decompose_counts() the same cache serves top-level lookups and the
+    sub-problems solved while decomposing, so recurring hands and recurring
+    remainders of hands are only decomposed once. Cached decompositions are
+    nested tuples and hence cannot be modified by callers.
+    """
+
+# Cache shared by all calls of decompose_counts() unless another one is
+# given (group_concealed_tiles() only reaches it for hands beyond the suit
+# table, and has its own cache in SUIT_TABLE)
+CACHE = DecompositionCache()
+
+def decompose_counts(counts, cache=None):
+    """
+    Returns all distinct decompositions of the count vector into groups (one
+    pair if the tile count is 3n + 2, otherwise none, plus sequences and
+    triplets). Each decomposition is a tuple of groups in sorted order, and
+    the decompositions are returned as a tuple.
+
+    The search walks the tile kinds in order and, at each kind, decides at
+    once how many pairs, triplets and sequences start there, so that every
+    distinct decomposition is produced exactly once. Results for the hand
+    and for every remainder of it are memoized in the given cache (the
+    shared CACHE by default).
+    """
+    if cache is None:
+        cache = CACHE
+    return _decompose(tuple(counts), cache)
+
+def _decompose(key, cache):
+    """
+    Returns the decompositions of the count tuple, using the cache.
+    """
+    decompositions = cache.get(key)
+    stats = instrument.active
+    if decompositions is None:
+        if stats is None:
+            decompositions = _search(key, cache)
+        else:
+            stats.cache_misses += 1
+            stats.enter()
+            try:
+                decompositions = _search(key, cache)
+            finally:
+                stats.exit()
+        cache.put(key, decompositions)
+    elif stats is not None:
+        stats.cache_hits += 1
+    return decompositions
+
+def _search(key, cache):
+    """
+    Decomposes the count tuple by choosing the groups that start at its
+    lowest tile and decomposing each remainder.
+    """
+    n_tiles = sum(key)
+    if n_tiles % 3 == 1:
+        return ()
+    if n_tiles == 0:
+        return ((),)
+
+    code = 0
+    while key[code] == 0:
+        code += 1
+    counts = list(key)
+    count = counts[code]
+    can_sequence = is_sequence_head_code(code)
+
+    results = []
+    for n_pairs in ((0, 1) if n_tiles % 3 == 2 else (0,)):
+        for n_triplets in range((count - 2 * n_pairs) // 3 + 1):
+            n_sequences = count - 2 * n_pairs - 3 * n_triplets
+            if n_sequences and not (can_sequence
+                                    and counts[code + 1] >= n_sequences
+                                    and counts[code + 2] >= n_sequences):
+                continue
+
+            # Groups starting at the same tile are ordered pair < triplet <
+            # sequence, matching the ordering of their tile tuples
+            groups = (((code, code),) * n_pairs
+                      + ((code, code, code),) * n_triplets
+                      + ((code, code + 1, code + 2),) * n_sequences)
+            counts[code] = 0
+            if n_sequences:
+                counts[code + 1] -= n_sequences
+                counts[code + 2] -= n_sequences
+
+            for rest in _decompose(tuple(counts), cache):
+                results.append(groups + rest)
+
+            counts[code] = count
+            if n_sequences:
+                counts[code + 1] += n_sequences
+                counts[code + 2] += n_sequences
+
+    return tuple(results)
+
+#### Early-exit search
+
+def iter_decompositions(counts):
+    """
+    Yields the decompositions of the count vector one at a time, in the same
+    order and form as decompose_counts(), so that callers can stop as soon as
+    they have found what they need. Nothing is cached.
+    """
+    n_tiles = sum(counts)
+    if n_tiles % 3 == 1:
+        return iter(())
+    return _iter_search(list(counts), 0, int(n_tiles % 3 == 2))
+
+def _iter_search(counts, code, n_pairs):
+    """
+    Yields the decompositions of the counts from the given code on, with
+    n_pairs pairs, like _search().
+    """
+    while code < N_TILE_KINDS and counts[code] == 0:
+        code += 1
+    if code == N_TILE_KINDS:
+        if not n_pairs:
+            yield ()
+        return
+
+    count = counts[code]
+    can_sequence = is_sequence_head_code(code)
+    for pairs in range(n_pairs + 1):
+        for n_triplets in range((count - 2 * pairs) // 3 + 1):
+            n_sequences = count - 2 * pairs - 3 * n_triplets
+            if n_sequences and not (can_sequence
+                                    and counts[code + 1] >= n_sequences
+                                    and counts[code + 2] >= n_sequences):
+                continue
+
+            groups = (((code, code),) * pairs
+                      + ((code, code, code),) * n_triplets
+                      + ((code, code + 1, code + 2),) * n_sequences)
+            counts[code] = 0
+            if n_sequences:
+                counts[code + 1] -= n_sequences
+                counts[code + 2] -= n_sequences
+
+            for rest in _iter_search(counts, code + 1, n_pairs - pairs):
+                yield groups + rest
+
+            counts[code] = count
+            if n_sequences:
+                counts[code + 1] += n_sequences
+                counts[code + 2] += n_sequences
+
+def _is_melds(work, start):
+    """
+    Checks if the nine counts of the suit starting at the given code split
+    into sequences and triplets, consuming them from work.
+
+    At each tile, count % 3 sequences must start there: any three identical
+    sequences can be swapped for three triplets, so this loses nothing.
+    """
+    for code in xrange(start, start + 9):
+        n_sequences = work[code] % 3
+        if n_sequences:
+            if (code - start > 6 or work[code + 1] < n_sequences
+                    or work[code + 2] < n_sequences):
+                return False
+            work[code + 1] -= n_sequences
+            work[code + 2] -= n_sequences
+    return True
+
+def is_special_complete_counts(counts):
+    """
+    Checks if the count vector of 14 tiles is a complete chitoitsu or kokushi
+    musou hand.
+    """
+    if counts.count(2) == 7:
+        return True
+    # Kokushi musou: thirteen kinds, all of them terminals and honours
+    return (counts.count(0) == N_TILE_KINDS - 13
+            and all([counts[code] for code in YAOCHUU_CODES]))
+
+def is_complete_counts(counts):
+    """
+    Checks if the count vector is a complete hand: melds and a pair, seven
+    pairs (chitoitsu) or kokushi musou. Returns as soon as one valid reading
+    is found, without building any groups.
+
+    This needs no table; see tables.SuitTable.is_complete() for a faster
+    check using the suit table.
+    """
+    n_tiles = sum(counts)
+    if n_tiles % 3 != 2:
+        return False
+    if n_tiles == 14 and is_special_complete_counts(counts):
+        return True
+
+    # Honours can only form pairs and triplets
+    n_pairs = 0
+    for code in xrange(WIND_OFFSET, N_TILE_KINDS):
+        count = counts[code]
+        if count == 2:
+            n_pairs += 1
+        elif count == 1 or count == 4:
+            return False
+
+    pair_suit = None
+    for offset in SUIT_OFFSETS:
+        remainder = sum(counts[offset:offset + 9]) % 3
+        if remainder == 1:
+            return False
+        if remainder == 2:
+            n_pairs += 1
+            pair_suit = offset
+    if n_pairs != 1:
+        return False
+
+    work = list(counts)
+    for offset in SUIT_OFFSETS:
+        if offset != pair_suit and not _is_melds(work, offset):
+            return False
+    if pair_suit is None:
+        return True
+
+    # Try each pair in the suit that holds it
+    for code in xrange(pair_suit, pair_suit + 9):
+        if counts[code] < 2:
+            continue
+        work[pair_suit:pair_suit + 9] = counts[pair_suit:pair_suit + 9]
+        work[code] -= 2
+        if _is_melds(work, pair_suit):
+            return True
+    return False
@@ -0,0 +1,205 @@
+"""
+Incrementally updated hand state.
+
+A HandState holds the count vector of a concealed hand, together with the
+per-part analysis that completion checks, waits, shanten and yaku are built
+from: the base-5 key of each part (the three suits and the honours, see
+tables.encode_suit()), its completeness flags from the suit table and its
+shanten table row. Drawing or discarding a tile updates the key of its part
+in O(1) and only invalidates the cached analysis of that part, so the other
+three parts are never looked up again until they change.
+
+All results are given as tile codes; no Tile or Group objects are built.
+"""
+from tile import N_TILE_KINDS, WIND_OFFSET, TILES
+from tables import FLAG_COMPLETE, FLAG_PAIR
+from shanten import (SUIT_TABLE as SHANTEN_SUIT_TABLE, HONOUR_TABLE,
+                     standard_shanten_rows, chitoi_shanten_counts,
+                     kokushi_shanten_counts)
+from utils import SUIT_TABLE
+from waits import (PARTS, HONOUR_PART, PART_OF_CODE, get_waits_from_states,
+                   get_ukeire)
+from batch import get_readings
+from yaku import evaluate_code_grouping
+
+# Value added to the key of its part by one copy of each tile code
+KEY_STEPS = [5 ** (code - PARTS[PART_OF_CODE[code]][0])
+             for code in range(N_TILE_KINDS)]
+
+class HandState(object):
+    """
+    A concealed hand, updated tile by tile with draw() and discard().
+    """
+    def __init__(self, tiles=()):
+        self._counts = [0] * N_TILE_KINDS
+        self._n_tiles = 0
+        self._keys = [0] * len(PARTS)
+        # Per-part (complete, number of pairs) and shanten table rows, or
+        # None until needed after the last change to the part
+        self._states = [None] * len(PARTS)
+        self._rows = [None] * len(PARTS)
+        # Standard-form groupings, or None until needed after the last change
+        self._groupings = None
+        for tile in tiles:
+            self.draw(tile)
+
+    @classmethod
+    def from_counts(cls, counts):
+        """
+        Returns the state of the hand with the given count vector.
+        """
+        state = cls()
+        for code, count in enumerate(counts):
+            for n in range(count):
+                state._add(code)
+        return state
+
+    def __len__(self):
+        return self._n_tiles
+
+    def __str__(self):
+        return "HandState(%s)" % ", ".join(map(str, self.tiles))
+
+    def __repr__(self):
+        return self.__str__()
+
+    @property
+    def counts(self):
+        return tuple(self._counts)
+
+    @property
+    def tiles(self):
+        return [TILES[code] for code in range(N_TILE_KINDS)
+                for n in range(self._counts[code])]
+
+    #### Updates
+
+    def draw(self, tile):
+        """
+        Adds a tile to the hand.
+        """
+        if self._counts[tile.code] >= 4:
+            raise ValueError("More than four copies of %s" % tile)
+        self._add(tile.code)
+
+    def discard(self, tile):
+        """
+        Removes a tile from the hand.
+        """
+        if not self._counts[tile.code]:
+            raise ValueError("%s is not in the hand" % tile)
+        self._add(tile.code, -1)
+
+    def _add(self, code, n=1):
+        part = PART_OF_CODE[code]
+        self._counts[code] += n
+        self._n_tiles += n
+        self._keys[part] += n * KEY_STEPS[code]
+        self._states[part] = None
+        self._rows[part] = None
+        self._groupings = None
+
+    #### Per-part analysis
+
+    def _get_states(self):
+        """
+        Returns (complete, number of pairs) for each part (see
+        waits._get_part_state()), looking up only the parts that changed.
+        """
+        states = self._states
+        for part, state in enumerate(states):
+            if state is not None:
+                continue
+            if part == HONOUR_PART:
+                honour_counts = self._counts[WIND_OFFSET:]
+                states[part] = (all([count in (0, 2, 3)
+                                     for count in honour_counts]),
+                                honour_counts.count(2))
+            else:
+                flags = SUIT_TABLE.get_flags(self._keys[part])
+                states[part] = (bool(flags & FLAG_COMPLETE),
+                                int(bool(flags & FLAG_PAIR)))
+        return states
+
+    def _get_rows(self):
+        """
+        Returns the shanten table row of each part, looking up only the parts
+        that changed.
+        """
+        rows = self._rows
+        for part, row in enumerate(rows):
+            if row is None:
+                table = (HONOUR_TABLE if part == HONOUR_PART
+                         else SHANTEN_SUIT_TABLE)
+                rows[part] = table.get_row(self._keys[part])
+        return rows
+
+    #### Queries
+
+    def is_standard_complete(self):
+        """
+        Checks if the hand is complete in the standard form (melds and a
+        pair).
+        """
+        if self._n_tiles % 3 != 2:
+            return False
+        states = self._get_states()
+        return (all([complete for complete, n_pairs in states])
+                and sum([n_pairs for complete, n_pairs in states]) == 1)
+
+    def is_complete(self):
+        """
+        Checks if the hand is complete in any form (standard, chitoitsu or
+        kokushi musou).
+        """
+        return (self.is_standard_complete()
+                or chitoi_shanten_counts(self._counts) == -1
+                or kokushi_shanten_counts(self._counts) == -1)
+
+    def shanten(self):
+        """
+        Returns the shanten number of the hand over all forms (see
+        shanten.shanten_counts()).
+        """
+        return min(standard_shanten_rows(self._get_rows(), self._n_tiles),
+                   chitoi_shanten_counts(self._counts),
+                   kokushi_shanten_counts(self._counts))
+
+    def waits(self):
+        """
+        Returns the codes of the tiles that complete a hand of 3n + 1 tiles,
+        in order (see waits.waits_counts()).
+        """
+        if self._n_tiles % 3 != 1:
+            raise ValueError("Expected a hand of 3n + 1 tiles")
+        return get_waits_from_states(self._counts, self._get_states())
+
+    def ukeire(self, visible=None):
+        """
+        Returns a dictionary mapping each winning tile code to its number of
+        unseen copies (see waits.ukeire_counts()).
+        """
+        return get_ukeire(self._counts, self.waits(), visible)
+
+    def groupings(self):
+        """
+        Returns the standard-form groupings of a complete hand as tuples of
+        tile codes (see decompose.decompose_counts()), or an empty tuple.
+        """
+        if self._groupings is None:
+            self._groupings = (SUIT_TABLE.decompose(self._counts)
+                               if self.is_standard_complete() else ())
+        return self._groupings
+
+    def yaku_candidates(self, prevailing_wind=None, player_wind=None):
+        """
+        Returns (han, yaku keys) for each way of reading the complete hand,
+        highest han first: every standard-form grouping (see
+        yaku.evaluate_grouping()), chitoitsu and kokushi musou, with the yaku
+        decided by the tile counts alone (see batch.get_readings()). Returns
+        an empty list if the hand is not complete.
+        """
+        return get_readings(self._counts,
+                            [evaluate_code_grouping(grouping, prevailing_wind,
+                                                    player_wind)
+                             for grouping in self.groupings()])
@@ -0,0 +1,105 @@
+"""
+Opt-in instrumentation of the grouping search.
+
+While a collect() block is active, the grouping code counts its work into a
+SearchStats object:
+    nodes              search nodes expanded (recursive calls of
+                       group_concealed_tiles_bruteforce() and of the
+                       decompose_counts() search)
+    max_depth          deepest recursion reached
+    candidate_triples  index triples tried by
+                       get_sequence_and_triplet_indices()
+    duplicates         duplicate groupings discarded by the brute-force search
+    cache_hits         lookups answered by the decomposition cache or the
+                       suit table's decoded decompositions
+    cache_misses       lookups that were not
+
+    with instrument.collect() as stats:
+        utils.group_concealed_tiles_bruteforce(tiles)
+    print stats
+
+When no block is active the instrumented functions only check that the
+module's active attribute is None, once per call.
+"""
+from contextlib import contextmanager
+
+# Stats of the innermost active collect() block, or None
+active = None
+
+class SearchStats(object):
+    """
+    Counters of the work done by the grouping search.
+    """
+    FIELDS = ('nodes', 'max_depth', 'candidate_triples', 'duplicates',
+              'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+        # Current recursion depth
+        self.depth = 0
+
+    def __str__(self):
+        return "SearchStats(%s)" % ", ".join(
+            ["%s=%d" % (field, getattr(self, field)) for field in self.FIELDS])
+
+    def __repr__(self):
+        return self.__str__()
+
+    def enter(self):
+        """
+        Records the expansion of a search node one level deeper.
+        """
+        self.nodes += 1
+        self.depth += 1
+        if self.depth > self.max_depth:
+            self.max_depth = self.depth
+
+    def exit(self):
+        """
+        Records the return from a search node.
+        """
+        self.depth -= 1
+
+    def merge(self, other):
+        """
+        Adds the counters of another SearchStats to this one (taking the
+        larger maximum depth).
+        """
+        for field in self.FIELDS:
+            if field == 'max_depth':
+                self.max_depth = max(self.max_depth, other.max_depth)
+            else:
+                setattr(self, field, getattr(self, field)
+                        + getattr(other, field))
+
+    def as_dict(self):
+        return dict([(field, getattr(self, field)) for field in self.FIELDS])
+
+@contextmanager
+def collect(stats=None):
+    """
+    Collects the work done by the grouping search inside the block into the
+    given SearchStats (a new one by default), which is returned. The counts
+    of a nested block are also added to the enclosing one.
+    """
+    global active
+    if stats is None:
+        stats = SearchStats()
+    previous = active
+    active = stats
+    try:
+        yield stats
+    finally:
+        active = previous
+        if previous is not None:
+            previous.merge(stats)
+
+def measure(func, *args, **kwargs):
+    """
+    Calls func with the given arguments inside a collect() block, and returns
+    its result and the SearchStats of the call.
+    """
+    with collect() as stats:
+        result = func(*args, **kwargs)
+    return result, stats
@@ -0,0 +1,112 @@
+"""
+A bounded least-recently-used cache with hit, miss and eviction counters.
+
+    cache = LRUCache(maxsize=1024)
+    value = cache.get(key)
+    if value is None:
+        value = compute(key)
+        cache.put(key, value)
+"""
+from collections import namedtuple
+
+DEFAULT_CACHE_SIZE = 2 ** 16
+
+CacheInfo = namedtuple('CacheInfo',
+                       ('hits', 'misses', 'evictions', 'maxsize', 'currsize'))
+
+class LRUCache(object):
+    """
+    A bounded LRU cache. Lookups and insertions take constant time.
+    """
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        """
+        Initializes an empty cache holding at most maxsize entries (None for
+        no limit, 0 to disable caching).
+        """
+        self.maxsize = maxsize
+        # Links [previous, next, key, value] of each entry, in a circular
+        # list from the least to the most recently used one (OrderedDict is
+        # too slow for lookups on hot paths)
+        self._entries = {}
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _move_to_end(self, link):
+        """
+        Marks the entry of the link as the most recently used one.
+        """
+        previous, next = link[0], link[1]
+        previous[1] = next
+        next[0] = previous
+        root = self._root
+        last = root[0]
+        last[1] = root[0] = link
+        link[0] = last
+        link[1] = root
+
+    def get(self, key):
+        """
+        Returns the cached value for the key, or None if not cached.
+        """
+        link = self._entries.get(key)
+        if link is None:
+            self.misses += 1
+            return None
+        # Move the link to the end (as in _move_to_end(), inlined since this
+        # is the hot path)
+        previous, next, root = link[0], link[1], self._root
+        previous[1] = next
+        next[0] = previous
+        last = root[0]
+        last[1] = root[0] = link
+        link[0] = last
+        link[1] = root
+        self.hits += 1
+        return link[3]
+
+    def put(self, key, value):
+        """
+        Caches the value (which must not be None) for the key, evicting the
+        least recently used entries if the cache is full.
+        """
+        if self.maxsize == 0:
+            return
+        link = self._entries.get(key)
+        if link is not None:
+            link[3] = value
+            self._move_to_end(link)
+            return
+        root = self._root
+        last = root[0]
+        link = [last, root, key, value]
+        last[1] = root[0] = self._entries[key] = link
+        if self.maxsize is not None:
+            while len(self._entries) > self.maxsize:
+                oldest = root[1]
+                root[1] = oldest[1]
+                oldest[1][0] = root
+                del self._entries[oldest[2]]
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Removes all entries and resets the counters.
+        """
+        self._entries.clear()
+        self._root[:] = [self._root, self._root, None, None]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def info(self):
+        """
+        Returns the cache counters and size as a CacheInfo tuple.
+        """
+        return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize,
+                         len(self._entries))
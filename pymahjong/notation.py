@@ -0,0 +1,184 @@
+"""
+Compact tile notation.
+
+Hands are written as runs of digits, each followed by the letter of its suit:
+m (man), p (pin), s (sou) or z (honours: 1-4 east, south, west, north and
+5-7 white, green, red dragon), e.g. "123m456p789s11z" or "1199m2255p77z".
+A 0 stands for a (red) five and is read as a 5.
+
+    counts = parse_counts("123m456p789s11555z")
+    array = parse_counts_batch(column_of_strings)
+
+The bulk parser converts a whole sequence of strings at once into an N x 34
+int8 array of count vectors with NumPy, without a Python loop over
+characters, which is what makes importing large text datasets cheap.
+"""
+import re
+
+import numpy as np
+
+from tile import N_TILE_KINDS, WIND_OFFSET, TILES
+
+SUIT_LETTERS = 'mpsz'
+# Code of the 1 of each suit letter
+LETTER_OFFSETS = {'m': 0, 'p': 9, 's': 18, 'z': WIND_OFFSET}
+
+# Letter and digit of each tile code
+CODE_NOTATION = [(letter, str(code - LETTER_OFFSETS[letter] + 1))
+                 for letter in SUIT_LETTERS
+                 for code in range(LETTER_OFFSETS[letter],
+                                   min(LETTER_OFFSETS[letter] + 9,
+                                       N_TILE_KINDS))]
+
+_HAND_RE = re.compile(r'^(?:[0-9]+[mpsz])*$')
+_RUN_RE = re.compile(r'([0-9]+)([mpsz])')
+
+# Tile code of each (letter index, digit), or -1 if there is no such tile
+_CODES = np.empty((len(SUIT_LETTERS), 10), dtype=np.int16)
+_CODES.fill(-1)
+for _index, _letter in enumerate(SUIT_LETTERS):
+    _offset = LETTER_OFFSETS[_letter]
+    for _digit in range(10):
+        _code = _offset + (4 if _digit == 0 else _digit - 1)
+        if _letter != 'z' or 1 <= _digit <= 7:
+            _CODES[_index, _digit] = _code
+
+# Tile code of each (digit, letter) pair, for parsing single hands
+_CODES_BY_NAME = dict([((str(digit), letter), int(_CODES[index, digit]))
+                       for index, letter in enumerate(SUIT_LETTERS)
+                       for digit in range(10) if _CODES[index, digit] >= 0])
+
+# Digit value of each byte, 10 + letter index for suit letters, -1 otherwise
+_BYTE_KINDS = np.empty(256, dtype=np.int8)
+_BYTE_KINDS.fill(-1)
+for _digit in range(10):
+    _BYTE_KINDS[ord(str(_digit))] = _digit
+for _index, _letter in enumerate(SUIT_LETTERS):
+    _BYTE_KINDS[ord(_letter)] = 10 + _index
+
+#### Parsing
+
+def parse_codes(text):
+    """
+    Returns the tile codes written in the notation, in order.
+    """
+    text = text.strip()
+    if not _HAND_RE.match(text):
+        raise ValueError("Invalid tile notation: %r" % text)
+    codes = []
+    for digits, letter in _RUN_RE.findall(text):
+        for digit in digits:
+            try:
+                codes.append(_CODES_BY_NAME[digit, letter])
+            except KeyError:
+                raise ValueError("No such tile: %s%s" % (digit, letter))
+    return codes
+
+def parse_tiles(text):
+    """
+    Returns the Tile objects written in the notation, in order.
+    """
+    return [TILES[code] for code in parse_codes(text)]
+
+def parse_counts(text):
+    """
+    Returns the count vector of the hand written in the notation.
+    """
+    counts = [0] * N_TILE_KINDS
+    for code in parse_codes(text):
+        counts[code] += 1
+        if counts[code] > 4:
+            raise ValueError("More than four copies of %s" % TILES[code])
+    return counts
+
+def parse_counts_batch(strings):
+    """
+    Returns the count vectors of the hands written in a sequence of strings
+    as an N x 34 int8 array.
+    """
+    strings = [string.strip() for string in strings]
+    n_hands = len(strings)
+    joined = ''.join(strings)
+    if isinstance(joined, unicode):
+        joined = joined.encode('ascii', 'replace')
+    chars = np.frombuffer(joined, dtype=np.uint8)
+    rows = np.repeat(np.arange(n_hands), [len(string) for string in strings])
+
+    kinds = _BYTE_KINDS[chars]
+    invalid = np.flatnonzero(kinds < 0)
+    if len(invalid):
+        raise ValueError("Hand %d: invalid character %r"
+                         % (rows[invalid[0]], joined[invalid[0]]))
+
+    # Each digit belongs to the first suit letter after it, which must be in
+    # the same string
+    letter_positions = np.flatnonzero(kinds >= 10)
+    digit_positions = np.flatnonzero(kinds < 10)
+    next_letters = np.searchsorted(letter_positions, digit_positions)
+    unterminated = next_letters == len(letter_positions)
+    next_letters[unterminated] = 0
+    if len(letter_positions):
+        letter_rows = rows[letter_positions[next_letters]]
+        unterminated |= letter_rows != rows[digit_positions]
+    if unterminated.any():
+        raise ValueError("Hand %d: digits without a suit letter"
+                         % rows[digit_positions[np.argmax(unterminated)]])
+    unused = np.ones(len(letter_positions), dtype=bool)
+    unused[next_letters] = False
+    if unused.any():
+        raise ValueError("Hand %d: suit letter without digits"
+                         % rows[letter_positions[np.argmax(unused)]])
+
+    codes = _CODES[kinds[letter_positions[next_letters]] - 10,
+                   kinds[digit_positions]]
+    if (codes < 0).any():
+        raise ValueError("Hand %d: no such honour tile"
+                         % rows[digit_positions[np.argmax(codes < 0)]])
+
+    counts = np.bincount(rows[digit_positions] * N_TILE_KINDS + codes,
+                         minlength=n_hands * N_TILE_KINDS)
+    counts = counts.reshape(n_hands, N_TILE_KINDS)
+    if len(counts) and counts.max() > 4:
+        raise ValueError("Hand %d: more than four copies of a tile"
+                         % np.argmax(counts.max(axis=1) > 4))
+    return counts.astype(np.int8)
+
+#### Formatting
+
+def format_counts(counts):
+    """
+    Returns the notation of a count vector, e.g. "123m456p789s11z".
+    """
+    parts = []
+    letter = None
+    for code, count in enumerate(counts):
+        if not count:
+            continue
+        if letter is not None and CODE_NOTATION[code][0] != letter:
+            parts.append(letter)
+        letter, digit = CODE_NOTATION[code]
+        parts.append(digit * int(count))
+    if letter is not None:
+        parts.append(letter)
+    return ''.join(parts)
+
+def format_codes(codes):
+    """
+    Returns the notation of the tiles with the given codes, in sorted order.
+    """
+    counts = [0] * N_TILE_KINDS
+    for code in codes:
+        counts[code] += 1
+    return format_counts(counts)
+
+def format_tiles(tiles):
+    """
+    Returns the notation of the given Tile objects, in sorted order.
+    """
+    return format_codes([tile.code for tile in tiles])
+
+def format_counts_batch(counts):
+    """
+    Returns the notation of each row of an N x 34 array of count vectors.
+    """
+    return [format_counts(row) for row in np.asarray(counts).tolist()]
@@ -0,0 +1,316 @@
+"""
+Compact binary hand records.
+
+Each hand is stored as a fixed-size record of RECORD_SIZE bytes, holding a
+big-endian bit string of:
+    counts    34 x 3 bits: number of copies of each tile kind in the
+              concealed part of the hand (including the winning tile)
+    melds     4 x (3 bits meld type + 6 bits head tile code), see MELD_TYPES
+    win tile  6 bits: code of the winning tile, or NO_TILE
+    tsumo     1 bit: whether the winning tile was self-drawn
+followed by zero padding. A record file is a short header followed by the
+records, so it can be memory-mapped and decoded in chunks straight into
+NumPy arrays (see read_records()):
+
+    with RecordWriter(path) as writer:
+        for counts, melds, win_tile, tsumo in hands:
+            writer.write(counts, melds, win_tile, tsumo)
+
+    for chunk in read_records(path):
+        shanten.shanten_batch(chunk.counts)
+"""
+import mmap
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+from tile import N_TILE_KINDS, Sequence, Triplet, Quadruplet, tile_from_code
+
+MAGIC = 'PMJR'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')
+
+COUNT_BITS = 3
+N_MELDS = 4
+MELD_TYPE_BITS = 3
+CODE_BITS = 6
+N_BITS = (N_TILE_KINDS * COUNT_BITS + N_MELDS * (MELD_TYPE_BITS + CODE_BITS)
+          + CODE_BITS + 1)
+RECORD_SIZE = (N_BITS + 7) // 8
+PADDING_BITS = 8 * RECORD_SIZE - N_BITS
+
+NO_TILE = 2 ** CODE_BITS - 1
+
+# Meld types, with the group type and closedness of each
+MELD_NONE = 0
+MELD_CHI = 1
+MELD_PON = 2
+MELD_OPEN_KAN = 3
+MELD_CLOSED_KAN = 4
+MELD_TYPES = {
+    MELD_CHI: (Sequence, False),
+    MELD_PON: (Triplet, False),
+    MELD_OPEN_KAN: (Quadruplet, False),
+    MELD_CLOSED_KAN: (Quadruplet, True),
+}
+_MELD_TYPES_BY_GROUP = dict([(group_type, meld_type) for meld_type, group_type
+                             in MELD_TYPES.items()])
+
+# Valid values of the meld type, head and winning tile fields
+_MELD_TYPE_VALUES = [MELD_NONE] + sorted(MELD_TYPES)
+_CODE_VALUES = range(N_TILE_KINDS)
+_WIN_TILE_VALUES = _CODE_VALUES + [NO_TILE]
+
+# Number of records decoded at once by read_records()
+DEFAULT_CHUNK_SIZE = 2 ** 16
+
+RecordChunk = namedtuple('RecordChunk', ('counts', 'meld_types', 'meld_heads',
+                                         'win_tiles', 'tsumo'))
+
+#### Encoding
+
+def encode_record(counts, melds=(), win_tile=None, tsumo=False):
+    """
+    Returns the record of a hand, given the count vector of its concealed
+    tiles, its called melds (and closed kans) as Group objects, and the code
+    of its winning tile (if any). Raises a ValueError for fields that do not
+    fit in the record.
+    """
+    if len(counts) != N_TILE_KINDS or max(counts) > 4 or min(counts) < 0:
+        raise ValueError("Invalid count vector")
+    if len(melds) > N_MELDS:
+        raise ValueError("Too many melds")
+    if win_tile is not None and win_tile not in _CODE_VALUES:
+        raise ValueError("Invalid winning tile code: %r" % (win_tile,))
+
+    value = 0
+    for count in counts:
+        value = (value << COUNT_BITS) | count
+    for n in range(N_MELDS):
+        if n < len(melds):
+            meld = melds[n]
+            try:
+                meld_type = _MELD_TYPES_BY_GROUP[type(meld), meld.closed]
+            except KeyError:
+                raise ValueError("Not a called meld or closed kan: %s" % meld)
+            head = meld.codes[0]
+        else:
+            meld_type, head = MELD_NONE, 0
+        value = (((value << MELD_TYPE_BITS) | meld_type) << CODE_BITS) | head
+    value = (value << CODE_BITS) | (NO_TILE if win_tile is None else win_tile)
+    value = (value << 1) | bool(tsumo)
+    value <<= PADDING_BITS
+    return ('%0*x' % (2 * RECORD_SIZE, value)).decode('hex')
+
+def decode_record(record):
+    """
+    Returns (counts, melds, win tile code or None, tsumo) for a record
+    returned by encode_record().
+    """
+    value = int(record.encode('hex'), 16) >> PADDING_BITS
+    tsumo = bool(value & 1)
+    value >>= 1
+    win_tile = value & NO_TILE
+    value >>= CODE_BITS
+
+    melds = []
+    for n in range(N_MELDS):
+        head = value & NO_TILE
+        value >>= CODE_BITS
+        meld_type = value & (2 ** MELD_TYPE_BITS - 1)
+        value >>= MELD_TYPE_BITS
+        if meld_type != MELD_NONE:
+            group_type, closed = MELD_TYPES[meld_type]
+            melds.append(group_type(tile_from_code(head), closed))
+    melds.reverse()
+
+    counts = []
+    for n in range(N_TILE_KINDS):
+        counts.append(value & (2 ** COUNT_BITS - 1))
+        value >>= COUNT_BITS
+    counts.reverse()
+
+    return counts, melds, None if win_tile == NO_TILE else win_tile, tsumo
+
+class RecordWriter(object):
+    """
+    Writes hand records to a file, after a header.
+    """
+    def __init__(self, path):
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION, RECORD_SIZE))
+        self.n_records = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, counts, melds=(), win_tile=None, tsumo=False):
+        """
+        Writes the record of a hand (see encode_record()).
+        """
+        self._file.write(encode_record(counts, melds, win_tile, tsumo))
+        self.n_records += 1
+
+    def write_batch(self, counts, meld_types=None, meld_heads=None,
+                    win_tiles=None, tsumo=None):
+        """
+        Writes the records of a batch of hands given as arrays (see
+        encode_records()).
+        """
+        records = encode_records(counts, meld_types, meld_heads, win_tiles,
+                                 tsumo)
+        self._file.write(records.tostring())
+        self.n_records += len(records)
+
+    def close(self):
+        self._file.close()
+
+#### Decoding
+
+# Weights of the bits of each field, most significant first
+_COUNT_WEIGHTS = 2 ** np.arange(COUNT_BITS - 1, -1, -1)
+_MELD_TYPE_WEIGHTS = 2 ** np.arange(MELD_TYPE_BITS - 1, -1, -1)
+_CODE_WEIGHTS = 2 ** np.arange(CODE_BITS - 1, -1, -1)
+
+def _get_bits(values, n_bits):
+    """
+    Returns the n_bits lowest bits of each value, most significant first,
+    along a new last axis.
+    """
+    shifts = np.arange(n_bits - 1, -1, -1)
+    return (np.asarray(values, dtype=np.int64)[..., None] >> shifts) & 1
+
+def _check_field(values, shape, valid, name):
+    """
+    Returns the field as an array, raising a ValueError unless it has the
+    given shape and all of its values are valid.
+    """
+    values = np.asarray(values)
+    if values.shape != shape:
+        raise ValueError("Expected a %s array of %s"
+                         % (" x ".join(map(str, shape)), name))
+    if values.size and not np.in1d(values, valid).all():
+        raise ValueError("Invalid %s" % name)
+    return values
+
+def encode_records(counts, meld_types=None, meld_heads=None, win_tiles=None,
+                   tsumo=None):
+    """
+    Returns the records of a batch of hands as an N x RECORD_SIZE uint8
+    array, given the arrays of a RecordChunk (see decode_records()). Hands
+    have no melds, no winning tile and no tsumo by default. Raises a
+    ValueError if an array has the wrong shape or a value out of range.
+    """
+    counts = np.asarray(counts)
+    if counts.ndim != 2 or counts.shape[1] != N_TILE_KINDS:
+        raise ValueError("Expected an N x %d array of counts" % N_TILE_KINDS)
+    if len(counts) and (counts.max() > 4 or counts.min() < 0):
+        raise ValueError("Invalid count vector")
+    n_records = len(counts)
+    if meld_types is None:
+        meld_types = np.zeros((n_records, N_MELDS), dtype=np.int8)
+    if meld_heads is None:
+        meld_heads = np.zeros((n_records, N_MELDS), dtype=np.int8)
+    if win_tiles is None:
+        win_tiles = np.empty(n_records, dtype=np.int8)
+        win_tiles.fill(NO_TILE)
+    if tsumo is None:
+        tsumo = np.zeros(n_records, dtype=bool)
+    meld_types = _check_field(meld_types, (n_records, N_MELDS),
+                              _MELD_TYPE_VALUES, "meld types")
+    meld_heads = _check_field(meld_heads, (n_records, N_MELDS), _CODE_VALUES,
+                              "meld head codes")
+    win_tiles = _check_field(win_tiles, (n_records,), _WIN_TILE_VALUES,
+                             "winning tile codes")
+    tsumo = _check_field(tsumo, (n_records,), [False, True], "tsumo flags")
+
+    melds = np.concatenate([_get_bits(meld_types, MELD_TYPE_BITS),
+                            _get_bits(meld_heads, CODE_BITS)], axis=2)
+    bits = np.concatenate([
+        _get_bits(counts, COUNT_BITS).reshape(n_records, -1),
+        melds.reshape(n_records, -1),
+        _get_bits(win_tiles, CODE_BITS),
+        np.asarray(tsumo, dtype=np.int64).reshape(n_records, 1),
+        np.zeros((n_records, PADDING_BITS), dtype=np.int64)], axis=1)
+    return np.packbits(bits.astype(np.uint8), axis=1)
+
+def decode_records(records):
+    """
+    Decodes an N x RECORD_SIZE uint8 array of records into a RecordChunk of
+    arrays: N x 34 int8 counts, N x 4 meld types and head codes (see
+    MELD_TYPES), N winning tile codes (NO_TILE if none) and N tsumo flags.
+    """
+    bits = np.unpackbits(np.asarray(records, dtype=np.uint8), axis=1)
+    n_records = len(bits)
+
+    end = N_TILE_KINDS * COUNT_BITS
+    counts = bits[:, :end].reshape(n_records, N_TILE_KINDS, COUNT_BITS)
+    counts = counts.dot(_COUNT_WEIGHTS).astype(np.int8)
+
+    start, end = end, end + N_MELDS * (MELD_TYPE_BITS + CODE_BITS)
+    melds = bits[:, start:end].reshape(n_records, N_MELDS,
+                                       MELD_TYPE_BITS + CODE_BITS)
+    meld_types = melds[:, :, :MELD_TYPE_BITS].dot(_MELD_TYPE_WEIGHTS)
+    meld_heads = melds[:, :, MELD_TYPE_BITS:].dot(_CODE_WEIGHTS)
+
+    start, end = end, end + CODE_BITS
+    win_tiles = bits[:, start:end].dot(_CODE_WEIGHTS)
+    tsumo = bits[:, end].astype(bool)
+
+    return RecordChunk(counts, meld_types.astype(np.int8),
+                       meld_heads.astype(np.int8), win_tiles.astype(np.int8),
+                       tsumo)
+
+def _map_records(path):
+    """
+    Memory-maps a record file and returns the map and its number of records.
+    """
+    with open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, record_size = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or version != VERSION or record_size != RECORD_SIZE:
+        buf.close()
+        raise ValueError("Not a version %d record file" % VERSION)
+    n_records, remainder = divmod(len(buf) - HEADER.size, RECORD_SIZE)
+    if remainder:
+        buf.close()
+        raise ValueError("Truncated record file")
+    return buf, n_records
+
+def read_records(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Memory-maps a record file and yields its records as RecordChunks of at
+    most chunk_size records each (see decode_records()).
+    """
+    buf, n_records = _map_records(path)
+    try:
+        for start in range(0, n_records, chunk_size):
+            n = min(chunk_size, n_records - start)
+            records = np.frombuffer(buf, dtype=np.uint8,
+                                    count=n * RECORD_SIZE,
+                                    offset=HEADER.size + start * RECORD_SIZE)
+            yield decode_records(records.reshape(n, RECORD_SIZE))
+            del records
+    finally:
+        buf.close()
+
+def load_records(path):
+    """
+    Returns all records of a file as a single RecordChunk.
+    """
+    chunks = list(read_records(path, chunk_size=max(count_records(path), 1)))
+    if not chunks:
+        return decode_records(np.zeros((0, RECORD_SIZE), dtype=np.uint8))
+    return chunks[0]
+
+def count_records(path):
+    """
+    Returns the number of records in a file.
+    """
+    buf, n_records = _map_records(path)
+    buf.close()
+    return n_records
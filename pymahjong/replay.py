@@ -0,0 +1,263 @@
+"""
+Streaming analysis of game logs.
+
+A game log is a text file (optionally gzipped) with one winning hand per
+line, as tab-separated fields:
+    game id, prevailing wind, player wind, concealed tiles (including the
+    winning tile), melds, winning tile, "tsumo" or "ron"
+Tiles are written as their str() forms (e.g. "1-man", "east", "white") and
+separated by spaces. Melds are separated by spaces as "kind:head tile" with
+kind one of chi, pon, kan (open) or ankan (closed), e.g. "pon:red chi:2-pin";
+the field is "-" if there are none. Blank lines and lines starting with "#"
+are skipped.
+
+Every stage of the pipeline is a generator, so logs are read one line at a
+time and memory stays bounded however large they are:
+
+    read_lines -> parse_hands -> group_hands -> score_hands -> aggregate
+
+analyze() runs the whole pipeline, either in this process or by fanning
+batches of lines out to a process pool and merging the partial statistics.
+"""
+import argparse
+import gzip
+import itertools
+import multiprocessing
+from collections import Counter, deque, namedtuple
+
+from tile import WINDS, TILES, Sequence, Triplet, Quadruplet
+from decompose import tiles_to_counts
+from utils import group_concealed_tiles_and_convert
+from batch import score_hand
+from yaku import YAKU_INFO, YAKUMAN_INFO, evaluate_grouping
+
+DEFAULT_BATCH_SIZE = 1000
+
+TILES_BY_NAME = dict([(str(tile), tile) for tile in TILES])
+
+# Meld kinds, with the group type and closedness of each
+MELD_KINDS = {
+    'chi': (Sequence, False),
+    'pon': (Triplet, False),
+    'kan': (Quadruplet, False),
+    'ankan': (Quadruplet, True),
+}
+
+WinningHand = namedtuple('WinningHand', ('game', 'prevailing_wind',
+                                         'player_wind', 'tiles', 'melds',
+                                         'win_tile', 'tsumo'))
+
+#### Pipeline stages
+
+def read_lines(paths):
+    """
+    Yields the lines of each log file in turn, opening one file at a time.
+    """
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path) as f:
+            for line in f:
+                yield line
+
+def _parse_tile(name):
+    try:
+        return TILES_BY_NAME[name]
+    except KeyError:
+        raise ValueError("Unknown tile: %s" % name)
+
+def _parse_meld(meld):
+    kind, _, head = meld.partition(':')
+    if kind not in MELD_KINDS:
+        raise ValueError("Unknown meld kind: %s" % kind)
+    group_type, closed = MELD_KINDS[kind]
+    return group_type(_parse_tile(head), closed)
+
+def parse_line(line):
+    """
+    Returns the WinningHand of a log line (see the module docstring).
+    """
+    fields = line.rstrip('\r\n').split('\t')
+    if len(fields) != 7:
+        raise ValueError("Expected 7 fields, got %d" % len(fields))
+    game, prevailing_wind, player_wind, tiles, melds, win_tile, win = fields
+    for wind in (prevailing_wind, player_wind):
+        if wind not in WINDS:
+            raise ValueError("Unknown wind: %s" % wind)
+    if win not in ('tsumo', 'ron'):
+        raise ValueError("Expected tsumo or ron, got %s" % win)
+    melds = [] if melds == '-' else map(_parse_meld, melds.split())
+    return WinningHand(game, prevailing_wind, player_wind,
+                       map(_parse_tile, tiles.split()), melds,
+                       _parse_tile(win_tile), win == 'tsumo')
+
+def parse_hands(lines, start=0):
+    """
+    Yields the WinningHand of each log line, skipping blank lines and
+    comments. start is the number of lines before the first one, for error
+    messages.
+    """
+    for n, line in enumerate(lines, start):
+        if not line.strip() or line.startswith('#'):
+            continue
+        try:
+            yield parse_line(line)
+        except ValueError as e:
+            raise ValueError("Line %d: %s" % (n + 1, e))
+
+def group_hands(hands):
+    """
+    Yields (hand, groupings) for each WinningHand, where each grouping is the
+    list of Group objects of the concealed tiles followed by the melds.
+    """
+    for hand in hands:
+        groupings = [groups + hand.melds for groups
+                     in group_concealed_tiles_and_convert(hand.tiles)]
+        yield hand, groupings
+
+def _get_counts(hand):
+    """
+    Returns the count vector of all tiles of the hand, including its melds.
+    """
+    counts = tiles_to_counts(hand.tiles)
+    for meld in hand.melds:
+        for code in meld.codes:
+            counts[code] += 1
+    return counts
+
+def score_hands(grouped_hands):
+    """
+    Yields (hand, yaku keys, han) for each (hand, groupings), for the
+    highest-scoring reading of the hand (the keys are empty and the han None
+    if the hand is not complete). Menzen tsumo is added to closed hands won
+    by tsumo.
+    """
+    for hand, groupings in grouped_hands:
+        is_open = not all([meld.closed for meld in hand.melds])
+        grouping_scores = [evaluate_grouping(groups, hand.prevailing_wind,
+                                             hand.player_wind)
+                           for groups in groupings]
+        keys, han = score_hand(_get_counts(hand), grouping_scores, is_open,
+                               hand.tsumo)
+        yield hand, keys, han
+
+#### Aggregation
+
+class ReplayStats(object):
+    """
+    Aggregate statistics of scored hands.
+    """
+    def __init__(self):
+        self.n_hands = 0
+        # Hands that could not be read as a complete hand
+        self.n_incomplete = 0
+        # Complete hands without any yaku
+        self.n_no_yaku = 0
+        self.yaku_counts = Counter()
+        self.han_counts = Counter()
+
+    def add(self, keys, han):
+        """
+        Adds a scored hand (see score_hands()).
+        """
+        self.n_hands += 1
+        if han is None:
+            self.n_incomplete += 1
+            return
+        if not keys:
+            self.n_no_yaku += 1
+        self.yaku_counts.update(keys)
+        self.han_counts[han] += 1
+
+    def merge(self, other):
+        """
+        Adds the statistics of another ReplayStats to this one.
+        """
+        self.n_hands += other.n_hands
+        self.n_incomplete += other.n_incomplete
+        self.n_no_yaku += other.n_no_yaku
+        self.yaku_counts.update(other.yaku_counts)
+        self.han_counts.update(other.han_counts)
+
+    def report(self):
+        """
+        Returns a human-readable summary of the statistics.
+        """
+        lines = ["Hands: %d (incomplete: %d, no yaku: %d)"
+                 % (self.n_hands, self.n_incomplete, self.n_no_yaku)]
+        n_complete = max(self.n_hands - self.n_incomplete, 1)
+        lines.append("Yaku frequencies (per complete hand):")
+        info = dict(YAKU_INFO, **YAKUMAN_INFO)
+        for key, count in self.yaku_counts.most_common():
+            lines.append("  %-24s %8d (%.4f)"
+                         % (info[key].name, count,
+                            float(count) / n_complete))
+        lines.append("Han:")
+        for han, count in sorted(self.han_counts.items()):
+            lines.append("  %3d %8d" % (han, count))
+        return "\n".join(lines)
+
+def aggregate(scored_hands):
+    """
+    Returns the ReplayStats of the scored hands.
+    """
+    stats = ReplayStats()
+    for hand, keys, han in scored_hands:
+        stats.add(keys, han)
+    return stats
+
+def analyze_lines(lines, start=0):
+    """
+    Runs the pipeline on an iterable of log lines (see parse_hands()) and
+    returns its ReplayStats.
+    """
+    return aggregate(score_hands(group_hands(parse_hands(lines, start))))
+
+def _iter_batches(iterable, batch_size):
+    """
+    Yields lists of at most batch_size consecutive items.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def analyze(paths, processes=1, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Runs the pipeline on the given log files and returns the merged
+    ReplayStats. Unless processes is 1, batches of batch_size lines are
+    analyzed by a pool of worker processes (all CPUs if processes is None).
+    """
+    lines = read_lines(paths)
+    if processes == 1:
+        return analyze_lines(lines)
+
+    stats = ReplayStats()
+    pool = multiprocessing.Pool(processes)
+    # Pool.imap() would read ahead through the whole log, so the number of
+    # batches in flight is bounded instead
+    max_pending = 2 * (processes or multiprocessing.cpu_count())
+    pending = deque()
+    try:
+        for n, batch in enumerate(_iter_batches(lines, batch_size)):
+            pending.append(pool.apply_async(analyze_lines,
+                                            (batch, n * batch_size)))
+            if len(pending) >= max_pending:
+                stats.merge(pending.popleft().get())
+        while pending:
+            stats.merge(pending.popleft().get())
+    finally:
+        pool.terminate()
+        pool.join()
+    return stats
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Analyze game logs.")
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--processes', type=int, default=1,
+                        help="number of worker processes (0 for all CPUs)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+    print analyze(args.paths, args.processes or None,
+                  args.batch_size).report()
@@ -0,0 +1,325 @@
+"""
+Shanten calculation on tile count vectors.
+
+The shanten number is the number of tile exchanges a hand needs to reach
+tenpai: -1 for a complete hand, 0 for tenpai, and so on. The standard form is
+computed per suit (and for the honours) with lazily filled lookup tables:
+for every suit key (see tables.encode_suit()) the table holds the minimum
+number of tiles missing from the suit to form m melds and h pairs, for
+m = 0..4 and h = 0..1. The suits are then combined by a min-plus convolution
+over (m, h), so the shanten of a hand needing n melds and a pair is the
+smallest total over all ways of splitting (n, 1) between the suits, minus 1.
+"""
+import itertools
+
+import numpy as np
+
+from tile import (N_TILE_KINDS, MAN_OFFSET, PIN_OFFSET, SOU_OFFSET,
+                  WIND_OFFSET, YAOCHUU_CODES)
+from decompose import tiles_to_counts
+from tables import N_SUIT_KEYS, MAX_SUIT_GROUPS, iter_suit_groups
+
+N_HONOUR_KINDS = N_TILE_KINDS - WIND_OFFSET
+N_HONOUR_KEYS = 5 ** N_HONOUR_KINDS
+
+# Table rows are indexed by 2 * melds + pairs
+N_SLOTS = 2 * (MAX_SUIT_GROUPS + 1)
+UNFILLED = -1
+# Larger than any shanten, but small enough that a sum of two does not
+# overflow an int8
+INF = 63
+
+# Number of keys filled in at once when filling table rows
+FILL_CHUNK_SIZE = 64
+
+POWERS_OF_5 = 5 ** np.arange(9)
+
+def _get_suit_targets():
+    """
+    Returns the counts of every suit shape made of complete groups, with the
+    table slot of each shape.
+    """
+    shapes = {}
+    for counts, groups in iter_suit_groups():
+        n_pairs = sum(counts) % 3 // 2
+        shapes[tuple(counts)] = 2 * (len(groups) - n_pairs) + n_pairs
+    return shapes.keys(), shapes.values()
+
+def _get_honour_targets():
+    """
+    Returns the counts of every honour shape made of complete groups (pairs
+    and triplets only), with the table slot of each shape.
+    """
+    targets = []
+    slots = []
+    kinds = range(N_HONOUR_KINDS)
+    for pair in (None,) + tuple(kinds):
+        for n_triplets in range(MAX_SUIT_GROUPS + 1):
+            for triplets in itertools.combinations(kinds, n_triplets):
+                if pair in triplets:
+                    continue
+                counts = [0] * N_HONOUR_KINDS
+                for kind in triplets:
+                    counts[kind] = 3
+                if pair is not None:
+                    counts[pair] = 2
+                targets.append(counts)
+                slots.append(2 * n_triplets + (pair is not None))
+    return targets, slots
+
+class _ShantenTable(object):
+    """
+    Minimum number of missing tiles per (melds, pairs) slot for each key of a
+    suit (or of the honours), computed on first use of each key.
+    """
+    def __init__(self, n_kinds, n_keys, targets, slots):
+        self.n_kinds = n_kinds
+        self.powers = POWERS_OF_5[:n_kinds]
+        self.rows = np.empty((n_keys, N_SLOTS), dtype=np.int8)
+        self.rows.fill(UNFILLED)
+        # Rows already looked up one at a time, as tuples
+        self._row_cache = {}
+
+        # Sort the targets by slot so that each slot is a contiguous run
+        order = np.argsort(slots, kind='mergesort')
+        self._targets = np.array(targets, dtype=np.int8)[order]
+        slots = np.array(slots)[order]
+        self._slots, self._slot_starts = np.unique(slots, return_index=True)
+
+    def get_row(self, key):
+        """
+        Returns the table row for the key as a tuple.
+        """
+        try:
+            return self._row_cache[key]
+        except KeyError:
+            self.fill(np.array([key]))
+            row = self._row_cache[key] = tuple(self.rows[key].tolist())
+            return row
+
+    def fill(self, keys):
+        """
+        Fills in the table rows for the given keys.
+        """
+        keys = keys[self.rows[keys, 0] == UNFILLED]
+        if len(keys) == 0:
+            return
+        keys = np.unique(keys)
+        for start in range(0, len(keys), FILL_CHUNK_SIZE):
+            chunk = keys[start:start + FILL_CHUNK_SIZE]
+            counts = (chunk[:, None] // self.powers) % 5
+            missing = np.maximum(self._targets[None, :, :]
+                                 - counts[:, None, :].astype(np.int8),
+                                 0).sum(axis=2)
+            rows = np.empty((len(chunk), N_SLOTS), dtype=np.int8)
+            rows.fill(INF)
+            rows[:, self._slots] = np.minimum.reduceat(missing,
+                                                       self._slot_starts,
+                                                       axis=1)
+            self.rows[chunk] = rows
+
+SUIT_TABLE = _ShantenTable(9, N_SUIT_KEYS, *_get_suit_targets())
+HONOUR_TABLE = _ShantenTable(N_HONOUR_KINDS, N_HONOUR_KEYS,
+                             *_get_honour_targets())
+
+# Memoized results of _convolve(), cleared when they reach MAX_CONVOLUTIONS
+_CONVOLUTIONS = {}
+MAX_CONVOLUTIONS = 2 ** 16
+
+# Pairs of table slots whose melds and pairs add up to at most (4, 1)
+_SLOT_PAIRS = [(i, j, i + j) for i in range(N_SLOTS) for j in range(N_SLOTS)
+               if i // 2 + j // 2 <= MAX_SUIT_GROUPS and i % 2 + j % 2 <= 1]
+
+# The same pairs, grouped by the slot they add up to
+_SLOT_PAIRS_BY_SLOT = [[(i, j) for i, j, k in _SLOT_PAIRS if k == slot]
+                       for slot in range(N_SLOTS)]
+
+# The three suits and the honours, as (offset, number of kinds, table)
+_PARTS = ((MAN_OFFSET, 9, SUIT_TABLE), (PIN_OFFSET, 9, SUIT_TABLE),
+          (SOU_OFFSET, 9, SUIT_TABLE),
+          (WIND_OFFSET, N_HONOUR_KINDS, HONOUR_TABLE))
+
+def _get_keys(counts):
+    """
+    Returns the table keys of the three suits and the honours.
+    """
+    keys = []
+    for offset, size, table in _PARTS:
+        key = 0
+        for code in range(offset + size - 1, offset - 1, -1):
+            key = 5 * key + counts[code]
+        keys.append(key)
+    return keys
+
+def _get_rows(counts):
+    """
+    Returns the table rows of the three suits and the honours.
+    """
+    return [table.get_row(key)
+            for (offset, size, table), key in zip(_PARTS, _get_keys(counts))]
+
+def standard_shanten_counts(counts):
+    """
+    Returns the shanten number of the count vector for the standard form
+    (melds and a pair), where the number of melds needed is a third of the
+    number of tiles.
+    """
+    return standard_shanten_rows(_get_rows(counts), sum(counts))
+
+def standard_shanten_rows(rows, n_tiles):
+    """
+    Returns the standard-form shanten number of a hand of n_tiles tiles,
+    given the table rows of its three suits and honours (in that order).
+    """
+    n_melds = n_tiles // 3
+    if n_melds > MAX_SUIT_GROUPS:
+        raise ValueError("Too many tiles for a hand")
+    man, pin, sou, honours = rows
+    total = _convolve(_convolve(man, pin), sou)
+    # Only the final slot is needed from the last convolution
+    return min([total[i] + honours[j] for i, j in _SLOT_PAIRS_BY_SLOT[
+        2 * n_melds + 1]]) - 1
+
+def _convolve(row1, row2):
+    """
+    Returns the min-plus convolution of two table rows (as tuples),
+    memoized since hands only give rise to a few distinct rows.
+    """
+    key = row1, row2
+    try:
+        return _CONVOLUTIONS[key]
+    except KeyError:
+        pass
+    combined = [INF] * N_SLOTS
+    for i, j, k in _SLOT_PAIRS:
+        missing = row1[i] + row2[j]
+        if missing < combined[k]:
+            combined[k] = missing
+    if len(_CONVOLUTIONS) >= MAX_CONVOLUTIONS:
+        _CONVOLUTIONS.clear()
+    combined = _CONVOLUTIONS[key] = tuple(combined)
+    return combined
+
+def standard_discard_shanten_counts(counts):
+    """
+    Returns a list giving, for each tile code, the standard-form shanten
+    number of the hand left after discarding one copy of it (None for codes
+    not in the hand). Only the part of the discarded tile is looked up again
+    for each discard, and the other parts are combined once per part.
+    """
+    n_tiles = sum(counts) - 1
+    if n_tiles // 3 > MAX_SUIT_GROUPS:
+        raise ValueError("Too many tiles for a hand")
+    slot_pairs = _SLOT_PAIRS_BY_SLOT[2 * (n_tiles // 3) + 1]
+    keys = _get_keys(counts)
+    rows = [table.get_row(key)
+            for (offset, size, table), key in zip(_PARTS, keys)]
+
+    results = [None] * N_TILE_KINDS
+    for part, (offset, size, table) in enumerate(_PARTS):
+        if part == 3:
+            suits = _convolve(_convolve(rows[0], rows[1]), rows[2])
+        else:
+            others = rows[:part] + rows[part + 1:3]
+            others = _convolve(others[0], others[1])
+        for code in range(offset, offset + size):
+            if not counts[code]:
+                continue
+            row = table.get_row(keys[part] - 5 ** (code - offset))
+            if part == 3:
+                total, honours = suits, row
+            else:
+                total, honours = _convolve(others, row), rows[3]
+            results[code] = min([total[i] + honours[j]
+                                 for i, j in slot_pairs]) - 1
+    return results
+
+def chitoi_shanten_counts(counts):
+    """
+    Returns the shanten number of the count vector for chitoitsu, or INF if
+    the hand does not have enough tiles (i.e. it has called melds).
+    """
+    if sum(counts) < 13:
+        return INF
+    n_pairs = sum([count >= 2 for count in counts])
+    n_kinds = sum([count > 0 for count in counts])
+    return 6 - n_pairs + max(0, 7 - n_kinds)
+
+def kokushi_shanten_counts(counts):
+    """
+    Returns the shanten number of the count vector for kokushi musou, or INF
+    if the hand does not have enough tiles (i.e. it has called melds).
+    """
+    if sum(counts) < 13:
+        return INF
+    yaochuu_counts = [counts[code] for code in YAOCHUU_CODES]
+    return (13 - sum([count > 0 for count in yaochuu_counts])
+            - any([count >= 2 for count in yaochuu_counts]))
+
+def shanten_counts(counts):
+    """
+    Returns the shanten number of the count vector, over the standard,
+    chitoitsu and kokushi musou forms.
+    """
+    return min(standard_shanten_counts(counts), chitoi_shanten_counts(counts),
+               kokushi_shanten_counts(counts))
+
+def shanten(tiles):
+    """
+    Returns the shanten number of the given (concealed) tiles: -1 if they
+    form a complete hand, 0 if they are tenpai, and so on.
+    """
+    return shanten_counts(tiles_to_counts(tiles))
+
+def shanten_batch(counts):
+    """
+    Returns the shanten numbers of an N x 34 array of count vectors, as an
+    int8 array of length N.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    n_tiles = counts.sum(axis=1)
+
+    if (n_tiles // 3 > MAX_SUIT_GROUPS).any():
+        raise ValueError("Too many tiles for a hand")
+
+    # Rows are transposed to (slot, hand) so that each slot is contiguous
+    rows = []
+    for offset in (MAN_OFFSET, PIN_OFFSET, SOU_OFFSET):
+        keys = counts[:, offset:offset + 9].dot(POWERS_OF_5)
+        SUIT_TABLE.fill(keys)
+        rows.append(SUIT_TABLE.rows[keys].T.copy())
+    keys = counts[:, WIND_OFFSET:].dot(POWERS_OF_5[:N_HONOUR_KINDS])
+    HONOUR_TABLE.fill(keys)
+    rows.append(HONOUR_TABLE.rows[keys].T.copy())
+
+    total = rows[0]
+    for row in rows[1:-1]:
+        combined = np.empty_like(total)
+        combined.fill(INF)
+        for i, j, k in _SLOT_PAIRS:
+            np.minimum(combined[k], total[i] + row[j], out=combined[k])
+        total = combined
+
+    # Only the slots of the hands' final melds and pair are needed from the
+    # last convolution
+    final_slots = 2 * (n_tiles // 3) + 1
+    result = np.empty(len(counts), dtype=np.int8)
+    result.fill(INF)
+    for slot in np.unique(final_slots):
+        missing = np.empty(len(counts), dtype=np.int8)
+        missing.fill(INF)
+        for i, j in _SLOT_PAIRS_BY_SLOT[slot]:
+            np.minimum(missing, total[i] + rows[-1][j], out=missing)
+        result = np.where(final_slots == slot, missing, result)
+    result -= 1
+
+    closed = n_tiles >= 13
+    n_pairs = (counts >= 2).sum(axis=1)
+    n_kinds = (counts > 0).sum(axis=1)
+    chitoi = 6 - n_pairs + np.maximum(0, 7 - n_kinds)
+    yaochuu_counts = counts[:, list(YAOCHUU_CODES)]
+    kokushi = (13 - (yaochuu_counts > 0).sum(axis=1)
+               - (yaochuu_counts >= 2).any(axis=1))
+    result = np.where(closed, np.minimum(result, np.minimum(chitoi, kokushi)),
+                      result)
+    return result.astype(np.int8)
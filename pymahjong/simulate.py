@@ -0,0 +1,230 @@
+"""
+Monte Carlo simulation of deals.
+
+Each deal shuffles a full 136-tile wall, deals a 13-tile hand and then draws
+up to n_draws tiles, discarding one tile after each draw according to a
+discard policy, until the hand is complete. Winning hands are scored as
+closed hands won by self-draw (see batch.score_hand()).
+
+Deals are simulated in fixed-size chunks, each with its own random generator
+seeded from the base seed and the chunk number, so results do not depend on
+the number of worker processes or on the order in which chunks finish.
+Chunk results are merged as they arrive, so memory use does not grow with
+the number of deals. Within a chunk, each stage runs over all the deals
+still in play at once, so stage timings take a few clock calls per draw
+rather than per deal.
+"""
+import argparse
+import multiprocessing
+import random
+import time
+from collections import Counter
+
+from tile import N_TILE_KINDS
+from utils import SUIT_TABLE
+from shanten import standard_discard_shanten_counts
+from batch import score_hand
+from yaku import YAKU_INFO, YAKUMAN_INFO
+
+WALL = [code for code in range(N_TILE_KINDS) for n in range(4)]
+HAND_SIZE = 13
+DEFAULT_DRAWS = 18
+DEFAULT_CHUNK_SIZE = 1000
+STAGES = ('shuffle', 'draw', 'check', 'yaku', 'discard')
+
+#### Discard policies
+
+def discard_drawn(counts, drawn):
+    """
+    Discards the tile just drawn (tsumogiri).
+    """
+    return drawn
+
+def discard_min_shanten(counts, drawn):
+    """
+    Discards the tile leaving the lowest standard-form shanten, preferring
+    the drawn tile on ties.
+    """
+    shantens = standard_discard_shanten_counts(counts)
+    best_code, best_shanten = drawn, shantens[drawn]
+    for code, shanten in enumerate(shantens):
+        if shanten is not None and shanten < best_shanten:
+            best_code, best_shanten = code, shanten
+    return best_code
+
+POLICIES = {
+    'tsumogiri': discard_drawn,
+    'shanten': discard_min_shanten,
+}
+
+#### Statistics
+
+class SimulationStats(object):
+    """
+    Aggregate counts and timings of simulated deals.
+    """
+    def __init__(self, n_draws=DEFAULT_DRAWS):
+        self.n_deals = 0
+        self.n_wins = 0
+        # Number of wins on each draw, counted from 1 (the 13-tile starting
+        # hand cannot be complete, so the first entry stays 0)
+        self.wins_by_draw = [0] * (n_draws + 1)
+        self.yaku_counts = Counter()
+        self.han_counts = Counter()
+        # CPU seconds spent in each stage, summed over the worker processes
+        self.stage_times = dict([(stage, 0.0) for stage in STAGES])
+        # Wall-clock seconds for the whole simulation (set by simulate())
+        self.elapsed = 0.0
+
+    def merge(self, other):
+        """
+        Adds the counts and timings of another SimulationStats to this one.
+        """
+        self.n_deals += other.n_deals
+        self.n_wins += other.n_wins
+        self.wins_by_draw = [n1 + n2 for n1, n2 in zip(self.wins_by_draw,
+                                                       other.wins_by_draw)]
+        self.yaku_counts.update(other.yaku_counts)
+        self.han_counts.update(other.han_counts)
+        for stage in STAGES:
+            self.stage_times[stage] += other.stage_times[stage]
+
+    def report(self):
+        """
+        Returns a human-readable summary of the statistics.
+        """
+        lines = ["Deals: %d, wins: %d (%.4f)"
+                 % (self.n_deals, self.n_wins,
+                    float(self.n_wins) / max(self.n_deals, 1))]
+        if self.elapsed:
+            lines.append("Elapsed: %.2f s (%.0f deals/s)"
+                         % (self.elapsed, self.n_deals / self.elapsed))
+        total = sum(self.stage_times.values()) or 1.0
+        lines.append("Stage times (CPU seconds over all workers):")
+        for stage in STAGES:
+            lines.append("  %-8s %10.2f s (%4.1f%%)"
+                         % (stage, self.stage_times[stage],
+                            100 * self.stage_times[stage] / total))
+        lines.append("Yaku frequencies (per win):")
+        info = dict(YAKU_INFO, **YAKUMAN_INFO)
+        for key, count in self.yaku_counts.most_common():
+            lines.append("  %-24s %8d (%.4f)"
+                         % (info[key].name, count,
+                            float(count) / max(self.n_wins, 1)))
+        return "\n".join(lines)
+
+#### Simulation
+
+def run_chunk(args):
+    """
+    Simulates one chunk of deals, given (seed, chunk number, number of deals,
+    number of draws, policy name), and returns its SimulationStats.
+    """
+    seed, chunk, n_deals, n_draws, policy = args
+    discard = POLICIES[policy]
+    rng = random.Random((seed << 32) + chunk)
+    stats = SimulationStats(n_draws)
+    stage_times = stats.stage_times
+    # Process CPU time, so that stage times are not inflated by the other
+    # workers competing for the same cores
+    clock = time.clock
+
+    start = clock()
+    walls = []
+    hands = []
+    for n in range(n_deals):
+        wall = list(WALL)
+        rng.shuffle(wall)
+        counts = [0] * N_TILE_KINDS
+        for code in wall[:HAND_SIZE]:
+            counts[code] += 1
+        walls.append(wall)
+        hands.append(counts)
+    stage_times['shuffle'] += clock() - start
+
+    # Deals still in play
+    active = range(n_deals)
+    for draw in range(1, n_draws + 1):
+        if not active:
+            break
+
+        start = clock()
+        drawn = []
+        for n in active:
+            code = walls[n][HAND_SIZE + draw - 1]
+            hands[n][code] += 1
+            drawn.append(code)
+        stage_times['draw'] += clock() - start
+
+        start = clock()
+        complete = [SUIT_TABLE.is_complete(hands[n]) for n in active]
+        stage_times['check'] += clock() - start
+
+        start = clock()
+        for n, is_complete in zip(active, complete):
+            if is_complete:
+                keys, han = score_hand(hands[n], self_drawn=True)
+                stats.n_wins += 1
+                stats.wins_by_draw[draw] += 1
+                stats.yaku_counts.update(keys)
+                stats.han_counts[han] += 1
+        stage_times['yaku'] += clock() - start
+
+        start = clock()
+        remaining = []
+        for n, code, is_complete in zip(active, drawn, complete):
+            if not is_complete:
+                counts = hands[n]
+                counts[discard(counts, code)] -= 1
+                remaining.append(n)
+        active = remaining
+        stage_times['discard'] += clock() - start
+
+    stats.n_deals += n_deals
+    return stats
+
+def _iter_chunks(n_deals, seed, n_draws, policy, chunk_size):
+    """
+    Yields the arguments of run_chunk() for each chunk of deals.
+    """
+    for chunk, start in enumerate(range(0, n_deals, chunk_size)):
+        yield seed, chunk, min(chunk_size, n_deals - start), n_draws, policy
+
+def simulate(n_deals, seed=0, n_draws=DEFAULT_DRAWS, policy='tsumogiri',
+             processes=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Simulates n_deals deals over a pool of worker processes (all CPUs by
+    default, or in this process if processes is 1), and returns the merged
+    SimulationStats.
+    """
+    if policy not in POLICIES:
+        raise ValueError("Unknown discard policy: %s" % policy)
+    chunks = _iter_chunks(n_deals, seed, n_draws, policy, chunk_size)
+    stats = SimulationStats(n_draws)
+    start = time.time()
+    if processes == 1:
+        for chunk_stats in map(run_chunk, chunks):
+            stats.merge(chunk_stats)
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            for chunk_stats in pool.imap_unordered(run_chunk, chunks):
+                stats.merge(chunk_stats)
+        finally:
+            pool.terminate()
+            pool.join()
+    stats.elapsed = time.time() - start
+    return stats
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulate mahjong deals.")
+    parser.add_argument('n_deals', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--draws', type=int, default=DEFAULT_DRAWS)
+    parser.add_argument('--policy', choices=sorted(POLICIES),
+                        default='tsumogiri')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    print simulate(args.n_deals, args.seed, args.draws, args.policy,
+                   args.processes, args.chunk_size).report()
@@ -0,0 +1,374 @@
+"""
+Precomputed per-suit decomposition tables.
+
+The tiles of one suit are encoded as the base-5 number
+    counts[0] + 5 * counts[1] + ... + 5 ** 8 * counts[8]
+so every suit configuration has a key below 5 ** 9. Since a suit of a legal
+hand holds at most four groups and a pair, all of its decompositions can be
+enumerated once and stored in a table indexed by this key; decomposing a
+hand then takes one lookup per suit and a cross product of the results.
+
+The table is stored in a binary file (suit_table.bin, built by running this
+module or on first load) that is memory-mapped when loaded. Its layout is
+(all little-endian):
+    header        magic, version, number of shapes, decompositions, groups
+    index         uint16 per suit key: shape number + 1, or 0 if the suit
+                  configuration cannot be decomposed
+    flags         uint8 per shape: FLAG_COMPLETE | FLAG_PAIR
+    decomp_starts uint32 per shape + 1: offsets into the decompositions
+    group_starts  uint32 per decomposition + 1: offsets into the groups
+    groups        uint8 per group: suit-local group number (see GROUP_CODES)
+The file is written under a temporary name and renamed into place, so
+processes loading the table at the same time never see a partly written
+file.
+
+Suits of more than MAX_SUIT_GROUPS melds and a pair are not in the table,
+and are left to the search in decompose.py.
+"""
+import itertools
+import mmap
+import os
+import struct
+import tempfile
+
+from tile import (N_TILE_KINDS, MAN_OFFSET, PIN_OFFSET, SOU_OFFSET,
+                  WIND_OFFSET)
+import instrument
+from decompose import (DEFAULT_CACHE_SIZE, DecompositionCache,
+                       decompose_counts, is_complete_counts,
+                       is_special_complete_counts)
+
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'suit_table.bin')
+MAGIC = 'PMJT'
+VERSION = 1
+HEADER = struct.Struct('<4sHIII')
+
+SUIT_OFFSETS = (MAN_OFFSET, PIN_OFFSET, SOU_OFFSET)
+N_SUIT_KEYS = 5 ** 9
+MAX_SUIT_GROUPS = 4
+# Most tiles in a suit covered by the table
+MAX_SUIT_TILES = 3 * MAX_SUIT_GROUPS + 2
+
+FLAG_COMPLETE = 1
+FLAG_PAIR = 2
+
+# Suit-local group numbers: pairs 0-8, triplets 9-17, sequences 18-24
+N_SUIT_GROUPS = 25
+
+def _get_group_codes(offset):
+    """
+    Returns the tile codes of each suit-local group for the given suit.
+    """
+    return (tuple([(offset + i,) * 2 for i in range(9)])
+            + tuple([(offset + i,) * 3 for i in range(9)])
+            + tuple([(offset + i, offset + i + 1, offset + i + 2)
+                     for i in range(7)]))
+
+# Tile codes of each suit-local group, per suit offset
+GROUP_CODES = dict([(offset, _get_group_codes(offset))
+                    for offset in SUIT_OFFSETS])
+
+def encode_suit(counts, offset):
+    """
+    Returns the key of the suit starting at the given tile code.
+    """
+    key = 0
+    for code in range(offset + 8, offset - 1, -1):
+        key = 5 * key + counts[code]
+    return key
+
+def iter_suit_groups():
+    """
+    Yields the counts and (sorted) suit-local group numbers of every
+    combination of at most one pair and MAX_SUIT_GROUPS other groups in a
+    suit that uses at most four copies of each tile.
+    """
+    group_codes = GROUP_CODES[0]
+    for pair in (None,) + tuple(range(9)):
+        for n_melds in range(MAX_SUIT_GROUPS + 1):
+            for melds in itertools.combinations_with_replacement(
+                    range(9, N_SUIT_GROUPS), n_melds):
+                groups = melds if pair is None else (pair,) + melds
+                counts = [0] * 9
+                for group in groups:
+                    for code in group_codes[group]:
+                        counts[code] += 1
+                if max(counts) > 4:
+                    continue
+                groups = sorted(groups, key=lambda group: group_codes[group])
+                yield counts, tuple(groups)
+
+def build_table():
+    """
+    Enumerates every decomposable suit configuration (see iter_suit_groups())
+    and returns the table file contents.
+    """
+    shapes = {}
+    for counts, groups in iter_suit_groups():
+        shapes.setdefault(encode_suit(counts, 0), set()).add(groups)
+
+    keys = sorted(shapes)
+    index = [0] * N_SUIT_KEYS
+    flags = []
+    decomp_starts = [0]
+    group_starts = [0]
+    groups = []
+    for n, key in enumerate(keys):
+        index[key] = n + 1
+        decompositions = sorted(shapes[key])
+        has_pair = any([group < 9 for group in decompositions[0]])
+        flags.append(FLAG_COMPLETE | (FLAG_PAIR if has_pair else 0))
+        for decomposition in decompositions:
+            groups.extend(decomposition)
+            group_starts.append(len(groups))
+        decomp_starts.append(len(group_starts) - 1)
+
+    return ''.join([
+        HEADER.pack(MAGIC, VERSION, len(keys), len(group_starts) - 1,
+                    len(groups)),
+        struct.pack('<%dH' % len(index), *index),
+        struct.pack('<%dB' % len(flags), *flags),
+        struct.pack('<%dI' % len(decomp_starts), *decomp_starts),
+        struct.pack('<%dI' % len(group_starts), *group_starts),
+        struct.pack('<%dB' % len(groups), *groups)])
+
+def _write_file(path, data):
+    """
+    Writes the data to a temporary file next to the given path, then renames
+    it into place (atomically where the platform supports it).
+    """
+    fd, temp_path = tempfile.mkstemp(prefix='.suit_table.',
+                                     dir=os.path.dirname(path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        if os.name == 'nt' and os.path.exists(path):
+            # Renaming onto an existing file fails on Windows
+            os.remove(path)
+        os.rename(temp_path, path)
+    except:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def write_table(path=TABLE_PATH):
+    """
+    Builds the table and writes it to the given path.
+    """
+    data = build_table()
+    _write_file(path, data)
+    return data
+
+def load_table(path=TABLE_PATH):
+    """
+    Returns the SuitTable stored at the given path, building the file first
+    if it does not exist or is out of date. If the file cannot be written or
+    read back, the table is kept in memory instead.
+    """
+    try:
+        return SuitTable(_map_file(path))
+    except (IOError, ValueError, struct.error):
+        pass
+    data = build_table()
+    try:
+        _write_file(path, data)
+        return SuitTable(_map_file(path))
+    except (IOError, OSError, ValueError, struct.error):
+        return SuitTable(data)
+
+def _map_file(path):
+    """
+    Memory-maps the file at the given path (read-only).
+    """
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class SuitTable(object):
+    """
+    Read-only view of a table file's contents (a string or an mmap).
+    Decoded decompositions are kept in a bounded LRU cache of the given
+    maxsize (see decompose.DecompositionCache).
+    """
+    def __init__(self, buf, maxsize=DEFAULT_CACHE_SIZE):
+        magic, version, n_shapes, n_decompositions, n_groups = \
+            HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a version %d suit table" % VERSION)
+        self._buf = buf
+        self._index_offset = HEADER.size
+        self._flags_offset = self._index_offset + 2 * N_SUIT_KEYS
+        self._decomp_starts_offset = self._flags_offset + n_shapes
+        self._group_starts_offset = (self._decomp_starts_offset
+                                     + 4 * (n_shapes + 1))
+        self._groups_offset = (self._group_starts_offset
+                               + 4 * (n_decompositions + 1))
+        if len(buf) != self._groups_offset + n_groups:
+            raise ValueError("Truncated suit table")
+        self.n_shapes = n_shapes
+        # Decoded decompositions, keyed on (suit offset, suit key)
+        self._decoded = DecompositionCache(maxsize)
+        # Flags looked up so far, keyed on suit key
+        self._flags = {}
+
+    def _get_shape(self, key):
+        """
+        Returns the shape number for the suit key, or -1 if the suit cannot
+        be decomposed.
+        """
+        return struct.unpack_from('<H', self._buf,
+                                  self._index_offset + 2 * key)[0] - 1
+
+    def get_flags(self, key):
+        """
+        Returns the flags of the suit key (0 if it cannot be decomposed).
+        """
+        try:
+            return self._flags[key]
+        except KeyError:
+            pass
+        shape = self._get_shape(key)
+        flags = self._flags[key] = (
+            0 if shape < 0 else ord(self._buf[self._flags_offset + shape]))
+        return flags
+
+    def get_decompositions(self, key, offset=MAN_OFFSET):
+        """
+        Returns the decompositions of the suit key as a tuple of tuples of
+        groups, with tile codes for the suit starting at the given offset.
+        """
+        stats = instrument.active
+        decompositions = self._decoded.get((offset, key))
+        if decompositions is not None:
+            if stats is not None:
+                stats.cache_hits += 1
+            return decompositions
+        if stats is not None:
+            stats.cache_misses += 1
+
+        shape = self._get_shape(key)
+        decompositions = ()
+        if shape >= 0:
+            start, stop = struct.unpack_from(
+                '<2I', self._buf, self._decomp_starts_offset + 4 * shape)
+            group_starts = struct.unpack_from(
+                '<%dI' % (stop - start + 1), self._buf,
+                self._group_starts_offset + 4 * start)
+            groups = struct.unpack_from(
+                '<%dB' % (group_starts[-1] - group_starts[0]), self._buf,
+                self._groups_offset + group_starts[0])
+            group_codes = GROUP_CODES[offset]
+            first = group_starts[0]
+            decompositions = tuple([
+                tuple([group_codes[group]
+                       for group in groups[group_start - first:
+                                           group_stop - first]])
+                for group_start, group_stop in zip(group_starts,
+                                                   group_starts[1:])])
+
+        self._decoded.put((offset, key), decompositions)
+        return decompositions
+
+    def info(self):
+        """
+        Returns the counters of the decoded decomposition cache (see
+        DecompositionCache.info()).
+        """
+        return self._decoded.info()
+
+    def clear(self):
+        """
+        Empties the decoded decomposition cache and resets its counters.
+        """
+        self._decoded.clear()
+
+    def is_complete(self, counts):
+        """
+        Checks if the count vector is a complete hand (melds and a pair,
+        chitoitsu or kokushi musou), like decompose.is_complete_counts(),
+        using one flag lookup per suit and without decoding any groups.
+        """
+        n_tiles = sum(counts)
+        if n_tiles % 3 != 2:
+            return False
+        if max(counts) > 4:
+            return is_complete_counts(counts)
+        if self._is_standard_complete(counts):
+            return True
+        # Chitoitsu, or thirteen kinds for kokushi musou (see
+        # decompose.is_special_complete_counts())
+        return n_tiles == 14 and (
+            counts.count(2) == 7
+            or (counts.count(0) == N_TILE_KINDS - 13
+                and is_special_complete_counts(counts)))
+
+    def _is_standard_complete(self, counts):
+        """
+        Checks if the count vector of 3n + 2 tiles splits into melds and a
+        pair.
+        """
+        n_pairs = 0
+        for offset in SUIT_OFFSETS:
+            key = encode_suit(counts, offset)
+            if key:
+                flags = self.get_flags(key)
+                if not flags:
+                    # The suit may be too long for the table
+                    return (sum(counts[offset:offset + 9]) > MAX_SUIT_TILES
+                            and is_complete_counts(counts))
+                if flags & FLAG_PAIR:
+                    n_pairs += 1
+        for code in xrange(WIND_OFFSET, N_TILE_KINDS):
+            count = counts[code]
+            if count == 2:
+                n_pairs += 1
+            elif count == 1 or count == 4:
+                return False
+        return n_pairs == 1
+
+    def decompose(self, counts):
+        """
+        Returns all distinct decompositions of the count vector, like
+        decompose.decompose_counts(), using one table lookup per suit (or
+        using decompose_counts() if a suit is too long for the table).
+        """
+        if max(counts) > 4:
+            # Not a real hand; the table only covers up to four of a kind
+            return decompose_counts(counts)
+
+        parts = []
+        n_pairs = 0
+        for offset in SUIT_OFFSETS:
+            key = encode_suit(counts, offset)
+            if key:
+                decompositions = self.get_decompositions(key, offset)
+                if not decompositions:
+                    if sum(counts[offset:offset + 9]) > MAX_SUIT_TILES:
+                        return decompose_counts(counts)
+                    return ()
+                n_pairs += sum(counts[offset:offset + 9]) % 3 == 2
+                parts.append(decompositions)
+
+        honour_groups = []
+        for code in range(WIND_OFFSET, N_TILE_KINDS):
+            count = counts[code]
+            if count == 2:
+                n_pairs += 1
+            elif count != 0 and count != 3:
+                return ()
+            if count:
+                honour_groups.append((code,) * count)
+
+        if n_pairs != (sum(counts) % 3 == 2):
+            return ()
+
+        groupings = [()]
+        for decompositions in parts:
+            groupings = [grouping + decomposition for grouping in groupings
+                         for decomposition in decompositions]
+        honour_groups = tuple(honour_groups)
+        return tuple([grouping + honour_groups for grouping in groupings])
+
+if __name__ == '__main__':
+    table = SuitTable(write_table())
+    print "Wrote %d suit shapes to %s" % (table.n_shapes, TABLE_PATH)
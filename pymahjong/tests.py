@@ -1,8 +1,34 @@
+import copy
+import os
+import pickle
 import random
+import sys
+import tempfile
+import time
 import unittest
+import numpy as np
 from tile import (ManTile, PinTile, SouTile, WindTile, DragonTile, TERMINALS,
                   HONOURS, NUMBERS, NUMBERED_TILE_TYPES, WINDS, COLOURS,
+                  TILES, N_TILE_KINDS, WIND_OFFSET, tile_from_code,
                   Pair, Sequence, Triplet, Quadruplet)
+import advisor
+import batch
+import tile
+import benchmark
+import canonical
+import decompose
+import hand
+import instrument
+import lru
+import notation
+import records
+import replay
+import shanten
+import simulate
+import tables
+import utils
+import walls
+import waits
 import yaku
 
 class TypeTests(unittest.TestCase):
@@ -38,6 +64,42 @@ class TypeTests(unittest.TestCase):
         # Between types
         # TODO
 
+        # Tiles come before other objects
+        mixed = [DragonTile('red'), None, 3, ManTile(1), 'east', PinTile(2)]
+        self.assertEqual(sorted(mixed), [ManTile(1), PinTile(2),
+                                         DragonTile('red'), None, 3, 'east'])
+        self.assertEqual(sorted(reversed(mixed)), sorted(mixed))
+        self.assertTrue(ManTile(1) < None and None > ManTile(1))
+        self.assertTrue(DragonTile('red') < 'east')
+        self.assertFalse(ManTile(1) == 1)
+
+    def test_tile_interning(self):
+        """
+        Tests that each tile kind has exactly one (immutable) instance.
+        """
+        self.assertTrue(ManTile(3) is ManTile(3))
+        self.assertTrue(WindTile('east') is WindTile('east'))
+        self.assertTrue(copy.deepcopy(PinTile(4)) is PinTile(4))
+        self.assertTrue(pickle.loads(pickle.dumps(SouTile(9))) is SouTile(9))
+        self.assertRaises(AttributeError, setattr, ManTile(1), 'code', 5)
+        self.assertRaises(ValueError, ManTile, 10)
+        # Only the concrete tile types can be constructed
+        for tile_type in (tile.Tile, tile.NumberedTile, tile.HonourTile):
+            self.assertRaises(TypeError, tile_type, 1)
+
+    def test_tile_codes(self):
+        """
+        Tests that tile codes follow the tile ordering.
+        """
+        self.assertEqual([tile.code for tile in TILES], range(N_TILE_KINDS))
+        self.assertEqual(sorted(reversed(TILES)), list(TILES))
+        self.assertTrue(all([tile_from_code(tile.code) is tile
+                             for tile in TILES]))
+        self.assertEqual(ManTile(9).code, 8)
+        self.assertEqual(PinTile(1).code, 9)
+        self.assertEqual(WindTile('east').code, 27)
+        self.assertEqual(DragonTile('red').code, 33)
+
     def test_group_init(self):
         """
         Tests initializing Group objects with the head (first) tile.
@@ -50,6 +112,57 @@ class TypeTests(unittest.TestCase):
         self.assertEqual(Quadruplet(WindTile('east')).tiles,
                          [WindTile('east'), WindTile('east'),
                           WindTile('east'), WindTile('east')])
+        self.assertEqual(Sequence(SouTile(7)).codes, (24, 25, 26))
+        self.assertRaises(ValueError, Sequence, ManTile(8))
+        self.assertRaises(ValueError, Sequence, DragonTile('green'))
+
+    def test_group_table(self):
+        self.assertEqual(len(tile.GROUPS), 34 + 21 + 34 + 34)
+        self.assertEqual(len(set(tile.GROUPS)), len(tile.GROUPS))
+        for group in tile.GROUPS:
+            self.assertTrue(group.closed)
+            self.assertTrue(tile.get_group(group.kind, group.codes[0])
+                            is group)
+            self.assertTrue(tile.group_from_codes(group.codes) is group)
+            self.assertTrue(utils.convert_group(group.tiles) is group)
+            self.assertTrue(copy.deepcopy(group) is group)
+        self.assertEqual(tile.get_group(tile.SEQUENCE, PinTile(3).code),
+                         Sequence(PinTile(3)))
+        self.assertEqual(tile.get_group(tile.SEQUENCE, PinTile(8).code), None)
+        self.assertEqual(tile.group_from_codes((1, 3, 2)), None)
+        self.assertEqual(utils.convert_group([ManTile(1), PinTile(1)]), None)
+
+        group = Triplet(SouTile(2), False)
+        self.assertRaises(AttributeError, setattr, group, 'closed', True)
+        unpickled = pickle.loads(pickle.dumps(group))
+        self.assertEqual(unpickled, group)
+        self.assertFalse(unpickled.closed)
+
+        # Groups come before other objects
+        mixed = [Triplet(SouTile(2)), None, 'pair', Pair(ManTile(1))]
+        self.assertEqual(sorted(mixed), [Pair(ManTile(1)),
+                                         Triplet(SouTile(2)), None, 'pair'])
+        self.assertEqual(sorted(reversed(mixed)), sorted(mixed))
+
+    def test_group_classification(self):
+        for tiles, pair, sequence, triplet, quad, sequence_head in (
+                ([ManTile(1), ManTile(1)], True, False, False, False, False),
+                ([ManTile(1), ManTile(2)], False, False, False, False, True),
+                ([ManTile(8), ManTile(9)], False, False, False, False, False),
+                ([ManTile(9), PinTile(1)], False, False, False, False, False),
+                ([PinTile(7), PinTile(8), PinTile(9)],
+                 False, True, False, False, False),
+                ([PinTile(8), PinTile(9), SouTile(1)],
+                 False, False, False, False, False),
+                ([PinTile(3), PinTile(2), PinTile(4)],
+                 False, False, False, False, False),
+                ([DragonTile('red')] * 3, False, False, True, False, False),
+                ([WindTile('east')] * 4, False, False, False, True, False)):
+            self.assertEqual(utils.is_pair(tiles), pair)
+            self.assertEqual(utils.is_sequence(tiles), sequence)
+            self.assertEqual(utils.is_triplet(tiles), triplet)
+            self.assertEqual(utils.is_quad(tiles), quad)
+            self.assertEqual(utils.is_sequence_head(tiles), sequence_head)
 
 class YakuTests(unittest.TestCase):
 
@@ -230,7 +343,1092 @@ class YakuTests(unittest.TestCase):
         random.shuffle(groups)
         self.assertFalse(yaku.is_chinitsu(groups))
 
-TEST_CASES = (TypeTests, YakuTests)
+def random_hand(n_tiles, codes=range(N_TILE_KINDS)):
+    """
+    Draws a random hand from a full set of tiles restricted to the given codes.
+    """
+    return random.sample([TILES[code] for code in codes for n in range(4)],
+                         n_tiles)
+
+def random_complete_hand():
+    """
+    Builds a random complete hand of four sequences or triplets and a pair.
+    """
+    while True:
+        groups = [Pair(random.choice(TILES))]
+        for n in range(4):
+            head = random.choice(TILES)
+            if (head.code < WIND_OFFSET and head.number <= 7
+                and random.random() < 0.6):
+                groups.append(Sequence(head))
+            else:
+                groups.append(Triplet(head))
+        tiles = utils.flatten_groups(groups)
+        if all([tiles.count(tile) <= 4 for tile in tiles]):
+            random.shuffle(tiles)
+            return tiles
+
+class DecomposeTests(unittest.TestCase):
+
+    def test_tiles_to_counts(self):
+        counts = decompose.tiles_to_counts([ManTile(1), ManTile(1),
+                                            DragonTile('red')])
+        self.assertEqual(len(counts), N_TILE_KINDS)
+        self.assertEqual(counts[0], 2)
+        self.assertEqual(counts[33], 1)
+        self.assertEqual(sum(counts), 3)
+
+    def test_decompose_counts(self):
+        counts = decompose.tiles_to_counts(
+            [ManTile(n) for n in (1, 1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4, 5, 5)])
+        groupings = decompose.decompose_counts(counts)
+        self.assertEqual(sorted(groupings), [
+            ((0, 0, 0), (1, 1), (1, 2, 3), (2, 3, 4), (2, 3, 4)),
+            ((0, 0, 0), (1, 1, 1), (2, 2, 2), (3, 3, 3), (4, 4)),
+            ((0, 0, 0), (1, 2, 3), (1, 2, 3), (1, 2, 3), (4, 4)),
+            ((0, 1, 2), (0, 1, 2), (0, 1, 2), (3, 3, 3), (4, 4))])
+
+        self.assertEqual(decompose.decompose_counts([0] * N_TILE_KINDS),
+                         ((),))
+        # No sequences across suit boundaries or among honours
+        counts = decompose.tiles_to_counts([ManTile(8), ManTile(9),
+                                            PinTile(1)])
+        self.assertEqual(decompose.decompose_counts(counts), ())
+        counts = decompose.tiles_to_counts(list(HONOURS[:3]))
+        self.assertEqual(decompose.decompose_counts(counts), ())
+
+    def test_group_concealed_tiles_against_bruteforce(self):
+        for n in range(100):
+            n_tiles = random.choice((2, 5, 8, 11, 14))
+            start = random.randrange(N_TILE_KINDS - 5)
+            hand = random_hand(n_tiles, range(start, start + 6))
+            groupings = utils.group_concealed_tiles(list(hand))
+            expected = utils.group_concealed_tiles_bruteforce(list(hand))
+            self.assertEqual(sorted(groupings), sorted(map(tuple, expected)))
+
+    def test_decomposition_cache(self):
+        cache = decompose.DecompositionCache(maxsize=4)
+        counts = decompose.tiles_to_counts(
+            [PinTile(n) for n in (1, 1, 2, 2, 3, 3, 4, 5, 6, 7, 8, 9, 9, 9)])
+        groupings = decompose.decompose_counts(counts, cache)
+        info = cache.info()
+        self.assertEqual(info.currsize, 4)
+        self.assertTrue(info.misses > 4)
+        self.assertEqual(info.evictions, info.misses - 4)
+
+        # The top-level entry is the most recently used one
+        self.assertTrue(decompose.decompose_counts(counts, cache) is groupings)
+        self.assertEqual(cache.info().hits, info.hits + 1)
+
+        cache.clear()
+        self.assertEqual(cache.info(), (0, 0, 0, 4, 0))
+        self.assertEqual(decompose.decompose_counts(
+            counts, decompose.DecompositionCache(maxsize=0)), groupings)
+
+    def test_group_concealed_tiles_immutable(self):
+        hand = [SouTile(n) for n in (9, 8, 7, 3, 3, 3, 2, 1, 1, 1, 2, 2, 3, 3)]
+        original = list(hand)
+        groupings = utils.group_concealed_tiles(hand)
+        self.assertEqual(hand, original)
+        self.assertTrue(isinstance(groupings, tuple))
+        self.assertTrue(all([isinstance(grouping, tuple)
+                             for grouping in groupings]))
+        self.assertEqual(utils.group_concealed_tiles(hand), groupings)
+
+    def test_is_complete(self):
+        kokushi = list(TERMINALS + HONOURS) + [ManTile(1)]
+        chitoi = [ManTile(1), ManTile(1), PinTile(2), PinTile(2), SouTile(3),
+                  SouTile(3), SouTile(5), SouTile(5), WindTile('east'),
+                  WindTile('east'), DragonTile('red'), DragonTile('red'),
+                  ManTile(9), ManTile(9)]
+        hands = [kokushi, chitoi, kokushi[1:], chitoi[:-1] + [ManTile(8)]]
+        for n in range(300):
+            if n % 3 == 0:
+                hands.append(random_complete_hand())
+            elif n % 3 == 1:
+                hands.append(random_hand(14, range(18, 27)))
+            else:
+                hands.append(random_hand(random.choice((2, 5, 8, 11, 14))))
+
+        for tiles in hands:
+            counts = decompose.tiles_to_counts(tiles)
+            expected = shanten.shanten_counts(counts) == -1
+            self.assertEqual(decompose.is_complete_counts(counts), expected)
+            self.assertEqual(utils.is_complete(tiles), expected)
+        self.assertTrue(utils.is_complete(kokushi))
+        self.assertTrue(utils.is_complete(chitoi))
+        self.assertFalse(utils.is_complete(kokushi[1:]))
+
+    def test_iter_decompositions(self):
+        for n in range(100):
+            tiles = (random_complete_hand() if n % 2
+                     else random_hand(14, range(9)))
+            counts = decompose.tiles_to_counts(tiles)
+            self.assertEqual(tuple(decompose.iter_decompositions(counts)),
+                             decompose.decompose_counts(counts))
+            self.assertEqual(sorted(utils.iter_concealed_groupings(tiles)),
+                             sorted(utils.group_concealed_tiles(tiles)))
+
+        # The search is lazy
+        counts = [3, 3, 3, 3, 2] + [0] * 29
+        decompositions = decompose.iter_decompositions(counts)
+        self.assertEqual(next(decompositions),
+                         decompose.decompose_counts(counts)[0])
+        self.assertEqual(list(decompose.iter_decompositions([1] + [0] * 33)),
+                         [])
+
+class TableTests(unittest.TestCase):
+
+    def test_encode_suit(self):
+        counts = decompose.tiles_to_counts([PinTile(1), PinTile(1), PinTile(3),
+                                            ManTile(9)])
+        self.assertEqual(tables.encode_suit(counts, tables.PIN_OFFSET),
+                         2 + 5 ** 2)
+        self.assertEqual(tables.encode_suit(counts, tables.MAN_OFFSET), 5 ** 8)
+        self.assertEqual(tables.encode_suit(counts, tables.SOU_OFFSET), 0)
+
+    def test_flags(self):
+        table = utils.SUIT_TABLE
+        # 123, 11 123, 12
+        self.assertEqual(table.get_flags(1 + 5 + 25), tables.FLAG_COMPLETE)
+        self.assertEqual(table.get_flags(3 + 5 + 25),
+                         tables.FLAG_COMPLETE | tables.FLAG_PAIR)
+        self.assertEqual(table.get_flags(1 + 5), 0)
+
+    def test_decompose_against_search(self):
+        for n in range(300):
+            n_tiles = random.choice((2, 3, 5, 6, 8, 9, 11, 12, 14))
+            start = random.randrange(N_TILE_KINDS - 8)
+            counts = decompose.tiles_to_counts(
+                random_hand(n_tiles, range(start, start + 9)))
+            self.assertEqual(sorted(utils.SUIT_TABLE.decompose(counts)),
+                             sorted(decompose.decompose_counts(counts)))
+
+        # Three pairs in different suits do not make a hand
+        counts = decompose.tiles_to_counts(
+            [ManTile(1), ManTile(1), PinTile(1), PinTile(1), SouTile(1),
+             SouTile(1)])
+        self.assertEqual(utils.SUIT_TABLE.decompose(counts), ())
+
+        # Five melds and a pair in one suit are beyond the table
+        counts = decompose.tiles_to_counts(
+            [ManTile(n) for n in (1, 2, 3, 1, 2, 3, 4, 5, 6, 4, 5, 6, 7, 8, 9,
+                                  9, 9)])
+        groupings = decompose.decompose_counts(counts)
+        self.assertTrue(groupings)
+        self.assertEqual(sorted(utils.SUIT_TABLE.decompose(counts)),
+                         sorted(groupings))
+        self.assertTrue(utils.SUIT_TABLE.is_complete(counts))
+        counts[0] -= 1
+        counts[WIND_OFFSET] += 1
+        self.assertEqual(utils.SUIT_TABLE.decompose(counts), ())
+        self.assertFalse(utils.SUIT_TABLE.is_complete(counts))
+
+    def test_decoded_cache(self):
+        table = tables.SuitTable(utils.SUIT_TABLE._buf, maxsize=2)
+        # 111222333m 55p 123s
+        counts = decompose.tiles_to_counts(
+            [ManTile(rank) for rank in (1, 2, 3) for n in range(3)]
+            + [PinTile(5)] * 2 + [SouTile(rank) for rank in (1, 2, 3)])
+        groupings = table.decompose(counts)
+        self.assertEqual(len(groupings), 2)
+        self.assertEqual(table.info(), (0, 3, 1, 2, 2))
+        # The suits are looked up in order, so each one was just evicted
+        self.assertEqual(table.decompose(counts), groupings)
+        self.assertEqual(table.info(), (0, 6, 4, 2, 2))
+        pair = table.get_decompositions(2 * 5 ** 4, tables.PIN_OFFSET)
+        self.assertEqual(pair, (((13, 13),),))
+        self.assertEqual(table.info().hits, 1)
+        table.clear()
+        self.assertEqual(table.info(), (0, 0, 0, 2, 0))
+
+        # group_concealed_tiles() goes through the shared table's cache
+        utils.SUIT_TABLE.clear()
+        tiles = [TILES[code] for code in range(N_TILE_KINDS)
+                 for n in range(counts[code])]
+        utils.group_concealed_tiles(tiles)
+        utils.group_concealed_tiles(tiles)
+        self.assertEqual(utils.SUIT_TABLE.info()[:2], (3, 3))
+
+    def test_load_table(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'suit_table.bin')
+        try:
+            table = tables.load_table(path)
+            self.assertEqual(os.listdir(directory), ['suit_table.bin'])
+            self.assertEqual(table.n_shapes, utils.SUIT_TABLE.n_shapes)
+            table = tables.load_table(path)
+            self.assertEqual(table.get_decompositions(3 + 5 + 25),
+                             (((0, 0), (0, 1, 2)),))
+
+            # A truncated file is rebuilt
+            size = os.path.getsize(path)
+            with open(path, 'r+b') as f:
+                f.truncate(size // 2)
+            table = tables.load_table(path)
+            self.assertEqual(table.n_shapes, utils.SUIT_TABLE.n_shapes)
+            self.assertEqual(os.path.getsize(path), size)
+        finally:
+            for name in os.listdir(directory):
+                os.remove(os.path.join(directory, name))
+            os.rmdir(directory)
+
+class ShantenTests(unittest.TestCase):
+
+    def test_shanten(self):
+        # 123456789m 1123p: tenpai on 1-4 pin
+        tiles = ([ManTile(n) for n in NUMBERS]
+                 + [PinTile(n) for n in (1, 1, 2, 3)])
+        self.assertEqual(shanten.shanten(tiles), 0)
+        self.assertEqual(shanten.shanten(tiles + [PinTile(4)]), -1)
+        self.assertEqual(shanten.shanten(tiles + [PinTile(5)]), 0)
+
+        # 159m 159p 159s ESWN white: no blocks at all (standard form)
+        tiles = ([tile_type(n) for tile_type in NUMBERED_TILE_TYPES
+                  for n in (1, 5, 9)] + list(HONOURS[:5]))
+        self.assertEqual(shanten.standard_shanten_counts(
+            decompose.tiles_to_counts(tiles)), 8)
+        self.assertEqual(shanten.kokushi_shanten_counts(
+            decompose.tiles_to_counts(tiles)), 2)
+
+        # Six pairs and a single: chitoitsu tenpai
+        tiles = (2 * [ManTile(1), ManTile(9), PinTile(3), SouTile(4),
+                      SouTile(6), WindTile('west')] + [DragonTile('red')])
+        self.assertEqual(shanten.chitoi_shanten_counts(
+            decompose.tiles_to_counts(tiles)), 0)
+        self.assertEqual(shanten.shanten(tiles), 0)
+
+        # Kokushi musou
+        tiles = list(TERMINALS + HONOURS) + [ManTile(1)]
+        self.assertEqual(shanten.shanten(tiles), -1)
+
+        # Hands with called melds need fewer groups
+        self.assertEqual(shanten.shanten([PinTile(5), PinTile(5)]), -1)
+        self.assertEqual(shanten.shanten([PinTile(5), PinTile(6),
+                                          PinTile(7), SouTile(1)]), 0)
+
+    def test_shanten_against_bruteforce(self):
+        for n in range(50):
+            tiles = random_complete_hand()
+            self.assertTrue(utils.group_concealed_tiles_bruteforce(tiles))
+            self.assertEqual(shanten.shanten(tiles), -1)
+            self.assertEqual(shanten.shanten(tiles[:-1]), 0)
+
+        for n in range(200):
+            tiles = random_hand(14)
+            is_complete = bool(utils.group_concealed_tiles(tiles)
+                               or yaku.is_chitoi(tiles)
+                               or yaku.is_kokushi(tiles))
+            self.assertEqual(shanten.shanten(tiles) == -1, is_complete)
+
+    def test_shanten_batch(self):
+        hands = ([random_hand(random.choice((13, 14))) for n in range(200)]
+                 + [random_complete_hand() for n in range(20)])
+        expected = [shanten.shanten(tiles) for tiles in hands]
+        counts = [decompose.tiles_to_counts(tiles) for tiles in hands]
+        self.assertEqual(shanten.shanten_batch(counts).tolist(), expected)
+
+    def test_discard_shanten(self):
+        for n in range(100):
+            counts = decompose.tiles_to_counts(random_hand(random.choice(
+                (5, 11, 14))))
+            results = shanten.standard_discard_shanten_counts(counts)
+            for code in range(N_TILE_KINDS):
+                if not counts[code]:
+                    self.assertEqual(results[code], None)
+                    continue
+                counts[code] -= 1
+                self.assertEqual(results[code],
+                                 shanten.standard_shanten_counts(counts))
+                counts[code] += 1
+
+def random_groups(allow_open=False):
+    """
+    Builds a random grouping of four melds (including quads) and a pair,
+    without regard to the number of copies of each tile.
+    """
+    groups = [Pair(random.choice(TILES))]
+    for n in range(4):
+        head = random.choice(TILES)
+        closed = not allow_open or random.random() < 0.7
+        group_type = random.choice((Sequence, Sequence, Triplet, Quadruplet))
+        if group_type is Sequence and (head.code >= WIND_OFFSET
+                                       or head.number > 7):
+            group_type = Triplet
+        groups.append(group_type(head, closed))
+    return groups
+
+class EvaluateGroupingTests(unittest.TestCase):
+
+    def test_evaluate_grouping(self):
+        groups = [Pair(WindTile('south')), Sequence(SouTile(1)),
+                  Sequence(SouTile(1)), Triplet(DragonTile('green')),
+                  Triplet(ManTile(9))]
+        mask, han = yaku.evaluate_grouping(groups)
+        self.assertEqual(sorted(yaku.get_yaku_keys(mask)),
+                         ['cha', 'ipk', 'yak'])
+        self.assertEqual(han, 4)
+
+        # Iipeikou does not count in an open hand
+        groups[1] = Sequence(SouTile(1), False)
+        mask, han = yaku.evaluate_grouping(groups)
+        self.assertEqual(sorted(yaku.get_yaku_keys(mask)), ['cha', 'yak'])
+        self.assertEqual(han, 2)
+
+    def test_evaluate_grouping_against_predicates(self):
+        predicates = {
+            'tan': yaku.is_tanyao, 'ipk': yaku.is_iipeikou,
+            'cha': yaku.is_chanta, 'itt': yaku.is_ittsu,
+            'toi': yaku.is_toitoi, 'sna': yaku.is_sanankou,
+            'snk': yaku.is_sankantsu, 'ssg': yaku.is_shousangen,
+            'rpk': yaku.is_ryanpeikou, 'chn': yaku.is_chinitsu,
+            'yak': lambda groups: yaku.is_yakuhai(groups, 'east', 'south'),
+            'sdo': yaku.is_sanshoku_doukou}
+
+        for n in range(500):
+            groups = random_groups(allow_open=n % 2)
+            closed = all([group.closed for group in groups])
+            mask, han = yaku.evaluate_grouping(groups, 'east', 'south')
+            keys = yaku.get_yaku_keys(mask)
+
+            plets = utils.get_plets(groups)
+            for key, predicate in predicates.items():
+                if key == 'sdo' and any([plet.tiles[0].code >= WIND_OFFSET
+                                         for plet in plets]):
+                    # is_sanshoku_doukou() only handles numbered plets
+                    continue
+                expected = bool(predicate(groups)) and (
+                    closed or yaku.YAKU_INFO[key].han_open > 0)
+                self.assertEqual(key in keys, expected)
+
+            han_key = 'han_closed' if closed else 'han_open'
+            self.assertEqual(han, sum([getattr(yaku.YAKU_INFO[key], han_key)
+                                       for key in keys]))
+
+def is_complete_bruteforce(tiles):
+    """
+    Checks if the tiles form a complete hand in any form.
+    """
+    return bool(utils.group_concealed_tiles(tiles) or yaku.is_chitoi(tiles)
+                or yaku.is_kokushi(tiles))
+
+class WaitsTests(unittest.TestCase):
+
+    def test_waits(self):
+        # 1112345678999m: nine-sided wait
+        tiles = [ManTile(n) for n in (1, 1, 1, 2, 3, 4, 5, 6, 7, 8, 9, 9, 9)]
+        self.assertEqual(waits.waits(tiles), [ManTile(n) for n in NUMBERS])
+
+        # Kokushi musou, single and thirteen-sided waits
+        tiles = list(TERMINALS + HONOURS)
+        self.assertEqual(waits.waits(tiles), sorted(tiles))
+        tiles[0] = DragonTile('red')
+        self.assertEqual(waits.waits(tiles), [TERMINALS[0]])
+
+        # Chitoitsu (and standard 1-4 sou on 2233 sou)
+        tiles = (2 * [ManTile(1), ManTile(9), PinTile(3), SouTile(2),
+                      SouTile(3), WindTile('west')] + [DragonTile('red')])
+        self.assertEqual(waits.waits(tiles), [DragonTile('red')])
+
+        self.assertRaises(ValueError, waits.waits, tiles[:-1])
+
+    def test_waits_against_bruteforce(self):
+        hands = ([random_complete_hand()[:-1] for n in range(100)]
+                 + [random_hand(13, range(9)) for n in range(50)])
+        for tiles in hands:
+            expected = [tile for tile in TILES if tiles.count(tile) < 4
+                        and is_complete_bruteforce(tiles + [tile])]
+            self.assertEqual(waits.waits(tiles), expected)
+
+    def test_ukeire(self):
+        # 23m 234p 678p 444s 99s: waits on 1-4 man
+        tiles = ([ManTile(2), ManTile(3)]
+                 + [PinTile(n) for n in (2, 3, 4, 6, 7, 8)]
+                 + [SouTile(n) for n in (4, 4, 4, 9, 9)])
+        counts = decompose.tiles_to_counts(tiles)
+        self.assertEqual(waits.ukeire_counts(counts), {0: 4, 3: 4})
+
+        visible = [0] * N_TILE_KINDS
+        visible[3] = 3
+        visible[4] = 2
+        self.assertEqual(waits.ukeire_counts(counts, visible), {0: 4, 3: 1})
+
+    def test_discard_waits(self):
+        for n in range(50):
+            tiles = random_complete_hand()[:-1] + [random.choice(TILES)]
+            counts = decompose.tiles_to_counts(tiles)
+            if max(counts) > 4:
+                continue
+            results = waits.discard_waits_counts(counts)
+            for code in set([tile.code for tile in tiles]):
+                counts[code] -= 1
+                expected = waits.ukeire_counts(counts)
+                if code in expected:
+                    expected[code] = max(expected[code] - 1, 0)
+                self.assertEqual(results.get(code, {}), expected)
+                counts[code] += 1
+
+class BatchTests(unittest.TestCase):
+
+    def test_evaluate_batch_against_predicates(self):
+        hands = [random_complete_hand() for n in range(200)]
+        # Flushes, chitoitsu and kokushi musou
+        hands.append([ManTile(n) for n in (1, 1, 1, 2, 3, 4, 5, 6, 7, 8, 9,
+                                           9, 9, 5)])
+        hands.append(2 * [PinTile(2), PinTile(4), SouTile(3), SouTile(5),
+                          ManTile(6), ManTile(7), ManTile(8)])
+        hands.append(list(TERMINALS + HONOURS) + [DragonTile('green')])
+        results = batch.evaluate_batch(
+            [decompose.tiles_to_counts(tiles) for tiles in hands])
+        columns = dict([(key, results[:, n].tolist())
+                        for n, key in enumerate(batch.BATCH_YAKU)])
+
+        for n, tiles in enumerate(hands):
+            self.assertEqual(columns['chi'][n], yaku.is_chitoi(tiles))
+            self.assertEqual(columns['kok'][n], yaku.is_kokushi(tiles))
+
+            groupings = utils.group_concealed_tiles_and_convert(tiles)
+            if not groupings:
+                continue
+            self.assertEqual(columns['tan'][n],
+                             any(map(yaku.is_tanyao, groupings)))
+            self.assertEqual(columns['chn'][n],
+                             any(map(yaku.is_chinitsu, groupings)))
+            self.assertEqual(columns['toi'][n],
+                             any(map(yaku.is_toitoi, groupings)))
+
+    def test_evaluate_batch(self):
+        # Honitsu and honroutou + toitoi, open and closed
+        hands = [[SouTile(n) for n in (1, 2, 3, 5, 5, 5, 7, 8, 9)]
+                 + 3 * [WindTile('north')] + 2 * [DragonTile('red')],
+                 3 * [ManTile(1), PinTile(9), WindTile('east'),
+                      DragonTile('white')] + 2 * [SouTile(1)]]
+        counts = [decompose.tiles_to_counts(tiles) for tiles in hands]
+        results = batch.evaluate_batch(counts + counts,
+                                       [False, False, True, True])
+        yaku_keys = [[key for n, key in enumerate(batch.BATCH_YAKU) if row[n]]
+                     for row in results]
+        self.assertEqual(yaku_keys, [['hon'], ['hro', 'toi'],
+                                     ['hon'], ['hro', 'toi']])
+        self.assertEqual(
+            batch.get_han_batch(results, [False, False, True, True]).tolist(),
+            [3, 4, 2, 4])
+        self.assertRaises(ValueError, batch.evaluate_batch, [[0] * 33])
+
+    def test_evaluate_batch_yakuman(self):
+        # Kokushi musou is also made of terminals and honours only, but
+        # scores the yakuman alone
+        tiles = list(TERMINALS + HONOURS) + [DragonTile('green')]
+        results = batch.evaluate_batch([decompose.tiles_to_counts(tiles)])
+        self.assertEqual([key for n, key in enumerate(batch.BATCH_YAKU)
+                          if results[0, n]], ['kok'])
+        self.assertEqual(batch.get_han_batch(results).tolist(), [13])
+        results[0, batch.BATCH_YAKU.index('hro')] = True
+        self.assertEqual(batch.get_han_batch(results).tolist(), [13])
+
+    def test_score_hand(self):
+        # Honroutou + toitoi + yakuhai, without chanta
+        tiles = (3 * [ManTile(1), PinTile(9), WindTile('east'),
+                      DragonTile('white')] + 2 * [SouTile(1)])
+        counts = decompose.tiles_to_counts(tiles)
+        self.assertEqual(batch.get_readings(counts),
+                         [(5, ['toi', 'yak', 'hro'])])
+        keys, han = batch.score_hand(counts, self_drawn=True)
+        self.assertEqual((sorted(keys), han),
+                         (['hro', 'smo', 'toi', 'yak'], 6))
+
+        # Yakuman do not combine with menzen tsumo
+        counts = decompose.tiles_to_counts(list(TERMINALS + HONOURS)
+                                           + [DragonTile('green')])
+        self.assertEqual(batch.score_hand(counts, self_drawn=True),
+                         (['kok'], 13))
+        counts[counts.index(2)] -= 1
+        self.assertEqual(batch.score_hand(counts), ([], None))
+
+class SimulateTests(unittest.TestCase):
+    def _get_results(self, stats):
+        return (stats.n_deals, stats.n_wins, stats.wins_by_draw,
+                stats.yaku_counts, stats.han_counts)
+
+    def test_simulate(self):
+        stats = simulate.simulate(300, seed=1, processes=1, chunk_size=100)
+        self.assertEqual(stats.n_deals, 300)
+        self.assertEqual(sum(stats.wins_by_draw), stats.n_wins)
+        self.assertEqual(sum(stats.han_counts.values()), stats.n_wins)
+        self.assertTrue(stats.report())
+
+        # Results only depend on the seed and the chunk size
+        self.assertEqual(
+            self._get_results(stats),
+            self._get_results(simulate.simulate(300, seed=1, processes=2,
+                                                chunk_size=100)))
+        self.assertRaises(ValueError, simulate.simulate, 1, policy='foo')
+
+    def test_policies(self):
+        counts = [0] * N_TILE_KINDS
+        # 123m 456p 789s 11z 23z + 5z drawn
+        for code in (0, 1, 2, 12, 13, 14, 24, 25, 26, 27, 27, 28, 29, 31):
+            counts[code] += 1
+        self.assertEqual(simulate.discard_drawn(counts, 31), 31)
+        self.assertTrue(simulate.discard_min_shanten(counts, 31)
+                        in (28, 29, 31))
+
+        stats = simulate.run_chunk((0, 0, 20, 18, 'shanten'))
+        self.assertEqual(stats.n_deals, 20)
+
+class BenchmarkTests(unittest.TestCase):
+    def test_corpora(self):
+        for name, make_hand in benchmark.CORPORA:
+            corpus = benchmark.make_corpus(name, 20, seed=1)
+            self.assertEqual(corpus, benchmark.make_corpus(name, 20, seed=1))
+            self.assertNotEqual(corpus, benchmark.make_corpus(name, 20))
+            for tiles in corpus:
+                self.assertEqual(len(tiles), 14)
+                self.assertTrue(all([tiles.count(tile) <= 4
+                                     for tile in tiles]))
+
+        for tiles in benchmark.make_corpus('chinitsu', 20):
+            self.assertEqual(len(set([tile.code // 9 for tile in tiles])), 1)
+        for tiles in benchmark.make_corpus('chiitoitsu', 20):
+            self.assertTrue(yaku.is_chitoi(tiles))
+        for tiles in benchmark.make_corpus('honours', 20):
+            self.assertTrue(sum([tile.code >= WIND_OFFSET
+                                 for tile in tiles]) >= 8)
+
+    def test_compare(self):
+        results = benchmark.run_benchmarks(['group_concealed_tiles'], size=5,
+                                           repeat=1, memory=False)
+        self.assertEqual(len(results['results']), len(benchmark.CORPORA))
+        self.assertEqual(benchmark.compare(results, results), [])
+
+        baseline = {'results': {
+            'a/random': {'time_per_hand': 1.0, 'peak_memory': 10 ** 6},
+            'b/random': {'time_per_hand': 1.0, 'peak_memory': 0},
+        }}
+        current = {'results': {
+            'a/random': {'time_per_hand': 1.1, 'peak_memory': 2 * 10 ** 6},
+            'b/random': {'time_per_hand': 2.0, 'peak_memory': 4096},
+            'c/random': {'time_per_hand': 2.0},
+        }}
+        self.assertEqual(benchmark.compare(current, baseline),
+                         [('a/random', 'peak_memory', 10 ** 6, 2 * 10 ** 6),
+                          ('b/random', 'time_per_hand', 1.0, 2.0)])
+        self.assertEqual(len(benchmark.compare(current, baseline, 0.05)), 3)
+        self.assertEqual(benchmark.format_change(1.0, 1.25), "+25%")
+        self.assertEqual(benchmark.format_change(0, 4096), "new")
+        self.assertEqual(benchmark.format_change(0, 0), "+0%")
+
+    def test_peak_memory(self):
+        results = benchmark.run_benchmarks(['is_complete'], size=5, repeat=1)
+        for result in results['results'].values():
+            self.assertTrue(result['peak_memory'] >= 0)
+        results = benchmark.run_benchmarks(['is_complete'], size=5, repeat=1,
+                                           memory=False)
+        for result in results['results'].values():
+            self.assertFalse('peak_memory' in result)
+
+        # Groupings take more memory than booleans, and the tiles shared
+        # with the corpus are not counted
+        self.assertTrue(
+            benchmark.measure_peak_memory('group_concealed_tiles', 'random')
+            > benchmark.measure_peak_memory('is_complete', 'random'))
+        seen = set([id(TILES[0])])
+        self.assertEqual(benchmark._get_size([TILES[0]], seen),
+                         sys.getsizeof([TILES[0]]))
+
+class HandStateTests(unittest.TestCase):
+    def test_incremental(self):
+        # Draw and discard at random, checking every query against the
+        # results computed from scratch
+        state = hand.HandState(random_hand(13))
+        for n in range(300):
+            tiles = state.tiles
+            if len(tiles) == 14:
+                if random.random() < 0.2:
+                    tiles = random_complete_hand()
+                    state = hand.HandState(tiles)
+                counts = decompose.tiles_to_counts(tiles)
+                self.assertEqual(state.counts, tuple(counts))
+                self.assertEqual(state.is_complete(),
+                                 shanten.shanten_counts(counts) == -1)
+                self.assertEqual(state.groupings(),
+                                 utils.SUIT_TABLE.decompose(counts))
+                state.discard(random.choice(tiles))
+            else:
+                counts = decompose.tiles_to_counts(tiles)
+                self.assertEqual(state.waits(), waits.waits_counts(counts))
+                unseen = [tile for tile in TILES
+                          if tiles.count(tile) < 4]
+                state.draw(random.choice(unseen))
+            self.assertEqual(state.shanten(), shanten.shanten(state.tiles))
+
+    def test_errors(self):
+        state = hand.HandState([ManTile(1)] * 4)
+        self.assertRaises(ValueError, state.draw, ManTile(1))
+        self.assertRaises(ValueError, state.discard, ManTile(2))
+        state.discard(ManTile(1))
+        self.assertRaises(ValueError, state.waits)
+        self.assertEqual(len(state), 3)
+
+    def test_yaku_candidates(self):
+        # 111222333m 456p 99p: three triplets or three identical sequences
+        state = hand.HandState.from_counts(
+            [3, 3, 3] + [0] * 9 + [1, 1, 1] + [0] * 2 + [2] + [0] * 16)
+        self.assertTrue(state.is_complete())
+        candidates = state.yaku_candidates()
+        self.assertEqual(len(candidates), 2)
+        self.assertEqual(candidates[0], (2, ['sna']))
+        self.assertEqual(candidates[1], (0, []))
+        for grouping in state.groupings():
+            groups = utils.convert_groupings(
+                [[utils._get_tile_group(group) for group in grouping]])[0]
+            self.assertTrue(
+                (yaku.evaluate_grouping(groups)[1], yaku.get_yaku_keys(
+                    yaku.evaluate_grouping(groups)[0])) in candidates)
+
+        # Tanyao chitoitsu
+        state = hand.HandState([ManTile(2), ManTile(2), ManTile(3), ManTile(3),
+                                PinTile(4), PinTile(4), PinTile(5), PinTile(5),
+                                SouTile(6), SouTile(6), SouTile(7), SouTile(7),
+                                SouTile(8), SouTile(8)])
+        self.assertEqual(state.yaku_candidates(), [(3, ['tan', 'chi'])])
+
+        state.discard(SouTile(8))
+        self.assertEqual(state.yaku_candidates(), [])
+        self.assertEqual(state.waits(), [SouTile(8).code])
+
+class RecordTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_encode_record(self):
+        counts = decompose.tiles_to_counts(random_hand(11))
+        melds = [Triplet(WindTile('east'), False),
+                 Quadruplet(DragonTile('red'), True)]
+        record = records.encode_record(counts, melds, 5, True)
+        self.assertEqual(len(record), records.RECORD_SIZE)
+        decoded = records.decode_record(record)
+        self.assertEqual(decoded, (counts, melds, 5, True))
+        self.assertEqual([meld.closed for meld in decoded[1]], [False, True])
+        self.assertEqual(records.decode_record(records.encode_record(counts)),
+                         (counts, [], None, False))
+
+        self.assertRaises(ValueError, records.encode_record, [5] + [0] * 33)
+        self.assertRaises(ValueError, records.encode_record, counts,
+                          [Triplet(ManTile(1))])
+        for win_tile in (-1, N_TILE_KINDS, records.NO_TILE, 64):
+            self.assertRaises(ValueError, records.encode_record, counts,
+                              melds, win_tile)
+
+    def test_encode_records_ranges(self):
+        counts = np.zeros((2, N_TILE_KINDS), dtype=np.int8)
+        meld_types = np.zeros((2, records.N_MELDS), dtype=np.int8)
+        valid = records.encode_records(counts, meld_types, meld_types,
+                                       [0, records.NO_TILE], [True, False])
+        self.assertEqual(valid.shape, (2, records.RECORD_SIZE))
+
+        invalid = meld_types.copy()
+        invalid[1, 2] = records.MELD_CLOSED_KAN + 1
+        self.assertRaises(ValueError, records.encode_records, counts, invalid)
+        invalid[1, 2] = N_TILE_KINDS
+        self.assertRaises(ValueError, records.encode_records, counts,
+                          meld_types, invalid)
+        self.assertRaises(ValueError, records.encode_records, counts,
+                          meld_types[:1])
+        for win_tiles in ([0, 64], [0, N_TILE_KINDS], [0]):
+            self.assertRaises(ValueError, records.encode_records, counts,
+                              win_tiles=win_tiles)
+        self.assertRaises(ValueError, records.encode_records, counts,
+                          tsumo=[0, 2])
+
+    def test_read_records(self):
+        hands = []
+        with records.RecordWriter(self.path) as writer:
+            for n in range(50):
+                tiles = random_hand(14)
+                counts = decompose.tiles_to_counts(tiles)
+                melds = [Sequence(PinTile(2), False)] * (n % 3)
+                hands.append((counts, melds, tiles[0].code, n % 2 == 0))
+                writer.write(*hands[-1])
+            # The same hands in a batch, without melds
+            writer.write_batch([counts for counts, melds, win_tile, tsumo
+                                in hands])
+
+        chunks = list(records.read_records(self.path, chunk_size=16))
+        self.assertEqual([len(chunk.counts) for chunk in chunks],
+                         [16] * 6 + [4])
+        loaded = records.load_records(self.path)
+        for name, chunk_array in zip(records.RecordChunk._fields,
+                                     zip(*chunks)):
+            self.assertEqual(getattr(loaded, name).tolist(),
+                             np.concatenate(chunk_array).tolist())
+
+        self.assertEqual(loaded.counts.tolist(),
+                         [counts for counts, melds, win_tile, tsumo
+                          in hands] * 2)
+        for n, (counts, melds, win_tile, tsumo) in enumerate(hands):
+            self.assertEqual(loaded.win_tiles[n], win_tile)
+            self.assertEqual(loaded.tsumo[n], tsumo)
+            self.assertEqual(loaded.meld_types[n].tolist(),
+                             [records.MELD_CHI] * len(melds)
+                             + [records.MELD_NONE] * (4 - len(melds)))
+            self.assertEqual(loaded.meld_heads[n, :len(melds)].tolist(),
+                             [PinTile(2).code] * len(melds))
+        self.assertTrue((loaded.win_tiles[50:] == records.NO_TILE).all())
+        self.assertEqual(records.count_records(self.path), 100)
+
+        with open(self.path, 'ab') as f:
+            f.write('x')
+        self.assertRaises(ValueError, records.count_records, self.path)
+
+class ReplayTests(unittest.TestCase):
+    LINES = [
+        "# game\tprevailing\tplayer\ttiles\tmelds\twin\ttype\n",
+        # Closed tsumo: tanyao and iipeikou
+        "g1\teast\tsouth\t2-man 3-man 4-man 3-pin 4-pin 5-pin 6-sou 7-sou "
+        "8-sou 6-sou 7-sou 8-sou 5-man 5-man\t-\t5-man\ttsumo\n",
+        "\n",
+        # Open: pon of red dragons and a triplet of (double) east winds, for
+        # yakuhai (counted once) and honitsu
+        "g1\teast\teast\t1-pin 2-pin 3-pin 5-pin 6-pin 7-pin 9-pin 9-pin "
+        "east east east\tpon:red\t9-pin\tron\n",
+        # Chitoitsu
+        "g2\tsouth\twest\t1-man 1-man 3-man 3-man 5-pin 5-pin 7-pin 7-pin "
+        "north north white white 9-sou 9-sou\t-\twhite\tron\n",
+        # Incomplete hand
+        "g2\tsouth\twest\t1-man 2-man 4-man 3-pin 4-pin 5-pin 6-sou 7-sou "
+        "8-sou 6-sou 7-sou 8-sou 5-man 5-man\t-\t5-man\tron\n",
+    ]
+
+    def test_parse_line(self):
+        hand = replay.parse_line(self.LINES[3])
+        self.assertEqual(hand.game, 'g1')
+        self.assertEqual(len(hand.tiles), 11)
+        self.assertEqual(hand.melds, [Triplet(DragonTile('red'), False)])
+        self.assertFalse(hand.melds[0].closed)
+        self.assertEqual(hand.win_tile, PinTile(9))
+        self.assertFalse(hand.tsumo)
+
+        self.assertRaises(ValueError, replay.parse_line, "g1\teast\n")
+        self.assertRaises(ValueError, replay.parse_line,
+                          self.LINES[1].replace('2-man', '0-man'))
+        self.assertRaises(ValueError, replay.parse_line,
+                          self.LINES[1].replace('\t-\t', '\tfoo:red\t'))
+        self.assertRaises(ValueError, list,
+                          replay.parse_hands(self.LINES[:1] + ["x\n"]))
+
+    def test_pipeline(self):
+        scored = list(replay.score_hands(replay.group_hands(
+            replay.parse_hands(self.LINES))))
+        self.assertEqual([(sorted(keys), han) for hand, keys, han in scored],
+                         [(['ipk', 'smo', 'tan'], 3), (['hon', 'yak'], 3),
+                          (['chi'], 2), ([], None)])
+
+        stats = replay.analyze_lines(self.LINES)
+        self.assertEqual((stats.n_hands, stats.n_incomplete, stats.n_no_yaku),
+                         (4, 1, 0))
+        self.assertEqual(stats.yaku_counts['tan'], 1)
+        self.assertTrue(stats.report())
+
+    def test_analyze(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            with open(path, 'w') as f:
+                f.writelines(self.LINES * 10)
+            stats = replay.analyze([path, path])
+            self.assertEqual(stats.n_hands, 80)
+            pool_stats = replay.analyze([path, path], processes=2,
+                                        batch_size=7)
+            for name in ('n_hands', 'n_incomplete', 'n_no_yaku',
+                         'yaku_counts', 'han_counts'):
+                self.assertEqual(getattr(stats, name),
+                                 getattr(pool_stats, name))
+
+            # Errors give the line number in the whole log, also when
+            # batches of lines are parsed by the workers
+            with open(path, 'a') as f:
+                f.write("x\n")
+            for processes in (1, 2):
+                self.assertRaisesRegexp(ValueError, "^Line 61:",
+                                        replay.analyze, [path], processes, 7)
+        finally:
+            os.remove(path)
+
+class CanonicalTests(unittest.TestCase):
+    def test_canonicalize(self):
+        for n in range(200):
+            counts = decompose.tiles_to_counts(random_hand(14))
+            key, perm = canonical.canonicalize(counts)
+            self.assertEqual(sorted(perm), range(N_TILE_KINDS))
+            self.assertEqual(canonical.apply_permutation(counts, perm),
+                             list(key))
+            for code in range(N_TILE_KINDS):
+                self.assertEqual(key[code], counts[perm[code]])
+
+            # Permuting the suits, winds and dragons gives the same key
+            suits = [0, 9, 18]
+            random.shuffle(suits)
+            winds = range(27, 31)
+            random.shuffle(winds)
+            dragons = range(31, 34)
+            random.shuffle(dragons)
+            relabel = ([offset + i for offset in suits for i in range(9)]
+                       + winds + dragons)
+            relabelled = [counts[code] for code in relabel]
+            self.assertEqual(canonical.canonicalize(relabelled)[0], key)
+
+            key, perm = canonical.canonicalize(counts, honours=False)
+            self.assertEqual(perm[WIND_OFFSET:],
+                             tuple(range(WIND_OFFSET, N_TILE_KINDS)))
+
+    def test_wrappers(self):
+        for function in (canonical.decompose_canonical,
+                         canonical.shanten_canonical,
+                         canonical.waits_canonical):
+            function.clear()
+        for n in range(200):
+            tiles = random_complete_hand() if n % 2 else random_hand(14)
+            counts = decompose.tiles_to_counts(tiles)
+            self.assertEqual(
+                set(canonical.decompose_canonical(counts)),
+                set(decompose.decompose_counts(counts)))
+            self.assertEqual(canonical.shanten_canonical(counts),
+                             shanten.shanten_counts(counts))
+            counts[tiles[0].code] -= 1
+            self.assertEqual(canonical.waits_canonical(counts),
+                             waits.waits_counts(counts))
+
+        # The same hand in another suit is a cache hit
+        canonical.shanten_canonical.clear()
+        counts = [1] * 9 + [0] * 18 + [2, 1, 0, 0, 1, 0, 0]
+        canonical.shanten_canonical(counts)
+        canonical.shanten_canonical([0] * 18 + counts[:9] + [0, 1, 2, 0, 0,
+                                                             0, 1])
+        self.assertEqual(canonical.shanten_canonical.info().hits, 1)
+
+class InstrumentTests(unittest.TestCase):
+    def setUp(self):
+        # 111222333m 55p
+        self.tiles = ([ManTile(rank) for rank in (1, 2, 3) for n in range(3)]
+                      + [PinTile(5)] * 2)
+
+    def test_bruteforce(self):
+        groupings, stats = instrument.measure(
+            utils.group_concealed_tiles_bruteforce, self.tiles)
+        self.assertEqual(len(groupings), 2)
+        # One level per group removed, plus the final pair
+        self.assertEqual(stats.max_depth, 4)
+        self.assertEqual(stats.depth, 0)
+        self.assertTrue(stats.nodes > stats.max_depth)
+        self.assertTrue(stats.candidate_triples > 0)
+        self.assertTrue(stats.duplicates > 0)
+        self.assertTrue(instrument.active is None)
+
+        # Nothing is collected outside of a block
+        utils.group_concealed_tiles_bruteforce(self.tiles)
+        self.assertEqual(stats.nodes,
+                         instrument.measure(
+                             utils.group_concealed_tiles_bruteforce,
+                             self.tiles)[1].nodes)
+
+    def test_decompose(self):
+        counts = decompose.tiles_to_counts(self.tiles)
+        cache = decompose.DecompositionCache()
+        with instrument.collect() as outer:
+            with instrument.collect() as first:
+                decompose.decompose_counts(counts, cache)
+            info = cache.info()
+            with instrument.collect() as second:
+                decompose.decompose_counts(counts, cache)
+        self.assertEqual((first.cache_hits, first.cache_misses),
+                         (info.hits, info.misses))
+        self.assertEqual(first.nodes, first.cache_misses)
+        self.assertEqual((second.nodes, second.cache_hits), (0, 1))
+        # Nested blocks are added to the enclosing one
+        self.assertEqual(outer.nodes, first.nodes)
+        self.assertEqual(outer.cache_hits, first.cache_hits + 1)
+        self.assertEqual(outer.max_depth, first.max_depth)
+
+class LRUTests(unittest.TestCase):
+    def test_lru(self):
+        cache = lru.LRUCache(maxsize=3)
+        for key in 'abc':
+            cache.put(key, key.upper())
+        # Looking up or replacing an entry makes it the most recently used
+        self.assertEqual(cache.get('a'), 'A')
+        cache.put('b', 'B2')
+        cache.put('d', 'D')
+        self.assertEqual(cache.get('c'), None)
+        self.assertEqual([cache.get(key) for key in 'abd'], ['A', 'B2', 'D'])
+        self.assertEqual(cache.info(), (4, 1, 1, 3, 3))
+        self.assertEqual(len(cache), 3)
+
+        cache.clear()
+        self.assertEqual(cache.info(), (0, 0, 0, 3, 0))
+        self.assertEqual(cache.get('a'), None)
+        cache.put('e', 'E')
+        self.assertEqual(cache.get('e'), 'E')
+
+        unbounded, disabled = lru.LRUCache(maxsize=None), lru.LRUCache(0)
+        for n in range(100):
+            unbounded.put(n, n)
+            disabled.put(n, n)
+        self.assertEqual((len(unbounded), len(disabled)), (100, 0))
+
+class NotationTests(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(notation.parse_tiles('123m5p0s15z'),
+                         [ManTile(1), ManTile(2), ManTile(3), PinTile(5),
+                          SouTile(5), WindTile('east'), DragonTile('white')])
+        self.assertEqual(notation.parse_codes('7z1234z'),
+                         [33, 27, 28, 29, 30])
+        self.assertEqual(notation.parse_counts(''), [0] * N_TILE_KINDS)
+        for text in ('12', '1m2', 'm', '8z', '11111m', '1x'):
+            self.assertRaises(ValueError, notation.parse_counts, text)
+            self.assertRaises(ValueError, notation.parse_counts_batch,
+                              ['11m', text])
+
+    def test_round_trip(self):
+        hands = [random_hand(14) for n in range(200)]
+        texts = [notation.format_tiles(tiles) for tiles in hands]
+        counts = notation.parse_counts_batch(texts)
+        self.assertEqual(counts.dtype, np.int8)
+        self.assertEqual(counts.shape, (200, N_TILE_KINDS))
+        for tiles, text, row in zip(hands, texts, counts):
+            expected = decompose.tiles_to_counts(tiles)
+            self.assertEqual(notation.parse_counts(text), expected)
+            self.assertEqual(row.tolist(), expected)
+        self.assertEqual(notation.format_counts_batch(counts), texts)
+        self.assertEqual(notation.format_codes([27, 0, 1, 2, 27]),
+                         '123m11z')
+        self.assertEqual(notation.parse_counts_batch([]).shape,
+                         (0, N_TILE_KINDS))
+
+class WallTests(unittest.TestCase):
+    def test_generate(self):
+        batches = list(walls.iter_walls(250, seed=3, batch_size=100))
+        self.assertEqual([len(batch) for batch in batches], [100, 100, 50])
+        all_walls = np.concatenate(batches)
+        self.assertEqual(all_walls.dtype, np.int8)
+        self.assertEqual(all_walls.shape, (250, walls.WALL_SIZE))
+        for wall in all_walls:
+            self.assertEqual(sorted(wall.tolist()),
+                             walls.WALL_CODES.tolist())
+        self.assertTrue((np.concatenate(list(walls.iter_walls(
+            250, seed=3, batch_size=100))) == all_walls).all())
+        self.assertFalse((walls.generate_walls(
+            250, np.random.RandomState(4)) == all_walls).all())
+
+    def test_deal(self):
+        all_walls = walls.generate_walls(100, np.random.RandomState(0))
+        counts = walls.deal_counts(all_walls, n_players=4)
+        self.assertEqual(counts.shape, (100, 4, N_TILE_KINDS))
+        for wall, hands in zip(all_walls, counts):
+            for player in range(4):
+                tiles = wall[13 * player:13 * (player + 1)]
+                self.assertEqual(hands[player].tolist(),
+                                 decompose.tiles_to_counts(
+                                     [TILES[code] for code in tiles]))
+        self.assertEqual(walls.draw_index(1, n_players=4, player=2), 54)
+
+        # Dealt hands go straight into the count-vector checks
+        hands = counts[:, 0]
+        self.assertEqual(shanten.shanten_batch(hands).tolist(),
+                         [shanten.shanten_counts(hand) for hand in hands])
+        walls.add_tiles(hands, all_walls[:, walls.draw_index(1)])
+        self.assertEqual(hands.sum(axis=1).tolist(), [14] * 100)
+        self.assertEqual(
+            (shanten.shanten_batch(hands) == -1).tolist(),
+            [utils.SUIT_TABLE.is_complete(hand.tolist()) for hand in hands])
+
+    def test_tsumogiri_wins(self):
+        all_walls = walls.generate_walls(50, np.random.RandomState(1))
+        # Make the first wall deal 123456789m 1133p and draw 2m, 5m, 3p
+        all_walls[0, :16] = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 9, 11, 11, 1, 4,
+                             11]
+        wins = walls.tsumogiri_wins(all_walls, 5)
+        self.assertEqual(wins[0], 3)
+        for wall, win in zip(all_walls, wins):
+            counts = walls.deal_counts(wall[None])[0, 0].tolist()
+            expected = 0
+            for draw in range(1, 6):
+                code = wall[walls.draw_index(draw)]
+                counts[code] += 1
+                if utils.SUIT_TABLE.is_complete(counts):
+                    expected = draw
+                    break
+                counts[code] -= 1
+            self.assertEqual(win, expected)
+
+class AdvisorTests(unittest.TestCase):
+    def setUp(self):
+        # 123456789m 1133p white: tenpai on 1-pin and 3-pin after discarding
+        # the white dragon
+        self.counts = notation.parse_counts('123456789m1133p5z')
+
+    def test_run_samples(self):
+        hand = list(self.counts)
+        hand[31] -= 1
+        unseen = [code for code in range(N_TILE_KINDS)
+                  for n in range(4 - self.counts[code])]
+        args = hand, unseen, 50, 6, 'shanten', 1
+        n_wins, total_han = advisor.run_samples(args)
+        self.assertEqual(advisor.run_samples(args), (n_wins, total_han))
+        self.assertTrue(0 < n_wins < 50)
+        # Menzen tsumo, ittsu (2 han closed) and possibly more
+        self.assertTrue(total_han >= 3 * n_wins)
+
+    def test_advise(self):
+        advisor_ = advisor.DiscardAdvisor(n_draws=6, batch_size=10)
+        advice = advisor_.iter_advice(self.counts)
+        for n in range(3):
+            estimates = next(advice)
+        self.assertEqual(sorted([estimate.code for estimate in estimates]),
+                         [code for code in range(N_TILE_KINDS)
+                          if self.counts[code]])
+        self.assertEqual(set([estimate.n_samples for estimate in estimates]),
+                         set([30]))
+        self.assertEqual(estimates[0].code, 31)
+        self.assertTrue(estimates[0].win_probability > 0)
+
+        # Estimates are kept when asking again about the same hand, and
+        # refined within the budget
+        estimates = advisor_.advise(self.counts, budget=0)
+        self.assertEqual(estimates[0].n_samples, 30)
+        self.assertEqual(advisor_.info().hits, 1)
+        start = time.time()
+        estimates = advisor_.advise(self.counts, budget=0.05)
+        self.assertTrue(time.time() - start < 0.5)
+        self.assertTrue(max([estimate.n_samples
+                             for estimate in estimates]) > 30)
+
+        hand = list(self.counts)
+        hand[31] -= 1
+        self.assertRaises(ValueError, advisor_.advise, hand)
+        visible = [0] * N_TILE_KINDS
+        visible[0] = 4
+        self.assertRaises(ValueError, advisor_.advise, self.counts, visible)
+
+    def test_pool(self):
+        inline = advisor.DiscardAdvisor(n_draws=6, batch_size=10)
+        with advisor.DiscardAdvisor(processes=2, n_draws=6,
+                                    batch_size=10) as pooled:
+            self.assertEqual(next(pooled.iter_advice(self.counts)),
+                             next(inline.iter_advice(self.counts)))
+            estimates = pooled.advise(self.counts, budget=0.01)
+        self.assertTrue(all([estimate.n_samples >= 10
+                             for estimate in estimates]))
+
+TEST_CASES = (TypeTests, YakuTests, DecomposeTests, TableTests, ShantenTests,
+              EvaluateGroupingTests, WaitsTests, BatchTests, SimulateTests,
+              BenchmarkTests, HandStateTests, RecordTests, ReplayTests,
+              CanonicalTests, InstrumentTests, LRUTests, NotationTests,
+              WallTests, AdvisorTests)
 
 def suite():
     return unittest.TestSuite(
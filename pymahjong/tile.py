@@ -1,228 +1,341 @@
-from copy import deepcopy
-
 NUMBERS = tuple(range(1, 10))
 SUITS = ('man', 'pin', 'sou')
 WINDS = ('east', 'south', 'west', 'north')
 COLOURS = ('white', 'green', 'red')
 
+#### Tile codes
+
+# Every tile kind is identified by an integer code, following the tile
+# ordering: manzu 0-8, pinzu 9-17, souzu 18-26, winds 27-30, dragons 31-33.
+N_TILE_KINDS = 34
+MAN_OFFSET = 0
+PIN_OFFSET = 9
+SOU_OFFSET = 18
+WIND_OFFSET = 27
+DRAGON_OFFSET = 31
+
+# Interned tile instances, indexed by code (filled in below)
+_TILES = [None] * N_TILE_KINDS
+
+def tile_from_code(code):
+    """
+    Returns the (interned) tile with the given code.
+    """
+    return _TILES[code]
+
 #### Tiles
 
 class Tile(object):
     """
     Ordering:
         manzu (1-9) < pinzu (1-9) < souzu (1-9) < winds (eswn) < dragons (wgr)
+
+    Tiles are immutable flyweights: there is exactly one instance per tile
+    kind, so constructing a tile (e.g. ManTile(3)) only looks it up by code.
+    Equality, hashing and ordering are all derived from the code.
     """
-    def __init__(self):
-        pass
+    __slots__ = ('code',)
 
-class NumberedTile(Tile):
-    def __init__(self, number):
-        Tile.__init__(self)
-        self.number = number
+    def __new__(cls, *args):
+        code = cls._get_code(*args)
+        tile = _TILES[code]
+        if tile is None:
+            tile = object.__new__(cls)
+            object.__setattr__(tile, 'code', code)
+            _TILES[code] = tile
+        return tile
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Tile objects are immutable")
 
-class ManTile(NumberedTile):
     def __eq__(self, other):
-        return isinstance(other, ManTile) and self.number == other.number
+        return isinstance(other, Tile) and self.code == other.code
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
 
     def __cmp__(self, other):
-        if not isinstance(other, ManTile):
+        if not isinstance(other, Tile):
+            # Tiles come before any other object (Python negates this when
+            # the other object is compared first)
             return -1
-        return self.number - other.number
+        return cmp(self.code, other.code)
 
     def __hash__(self):
-        return hash(("man", self.number))
+        return self.code
 
-    def __str__(self):
-        return str(self.number) + "-man"
     def __repr__(self):
         return self.__str__()
 
-    def __init__(self, number):
-        NumberedTile.__init__(self, number)
+    # Interned instances are never copied
+    def __copy__(self):
+        return self
 
-class PinTile(NumberedTile):
-    def __eq__(self, other):
-        return isinstance(other, PinTile) and self.number == other.number
-
-    def __cmp__(self, other):
-        if not isinstance(other, PinTile):
-            if isinstance(other, ManTile):
-                return 1
-            return -1
-        return self.number - other.number
-
-    def __hash__(self):
-        return hash(("pin", self.number))
+    def __deepcopy__(self, memo):
+        return self
 
-    def __str__(self):
-        return str(self.number) + "-pin"
-    def __repr__(self):
-        return self.__str__()
+    def __reduce__(self):
+        return tile_from_code, (self.code,)
 
-    def __init__(self, number):
-        NumberedTile.__init__(self, number)
+    @classmethod
+    def _get_code(cls, *args):
+        """
+        Returns the code of the tile kind given by the constructor arguments
+        (overridden by each concrete tile type).
+        """
+        raise TypeError("%s cannot be instantiated directly; use ManTile, "
+                        "PinTile, SouTile, WindTile or DragonTile"
+                        % cls.__name__)
 
-class SouTile(NumberedTile):
-    def __eq__(self, other):
-        return isinstance(other, SouTile) and self.number == other.number
+class NumberedTile(Tile):
+    __slots__ = ()
+    offset = None
+    suit = None
+
+    @classmethod
+    def _get_code(cls, number):
+        if cls.offset is None:
+            return super(NumberedTile, cls)._get_code(number)
+        if number not in NUMBERS:
+            raise ValueError("Invalid numbered tile: %r" % (number,))
+        return cls.offset + number - 1
+
+    @property
+    def number(self):
+        return self.code - self.offset + 1
 
-    def __cmp__(self, other):
-        if not isinstance(other, SouTile):
-            if isinstance(other, ManTile) or isinstance(other, PinTile):
-                return 1
-            return -1
-        return self.number - other.number
+    def __str__(self):
+        return "%d-%s" % (self.number, self.suit)
 
-    def __hash__(self):
-        return hash(("sou", self.number))
+class ManTile(NumberedTile):
+    __slots__ = ()
+    offset = MAN_OFFSET
+    suit = 'man'
 
-    def __str__(self):
-        return str(self.number) + "-sou"
-    def __repr__(self):
-        return self.__str__()
+class PinTile(NumberedTile):
+    __slots__ = ()
+    offset = PIN_OFFSET
+    suit = 'pin'
 
-    def __init__(self, number):
-        NumberedTile.__init__(self, number)
+class SouTile(NumberedTile):
+    __slots__ = ()
+    offset = SOU_OFFSET
+    suit = 'sou'
 
 class HonourTile(Tile):
-    def __init__(self):
-        Tile.__init__(self)
+    __slots__ = ()
 
 class WindTile(HonourTile):
-    def __eq__(self, other):
-        return isinstance(other, WindTile) and self.wind == other.wind
+    __slots__ = ()
 
-    def __cmp__(self, other):
-        if not isinstance(other, WindTile):
-            if isinstance(other, DragonTile):
-                return -1
-            return 1
-        return WINDS.index(self.wind) - WINDS.index(other.wind)
+    @classmethod
+    def _get_code(cls, wind):
+        return WIND_OFFSET + WINDS.index(wind)
 
-    def __hash__(self):
-        return hash((self.wind))
+    @property
+    def wind(self):
+        return WINDS[self.code - WIND_OFFSET]
 
     def __str__(self):
         return self.wind
-    def __repr__(self):
-        return self.__str__()
-
-    def __init__(self, wind):
-        HonourTile.__init__(self)
-        self.wind = wind
 
 class DragonTile(HonourTile):
-    def __eq__(self, other):
-        return isinstance(other, DragonTile) and self.colour == other.colour
+    __slots__ = ()
 
-    def __cmp__(self, other):
-        if not isinstance(other, DragonTile):
-            return 1
-        return COLOURS.index(self.colour) - COLOURS.index(other.colour)
+    @classmethod
+    def _get_code(cls, colour):
+        return DRAGON_OFFSET + COLOURS.index(colour)
 
-    def __hash__(self):
-        return hash((self.colour))
+    @property
+    def colour(self):
+        return COLOURS[self.code - DRAGON_OFFSET]
 
     def __str__(self):
         return self.colour
-    def __repr__(self):
-        return self.__str__()
-
-    def __init__(self, colour):
-        HonourTile.__init__(self)
-        self.colour = colour
 
 NUMBERED_TILE_TYPES = (ManTile, PinTile, SouTile)
 HONOUR_TILE_TYPES = (WindTile, DragonTile)
 TILE_TYPES = NUMBERED_TILE_TYPES + HONOUR_TILE_TYPES
 
+# Intern every tile kind up front
+for _tile_type in NUMBERED_TILE_TYPES:
+    for _number in NUMBERS:
+        _tile_type(_number)
+for _wind in WINDS:
+    WindTile(_wind)
+for _colour in COLOURS:
+    DragonTile(_colour)
+
+TILES = tuple(_TILES)
+
 TERMINALS = tuple([tile_type(number) for tile_type in NUMBERED_TILE_TYPES
                    for number in (NUMBERS[0], NUMBERS[-1])])
 WIND_TILES = tuple([WindTile(wind) for wind in WINDS])
 DRAGONS = tuple([DragonTile(colour) for colour in COLOURS])
 HONOURS = WIND_TILES + DRAGONS
 
+TERMINAL_CODES = tuple([tile.code for tile in TERMINALS])
+HONOUR_CODES = tuple([tile.code for tile in HONOURS])
+# Terminals and honours (yaochuuhai)
+YAOCHUU_CODES = TERMINAL_CODES + HONOUR_CODES
+
 #### Groups
 
+# Group kinds
+PAIR, SEQUENCE, TRIPLET, QUADRUPLET = range(4)
+
 class Group(object):
     """
     Represents a tile group (mentsu): pair (jantou), sequence (shuntsu),
     triplet (koutsu) or quadruplet (kantsu).
+
+    Groups only store the codes of their tiles; the tiles themselves are the
+    shared interned instances. Groups are immutable, so the closed groups of
+    GROUP_TABLE can be shared by every hand.
     """
-    def __cmp__(self, other):
-        return self.tiles[0].__cmp__(other.tiles[0])
+    __slots__ = ('codes', 'closed')
+    name = None
+    kind = None
 
-    def __init__(self, head, closed):
-        self.tiles = [head]
-        self.closed = closed
-        self.ttype = type(head)
+    def __setattr__(self, name, value):
+        raise AttributeError("Group objects are immutable")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return _make_group, (self.kind, self.codes[0], self.closed)
+
+    def __cmp__(self, other):
+        if not isinstance(other, Group):
+            # Groups come before any other object (as for Tile.__cmp__())
+            return -1
+        return cmp(self.codes[0], other.codes[0])
 
-class Pair(Group):
     def __eq__(self, other):
-        return isinstance(other, Pair) and self.tiles == other.tiles
+        return isinstance(other, type(self)) and self.codes == other.codes
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
 
     def __hash__(self):
-        return hash(("pair", tuple(self.tiles)))
+        return hash((self.name, self.codes))
 
     def __str__(self):
-        return "pair(%s, %s)" % (self.tiles[0], self.tiles[1])
+        return "%s(%s)" % (self.name, ", ".join(map(str, self.tiles)))
     def __repr__(self):
         return self.__str__()
 
+    def __init__(self, head, closed):
+        object.__setattr__(self, 'codes', self._get_codes(head.code))
+        object.__setattr__(self, 'closed', closed)
+
+    @property
+    def tiles(self):
+        return [_TILES[code] for code in self.codes]
+
+    @property
+    def ttype(self):
+        return type(_TILES[self.codes[0]])
+
+class Pair(Group):
+    __slots__ = ()
+    name = "pair"
+    kind = PAIR
+
+    @staticmethod
+    def _get_codes(code):
+        return (code, code)
+
     def __init__(self, head):
         Group.__init__(self, head, True)
-        self.tiles += [deepcopy(self.tiles[0])]
 
 class Sequence(Group):
-    def __eq__(self, other):
-        return isinstance(other, Sequence) and self.tiles == other.tiles
+    __slots__ = ()
+    name = "sequence"
+    kind = SEQUENCE
 
-    def __hash__(self):
-        return hash(("sequence", tuple(self.tiles)))
-
-    def __str__(self):
-        return "sequence(%s, %s, %s)" % (self.tiles[0], self.tiles[1],
-                                         self.tiles[2])
-    def __repr__(self):
-        return self.__str__()
+    @staticmethod
+    def _get_codes(code):
+        if code >= WIND_OFFSET or code % 9 > 6:
+            raise ValueError("Invalid sequence head: %s" % _TILES[code])
+        return (code, code + 1, code + 2)
 
     def __init__(self, head, closed=True):
         Group.__init__(self, head, closed)
-        if len(self.tiles) == 1:
-            self.tiles += [deepcopy(self.tiles[0]) for n in range(2)]
-            self.tiles[1].number += 1
-            self.tiles[2].number += 2
 
 class Triplet(Group):
-    def __eq__(self, other):
-        return isinstance(other, Triplet) and self.tiles == other.tiles
-
-    def __hash__(self):
-        return hash(("triplet", tuple(self.tiles)))
+    __slots__ = ()
+    name = "triplet"
+    kind = TRIPLET
 
-    def __str__(self):
-        return "triplet(%s, %s, %s)" % (self.tiles[0], self.tiles[1],
-                                        self.tiles[2])
-    def __repr__(self):
-        return self.__str__()
+    @staticmethod
+    def _get_codes(code):
+        return (code, code, code)
 
     def __init__(self, head, closed=True):
         Group.__init__(self, head, closed)
-        self.tiles += [deepcopy(self.tiles[0]) for n in range(2)]
 
 class Quadruplet(Group):
-    def __eq__(self, other):
-        return isinstance(other, Quadruplet) and self.tiles == other.tiles
-
-    def __hash__(self):
-        return hash(("triplet", tuple(self.tiles)))
+    __slots__ = ()
+    name = "quadruplet"
+    kind = QUADRUPLET
 
-    def __str__(self):
-        return "quadruplet(%s, %s, %s)" % (self.tiles[0], self.tiles[1],
-                                           self.tiles[2], self.tiles[3])
-    def __repr__(self):
-        return self.__str__()
+    @staticmethod
+    def _get_codes(code):
+        return (code, code, code, code)
 
     def __init__(self, head, closed=True):
         Group.__init__(self, head, closed)
-        self.tiles += [deepcopy(self.tiles[0]) for n in range(3)]
+
+GROUP_TYPES = (Pair, Sequence, Triplet, Quadruplet)
+
+def _make_group(kind, code, closed=True):
+    if kind == PAIR:
+        return Pair(_TILES[code])
+    return GROUP_TYPES[kind](_TILES[code], closed)
+
+#### Group table
+
+def _build_group_table():
+    """
+    Returns a tuple per group kind holding the closed group with each head
+    tile code, or None if there is no such group.
+    """
+    table = []
+    for kind in range(len(GROUP_TYPES)):
+        groups = []
+        for code in range(N_TILE_KINDS):
+            if kind == SEQUENCE and (code >= WIND_OFFSET or code % 9 > 6):
+                groups.append(None)
+            else:
+                groups.append(_make_group(kind, code))
+        table.append(tuple(groups))
+    return tuple(table)
+
+# Every closed group (34 pairs, 21 sequences, 34 triplets and 34 quads),
+# indexed by [kind][head tile code]
+GROUP_TABLE = _build_group_table()
+GROUPS = tuple([group for groups in GROUP_TABLE for group in groups
+                if group is not None])
+
+# The same groups keyed on their tile codes
+_GROUPS_BY_CODES = dict([(group.codes, group) for group in GROUPS])
+
+def get_group(kind, code):
+    """
+    Returns the shared closed group of the given kind (PAIR, SEQUENCE,
+    TRIPLET or QUADRUPLET) with the given head tile code, or None if there is
+    no such group.
+    """
+    return GROUP_TABLE[kind][code]
+
+def group_from_codes(codes):
+    """
+    Returns the shared closed group made of the given tile codes (in order),
+    or None if they do not form a group.
+    """
+    return _GROUPS_BY_CODES.get(tuple(codes))
@@ -1,5 +1,13 @@
-from tile import (ManTile, PinTile, SouTile, WindTile, TILE_TYPES,
-                  NUMBERED_TILE_TYPES, Pair, Sequence, Triplet, Quadruplet)
+from tile import (ManTile, PinTile, SouTile, WindTile, TILE_TYPES, TILES,
+                  NUMBERED_TILE_TYPES, Pair, Sequence, Triplet, Quadruplet,
+                  SEQUENCE, TRIPLET, QUADRUPLET, group_from_codes)
+from decompose import (tiles_to_counts, iter_decompositions,
+                       is_sequence_head_code)
+from tables import load_table
+import instrument
+
+# Per-suit decomposition table (memory-mapped)
+SUIT_TABLE = load_table()
 
 ALL_SEQUENCES = [tuple([tile_type(rank + i) for i in range(3)])
                  for rank in range(1, 8)
@@ -13,6 +21,17 @@ def are_all_equal(tiles):
     """
     return len(set(tiles)) <= 1
 
+def get_group(tiles):
+    """
+    Returns the shared closed group formed by the tiles (in order), or None;
+    see tile.GROUP_TABLE.
+    """
+    return group_from_codes([tile.code for tile in tiles])
+
+def _is_group_kind(tiles, kind):
+    group = get_group(tiles)
+    return group is not None and group.kind == kind
+
 def is_pair(tiles):
     """
     Checks if the tiles form a pair.
@@ -21,22 +40,21 @@ def is_pair(tiles):
 
 def is_sequence(tiles):
     """
-    Checks if the tiles form a sequence.
-    TODO: sort here later when using Tile objects
+    Checks if the tiles form a sequence (in order).
     """
-    return tuple(tiles) in ALL_SEQUENCES
+    return _is_group_kind(tiles, SEQUENCE)
 
 def is_triplet(tiles):
     """
     Checks if the tiles form a triplet.
     """
-    return len(tiles) == 3 and are_all_equal(tiles)
+    return _is_group_kind(tiles, TRIPLET)
 
 def is_quad(tiles):
     """
     Checks if the tile form a quad(ruplet).
     """
-    return len(tiles) == 4 and are_all_equal(tiles)
+    return _is_group_kind(tiles, QUADRUPLET)
 
 def is_sequence_or_triplet(tiles):
     """
@@ -48,7 +66,8 @@ def is_sequence_head(tiles):
     """
     Checks if the tiles are the first two in a sequence.
     """
-    return tuple(tiles) in ALL_SEQUENCE_HEADS
+    return (len(tiles) == 2 and is_sequence_head_code(tiles[0].code)
+            and tiles[1].code == tiles[0].code + 1)
 
 def is_triplet_head(tiles):
     """
@@ -68,10 +87,13 @@ def get_sequence_and_triplet_indices(tiles):
     """
     groups = {}
     n_tiles = len(tiles)
+    stats = instrument.active
 
     for i in range(n_tiles - 2):
         for j in range(i + 1, n_tiles - 1):
             if is_sequence_or_triplet_head((tiles[i], tiles[j])):
+                if stats is not None:
+                    stats.candidate_triples += n_tiles - j - 1
                 for k in range(j + 1, n_tiles):
                     group_indices = i, j, k
                     group = [tiles[n] for n in group_indices]
@@ -88,8 +110,66 @@ def group_concealed_tiles(tiles):
     Returns all legal groupings for the given concealed tiles, except for
     closed kans (since they must be declared anyway). Does not account for
     chitoitsu or kokushi musou hands; see group_chitoi() and group_kokushi().
+
+    The groupings are returned as (immutable) nested tuples, and the given
+    tiles are left untouched. Each suit is decomposed by a lookup in the
+    precomputed SUIT_TABLE (see tables.py), which keeps the decoded suits in
+    a bounded LRU cache (see SuitTable.info() and SuitTable.clear()).
+    """
+    groupings = SUIT_TABLE.decompose(tiles_to_counts(tiles))
+    return tuple([tuple([_get_tile_group(group) for group in grouping])
+                  for grouping in groupings])
+
+def iter_concealed_groupings(tiles):
+    """
+    Yields the legal groupings of the given concealed tiles one at a time, in
+    the same form as group_concealed_tiles(), so that the search can be
+    stopped early.
+    """
+    for decomposition in iter_decompositions(tiles_to_counts(tiles)):
+        yield tuple([_get_tile_group(group) for group in decomposition])
+
+def is_complete(tiles):
+    """
+    Checks if the given concealed tiles form a complete hand (including
+    chitoitsu and kokushi musou), without enumerating groupings; see
+    SuitTable.is_complete().
+    """
+    return SUIT_TABLE.is_complete(tiles_to_counts(tiles))
+
+# Tile tuples for each group of tile codes seen so far
+_TILE_GROUPS = {}
+
+def _get_tile_group(codes):
+    """
+    Returns the tuple of tiles for the given group of tile codes.
+    """
+    try:
+        return _TILE_GROUPS[codes]
+    except KeyError:
+        group = _TILE_GROUPS[codes] = tuple([TILES[code] for code in codes])
+        return group
+
+def group_concealed_tiles_bruteforce(tiles):
+    """
+    Returns all legal groupings for the given concealed tiles, except for
+    closed kans (since they must be declared anyway). Does not account for
+    chitoitsu or kokushi musou hands; see group_chitoi() and group_kokushi().
+
+    This is the original search over index triples, kept as a reference for
+    cross-checking group_concealed_tiles(); it is exponential on flush hands.
     """
-    tiles.sort()
+    stats = instrument.active
+    if stats is None:
+        return _group_bruteforce(tiles)
+    stats.enter()
+    try:
+        return _group_bruteforce(tiles)
+    finally:
+        stats.exit()
+
+def _group_bruteforce(tiles):
+    tiles = sorted(tiles)
 
     if len(tiles) == 0:
         return [[]]
@@ -118,17 +198,26 @@ def group_concealed_tiles(tiles):
 
     # Using set here to eliminate duplicates
     hands = set()
+    stats = instrument.active
     for indices in get_sequence_and_triplet_indices(tiles):
         group = tuple([tiles[i] for i in indices])
         remaining = [tile for i, tile in enumerate(tiles) if i not in indices]
-        for remaining_groups in group_concealed_tiles(remaining):
-            groups = sorted([group] + remaining_groups)
-            hands.add(tuple(groups))
+        for remaining_groups in group_concealed_tiles_bruteforce(remaining):
+            groups = tuple(sorted([group] + remaining_groups))
+            if stats is not None and groups in hands:
+                stats.duplicates += 1
+            hands.add(groups)
 
     return map(list, hands)
 
 def group_concealed_tiles_and_convert(tiles):
-    return convert_groupings(group_concealed_tiles(tiles))
+    """
+    Returns all legal groupings for the given concealed tiles (see
+    group_concealed_tiles()) as lists of the shared Group objects of
+    tile.GROUP_TABLE.
+    """
+    return [map(group_from_codes, grouping)
+            for grouping in SUIT_TABLE.decompose(tiles_to_counts(tiles))]
 
 def convert_groupings(tile_groups):
     """
@@ -138,17 +227,10 @@ def convert_groupings(tile_groups):
 
 def convert_group(tiles):
     """
-    Converts a tile group to a Group object.
-    """
-    if is_pair(group):
-        return Pair(group[0])
-    elif is_sequence(group):
-        return Sequence(group[0])
-    elif is_triplet(group):
-        return Triplet(group[0])
-    elif is_quadruplet(group):
-        return Quadruplet(group)[0]
-    return None
+    Converts a tile group to the shared (closed) Group object, or None if the
+    tiles do not form a group.
+    """
+    return get_group(tiles)
 
 def all_same_suit(groups):
     return all([type(group.tiles[0]) == type(groups[0].tiles[0])
@@ -0,0 +1,173 @@
+"""
+Wait (machi) and ukeire calculation on tile count vectors.
+
+A hand of 3n + 1 tiles is split into four parts (the three suits and the
+honours), and the completeness of each part is looked up once in the suit
+table. Since a winning tile only changes one part, a tenpai hand has at most
+one incomplete part, and if it has one only the tiles of that part need to
+be tried, each with a single table lookup.
+"""
+from tile import (N_TILE_KINDS, MAN_OFFSET, PIN_OFFSET, SOU_OFFSET,
+                  WIND_OFFSET, YAOCHUU_CODES, TILES)
+from decompose import tiles_to_counts
+from tables import FLAG_COMPLETE, FLAG_PAIR, encode_suit
+from utils import SUIT_TABLE
+
+# First and last (exclusive) tile code of each part
+PARTS = ((MAN_OFFSET, MAN_OFFSET + 9), (PIN_OFFSET, PIN_OFFSET + 9),
+         (SOU_OFFSET, SOU_OFFSET + 9), (WIND_OFFSET, N_TILE_KINDS))
+HONOUR_PART = len(PARTS) - 1
+# Part of each tile code
+PART_OF_CODE = [n for n, (start, stop) in enumerate(PARTS)
+                for code in range(start, stop)]
+
+def _get_part_state(counts, part):
+    """
+    Returns whether the part of the count vector decomposes into complete
+    groups, and its number of pairs.
+    """
+    start, stop = PARTS[part]
+    if part == HONOUR_PART:
+        part_counts = counts[start:stop]
+        return (all([count in (0, 2, 3) for count in part_counts]),
+                part_counts.count(2))
+    flags = SUIT_TABLE.get_flags(encode_suit(counts, start))
+    return bool(flags & FLAG_COMPLETE), int(bool(flags & FLAG_PAIR))
+
+def _get_standard_waits(counts, states):
+    """
+    Returns the winning tile codes for the standard form, given the state of
+    each part (see _get_part_state()).
+    """
+    incomplete = [part for part, (complete, n_pairs) in enumerate(states)
+                  if not complete]
+    if len(incomplete) > 1:
+        return []
+    total_pairs = sum([n_pairs for complete, n_pairs in states])
+
+    waits = []
+    # The winning tile must go into the only incomplete part, or into any
+    # part if all are complete (e.g. a shanpon wait on two pairs)
+    for part in incomplete or range(len(PARTS)):
+        other_pairs = total_pairs - states[part][1]
+        start, stop = PARTS[part]
+        for code in range(start, stop):
+            if counts[code] >= 4:
+                continue
+            counts[code] += 1
+            complete, n_pairs = _get_part_state(counts, part)
+            counts[code] -= 1
+            if complete and n_pairs + other_pairs == 1:
+                waits.append(code)
+    return waits
+
+def _get_chitoi_waits(counts):
+    """
+    Returns the winning tile codes for chitoitsu.
+    """
+    singles = [code for code, count in enumerate(counts) if count == 1]
+    if len(singles) == 1 and counts.count(2) == 6:
+        return singles
+    return []
+
+def _get_kokushi_waits(counts):
+    """
+    Returns the winning tile codes for kokushi musou.
+    """
+    yaochuu_counts = [counts[code] for code in YAOCHUU_CODES]
+    if sum(yaochuu_counts) != 13 or max(yaochuu_counts) > 2:
+        return []
+    missing = [code for code, count in zip(YAOCHUU_CODES, yaochuu_counts)
+               if count == 0]
+    if not missing:
+        # Thirteen-sided wait
+        return sorted(YAOCHUU_CODES)
+    if len(missing) == 1:
+        return missing
+    return []
+
+def get_waits_from_states(counts, states):
+    """
+    Returns the sorted winning tile codes over all forms of a hand of
+    3n + 1 tiles, given the state of each of its PARTS: whether the part
+    decomposes into complete groups, and its number of pairs (as kept up to
+    date by hand.HandState).
+    """
+    waits = set(_get_standard_waits(counts, states))
+    if sum(counts) == 13:
+        waits.update(_get_chitoi_waits(counts))
+        waits.update(_get_kokushi_waits(counts))
+    return sorted(waits)
+
+def _check_counts(counts, remainder):
+    """
+    Raises a ValueError unless the count vector is a hand of 3n + remainder
+    tiles with at most four copies of each.
+    """
+    if sum(counts) % 3 != remainder:
+        raise ValueError("Expected a hand of 3n + %d tiles" % remainder)
+    if max(counts) > 4:
+        raise ValueError("More than four copies of a tile")
+
+def get_ukeire(counts, codes, visible, discarded=None):
+    """
+    Returns a dictionary mapping the given tile codes to their numbers of
+    unseen copies, counting the discarded tile (if any) as seen.
+    """
+    ukeire = {}
+    for code in codes:
+        remaining = 4 - counts[code] - (code == discarded)
+        if visible is not None:
+            remaining -= visible[code]
+        ukeire[code] = max(remaining, 0)
+    return ukeire
+
+def waits_counts(counts):
+    """
+    Returns the codes of the tiles that complete the count vector of a hand
+    of 3n + 1 tiles (standard form, chitoitsu and kokushi musou), in order.
+    """
+    _check_counts(counts, 1)
+    counts = list(counts)
+    states = [_get_part_state(counts, part) for part in range(len(PARTS))]
+    return get_waits_from_states(counts, states)
+
+def waits(tiles):
+    """
+    Returns the tiles that complete the given hand of 3n + 1 tiles.
+    """
+    return [TILES[code] for code in waits_counts(tiles_to_counts(tiles))]
+
+def ukeire_counts(counts, visible=None):
+    """
+    Returns a dictionary mapping each winning tile code of the count vector
+    to the number of its copies that are still unseen, given a count vector
+    of the tiles visible outside the hand (discards, melds of other players,
+    dora indicators, ...).
+    """
+    return get_ukeire(counts, waits_counts(counts), visible)
+
+def discard_waits_counts(counts, visible=None):
+    """
+    For a hand of 3n + 2 tiles, returns a dictionary mapping each tile code
+    that can be discarded into tenpai to the resulting ukeire (see
+    ukeire_counts()), counting the discarded tile as seen. Only the part of
+    the discarded tile is re-examined for each discard.
+    """
+    _check_counts(counts, 2)
+    counts = list(counts)
+    states = [_get_part_state(counts, part) for part in range(len(PARTS))]
+
+    results = {}
+    for code in range(N_TILE_KINDS):
+        if not counts[code]:
+            continue
+        part = PART_OF_CODE[code]
+        counts[code] -= 1
+        discard_states = list(states)
+        discard_states[part] = _get_part_state(counts, part)
+        codes = get_waits_from_states(counts, discard_states)
+        if codes:
+            results[code] = get_ukeire(counts, codes, visible, code)
+        counts[code] += 1
+    return results
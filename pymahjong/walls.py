@@ -0,0 +1,104 @@
+"""
+Batched wall generation.
+
+Walls are generated in batches as N x 136 int8 arrays of tile codes, one
+shuffled wall per row, from a seeded NumPy generator:
+
+    for walls in iter_walls(10 ** 6, seed=0):
+        counts = deal_counts(walls)[:, 0]
+        shanten.shanten_batch(counts)
+
+Hands are dealt from the front of each wall in consecutive blocks of
+hand_size tiles (one block per player), and the following tiles are drawn
+in turn. Dealt hands come out as count vectors, so they go straight into
+the batch functions (shanten.shanten_batch(), batch.evaluate_batch()) or,
+row by row, into the count-vector checks (tables.SuitTable.is_complete(),
+decompose.decompose_counts()) without building any Tile objects.
+"""
+import numpy as np
+
+from tile import N_TILE_KINDS
+from shanten import shanten_batch
+
+WALL_SIZE = 4 * N_TILE_KINDS
+WALL_CODES = np.repeat(np.arange(N_TILE_KINDS, dtype=np.int8), 4)
+HAND_SIZE = 13
+DEFAULT_BATCH_SIZE = 10000
+
+def generate_walls(n_walls, rng):
+    """
+    Returns n_walls shuffled walls as an N x 136 int8 array, drawn from a
+    np.random.RandomState.
+    """
+    order = rng.random_sample((n_walls, WALL_SIZE)).argsort(axis=1)
+    return WALL_CODES[order]
+
+def iter_walls(n_walls, seed=0, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yields n_walls shuffled walls in batches of at most batch_size, from a
+    generator seeded with seed (the same seed and batch size always give the
+    same walls).
+    """
+    rng = np.random.RandomState(seed)
+    for start in range(0, n_walls, batch_size):
+        yield generate_walls(min(batch_size, n_walls - start), rng)
+
+#### Dealing
+
+def tiles_to_counts_batch(codes):
+    """
+    Returns the count vectors of an N x k array of tile codes as an N x 34
+    int8 array.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    n_hands = len(codes)
+    flat = (np.arange(n_hands)[:, None] * N_TILE_KINDS + codes).ravel()
+    counts = np.bincount(flat, minlength=n_hands * N_TILE_KINDS)
+    return counts.reshape(n_hands, N_TILE_KINDS).astype(np.int8)
+
+def deal_counts(walls, n_players=1, hand_size=HAND_SIZE):
+    """
+    Returns the hands dealt from each wall as an N x n_players x 34 int8
+    array of count vectors, player p getting the tiles from p * hand_size
+    to (p + 1) * hand_size.
+    """
+    walls = np.asarray(walls)
+    n_walls = len(walls)
+    codes = walls[:, :n_players * hand_size].reshape(n_walls * n_players,
+                                                      hand_size)
+    return tiles_to_counts_batch(codes).reshape(n_walls, n_players,
+                                                N_TILE_KINDS)
+
+def draw_index(draw, n_players=1, player=0, hand_size=HAND_SIZE):
+    """
+    Returns the wall position of the tile drawn by a player on the given
+    draw (counted from 1) after the deal.
+    """
+    return n_players * hand_size + (draw - 1) * n_players + player
+
+def add_tiles(counts, codes):
+    """
+    Adds one tile to each count vector of an N x 34 array, in place.
+    """
+    counts[np.arange(len(counts)), codes] += 1
+    return counts
+
+#### Simulation
+
+def tsumogiri_wins(walls, n_draws, hand_size=HAND_SIZE):
+    """
+    Returns, for each wall, the draw (counted from 1) on which a single
+    player who discards every tile they draw completes the hand dealt to
+    them, or 0 if they do not within n_draws draws.
+    """
+    hands = deal_counts(walls, 1, hand_size)[:, 0]
+    wins = np.zeros(len(hands), dtype=np.int8)
+    # The hand never changes, so only tenpai hands can be completed
+    tenpai = np.flatnonzero(shanten_batch(hands) == 0)
+    hands = hands[tenpai]
+    for draw in range(1, n_draws + 1):
+        drawn = walls[tenpai, draw_index(draw, hand_size=hand_size)]
+        complete = shanten_batch(add_tiles(hands.copy(), drawn)) == -1
+        complete &= wins[tenpai] == 0
+        wins[tenpai[complete]] = draw
+    return wins
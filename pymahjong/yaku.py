@@ -1,6 +1,8 @@
 from tile import (NumberedTile, ManTile, PinTile, SouTile, WindTile,
                   DragonTile, TERMINALS, HONOURS, WIND_TILES, DRAGONS,
-                  NUMBERS, SUITS, NUMBERED_TILE_TYPES, Sequence, Pair, Triplet)
+                  NUMBERS, SUITS, NUMBERED_TILE_TYPES, N_TILE_KINDS,
+                  MAN_OFFSET, PIN_OFFSET, SOU_OFFSET, WIND_OFFSET,
+                  YAOCHUU_CODES, Sequence, Pair, Triplet, Quadruplet)
 from utils import (flatten_groups, group_concealed_tiles_and_convert,
                    get_sequences, get_triplets, get_quadruplets, get_plets,
                    get_suit_counts_groups)
@@ -170,4 +172,194 @@ YAKU_INFO = {
     'chn': YakuInfo("Chinitsu", 6, 5, is_chinitsu)
 }
 
-YAKUMAN_INFO = {}
+YAKUMAN_INFO = {
+    'kok': YakuInfo("Kokushi musou", 13, 0, is_kokushi)
+}
+
+#### Single-pass evaluation
+
+# Yaku evaluated by evaluate_grouping(), and their bits in its result
+GROUPING_YAKU = ('tan', 'ipk', 'yak', 'cha', 'itt', 'toi', 'sna', 'sdo', 'snk',
+                 'ssg', 'rpk', 'chn')
+YAKU_KEYS = tuple(sorted(YAKU_INFO))
+YAKU_BITS = dict([(key, 1 << n) for n, key in enumerate(YAKU_KEYS)])
+
+_IS_YAOCHUU = [code in YAOCHUU_CODES for code in range(N_TILE_KINDS)]
+# Suit bit of each tile code: man, pin, sou, honours
+_SUIT_BITS = [1 << min(code // 9, 3) for code in range(N_TILE_KINDS)]
+_DRAGON_CODES = [tile.code for tile in DRAGONS]
+
+class GroupingSummary(object):
+    """
+    The facts about a grouping that the yaku depend on, gathered in a single
+    pass over its groups.
+    """
+    __slots__ = ('pair', 'sequence_heads', 'triplet_heads', 'quad_heads',
+                 'n_closed_plets', 'suit_mask', 'all_simples',
+                 'all_have_yaochuu', 'closed')
+
+    def __init__(self, groups):
+        self.pair = None
+        # Head tile codes, in the order of the groups
+        self.sequence_heads = []
+        self.triplet_heads = []
+        self.quad_heads = []
+        self.n_closed_plets = 0
+        # Bits 0-2 for the suits of numbered tiles, bit 3 for honours
+        self.suit_mask = 0
+        self.all_simples = True
+        self.all_have_yaochuu = True
+        self.closed = True
+
+        for group in groups:
+            self._add(group.codes, type(group), group.closed)
+
+    @classmethod
+    def from_codes(cls, groups):
+        """
+        Returns the summary of a closed grouping given as tuples of tile
+        codes (as returned by decompose.decompose_counts()).
+        """
+        summary = cls(())
+        for codes in groups:
+            summary._add(codes, _get_group_type(codes), True)
+        return summary
+
+    def _add(self, codes, group_type, closed):
+        head = codes[0]
+        if group_type is Sequence:
+            self.sequence_heads.append(head)
+        elif group_type is Pair:
+            self.pair = head
+        else:
+            if group_type is Triplet:
+                self.triplet_heads.append(head)
+            else:
+                self.quad_heads.append(head)
+            if closed:
+                self.n_closed_plets += 1
+        if not closed:
+            self.closed = False
+        self.suit_mask |= _SUIT_BITS[head]
+        # Only the ends of a sequence can be terminals
+        if _IS_YAOCHUU[head] or _IS_YAOCHUU[codes[-1]]:
+            self.all_simples = False
+        else:
+            self.all_have_yaochuu = False
+
+    @property
+    def plet_heads(self):
+        return self.triplet_heads + self.quad_heads
+
+def _get_group_type(codes):
+    """
+    Returns the group type of a tuple of tile codes.
+    """
+    if len(codes) == 2:
+        return Pair
+    if len(codes) == 4:
+        return Quadruplet
+    return Triplet if codes[0] == codes[1] else Sequence
+
+def _count_repeated_sequences(summary):
+    """
+    Returns the number of distinct sequences appearing exactly twice.
+    """
+    heads = summary.sequence_heads
+    return sum([heads.count(head) == 2 for head in set(heads)])
+
+def _is_iipeikou(summary):
+    return (not _is_ryanpeikou(summary)
+            and _count_repeated_sequences(summary) >= 1)
+
+def _is_ryanpeikou(summary):
+    return (len(summary.sequence_heads) >= 4
+            and _count_repeated_sequences(summary) == 2)
+
+def _is_ittsu(summary):
+    heads = summary.sequence_heads
+    if len(heads) < 3:
+        return False
+    return any([offset in heads and offset + 3 in heads and offset + 6 in heads
+                for offset in (MAN_OFFSET, PIN_OFFSET, SOU_OFFSET)])
+
+def _is_sanshoku_doukou(summary):
+    plet_heads = summary.plet_heads
+    if len(plet_heads) < 3:
+        return False
+    numbers = [head % 9 for head in plet_heads if head < WIND_OFFSET]
+    return any([numbers.count(number) == 3 for number in set(numbers)])
+
+def _is_shousangen(summary):
+    return (len(summary.triplet_heads) >= 2
+            and summary.pair in _DRAGON_CODES
+            and len(set([head for head in summary.triplet_heads
+                         if head in _DRAGON_CODES])) == 2)
+
+def _is_chinitsu(summary):
+    return summary.suit_mask in (1, 2, 4)
+
+# Yaku predicates on a GroupingSummary (yakuhai is handled separately, since
+# it depends on the winds)
+_SUMMARY_PREDICATES = (
+    ('tan', lambda summary: summary.all_simples),
+    ('ipk', _is_iipeikou),
+    ('cha', lambda summary: summary.all_have_yaochuu),
+    ('itt', _is_ittsu),
+    ('toi', lambda summary: len(summary.plet_heads) == 4),
+    ('sna', lambda summary: (len(summary.plet_heads) >= 3
+                             and summary.n_closed_plets == 3)),
+    ('sdo', _is_sanshoku_doukou),
+    ('snk', lambda summary: len(summary.quad_heads) == 3),
+    ('ssg', _is_shousangen),
+    ('rpk', _is_ryanpeikou),
+    ('chn', _is_chinitsu),
+)
+
+def evaluate_grouping(groups, prevailing_wind=None, player_wind=None):
+    """
+    Evaluates all of GROUPING_YAKU for a grouping (a list of Group objects)
+    at once, and returns a bitmask of the yaku scored (see YAKU_BITS) and
+    their total han. Yaku worth no han in an open hand are not scored if any
+    group is open. Yakuhai only counts the dragons unless the winds are given.
+    """
+    return _evaluate_summary(GroupingSummary(groups), prevailing_wind,
+                             player_wind)
+
+def evaluate_code_grouping(groups, prevailing_wind=None, player_wind=None):
+    """
+    Like evaluate_grouping(), for a closed grouping given as tuples of tile
+    codes, without building any Group objects.
+    """
+    return _evaluate_summary(GroupingSummary.from_codes(groups),
+                             prevailing_wind, player_wind)
+
+def _evaluate_summary(summary, prevailing_wind, player_wind):
+    """
+    Evaluates all of GROUPING_YAKU for a GroupingSummary (see
+    evaluate_grouping()).
+    """
+    han_key = 'han_closed' if summary.closed else 'han_open'
+    valid_honours = _DRAGON_CODES + [WindTile(wind).code
+                                     for wind in (prevailing_wind, player_wind)
+                                     if wind is not None]
+
+    scored = [key for key, predicate in _SUMMARY_PREDICATES
+              if predicate(summary)]
+    if any([head in valid_honours for head in summary.plet_heads]):
+        scored.append('yak')
+
+    mask = 0
+    han = 0
+    for key in scored:
+        yaku_han = getattr(YAKU_INFO[key], han_key)
+        if yaku_han:
+            mask |= YAKU_BITS[key]
+            han += yaku_han
+    return mask, han
+
+def get_yaku_keys(mask):
+    """
+    Returns the keys of the yaku in a bitmask returned by evaluate_grouping().
+    """
+    return [key for key in YAKU_KEYS if mask & YAKU_BITS[key]]